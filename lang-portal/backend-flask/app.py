@@ -1,13 +1,29 @@
+import atexit
+import os
+
 from flask import Flask, g
 from flask_cors import CORS
 
+from lib import preload, reviews
 from lib.db import Db
+from lib.json_response import OrjsonProvider, orjson
+from lib.metrics import RequestMetrics
+from lib.profiler import QueryProfiler
+from lib.response_cache import ResponseCache
+from lib.review_queue import ReviewQueue
+from lib.shared_generations import SharedGenerations
+from lib.snapshots import Snapshots
+from lib.word_cache import WordCache
 
 import routes.words
 import routes.groups
 import routes.study_sessions
 import routes.dashboard
 import routes.study_activities
+import routes.export
+import routes.debug
+import routes.metrics
+import routes.analytics
 
 def get_allowed_origins(app):
     try:
@@ -33,14 +49,101 @@ def create_app(test_config=None):
     
     if test_config is None:
         app.config.from_mapping(
-            DATABASE='words.db'
+            DATABASE='words.db',
+            DATABASE_POOL_SIZE=5,
+            # 'direct' commits each review request on its own connection,
+            # 'queue' hands reviews to a single writer thread (see lib/review_queue.py)
+            REVIEW_WRITE_MODE='direct',
+            REVIEW_QUEUE_BATCH_SIZE=500,
+            REVIEW_QUEUE_FLUSH_MS=20,
+            REVIEW_QUEUE_ACK='commit',
+            # Submissions waiting for the writer before review requests get 503
+            REVIEW_QUEUE_MAX_DEPTH=10000,
+            # Cached read responses (0 disables caching, ETags are still sent);
+            # watch PRAGMA data_version when other processes write to the database
+            RESPONSE_CACHE_SIZE=256,
+            RESPONSE_CACHE_WATCH_DATA_VERSION=False,
+            # 'shared' keeps the cache's table generations in <DATABASE>-generations, mapped by
+            # every worker process, so a write in one worker invalidates the others' caches
+            CACHE_GENERATIONS='local',
+            # Warm the caches with the hot read routes and words before serving (per worker)
+            PRELOAD=False,
+            PRELOAD_WORDS=256,
+            # Single-word lookups kept by GET /words/<id> (0 disables), invalidated with the response cache
+            WORD_CACHE_SIZE=1024,
+            # Reader threads of the ASGI front end (asgi.py); writes get one thread of their own
+            ASGI_READERS=4,
+            # Per-request SQL profiling: Server-Timing header, slow-query log with
+            # EXPLAIN QUERY PLAN (to the app log when no file is given), /debug/queries
+            SQL_PROFILE=False,
+            SQL_SLOW_QUERY_MS=50,
+            SQL_SLOW_QUERY_LOG=None,
+            # Request counts and latency histograms per route for GET /metrics
+            METRICS=True,
+            # 'orjson' encodes responses with orjson when it is installed, 'default' with Flask's encoder
+            JSON_PROVIDER='orjson',
+            # Arrow snapshots of the learning data and the /analytics views computed from them
+            SNAPSHOT_DIR='snapshots'
         )
+        # Overrides from FLASK_<NAME> environment variables, e.g. for the workers of `invoke serve`
+        app.config.from_prefixed_env()
     else:
         app.config.update(test_config)
     
+    if app.config.get('JSON_PROVIDER', 'orjson') == 'orjson' and orjson is not None:
+        app.json = OrjsonProvider(app)
+
     # Initialize database first since we need it for CORS configuration
-    app.db = Db(database=app.config['DATABASE'])
+    app.db = Db(
+        database=app.config['DATABASE'],
+        pool_size=app.config.get('DATABASE_POOL_SIZE', 5)
+    )
     
+    # Opt-in SQL profiler; must be enabled before the first connection is opened
+    app.profiler = None
+    if app.config.get('SQL_PROFILE', False):
+        app.db.profile = True
+        app.profiler = QueryProfiler(
+            app.db,
+            slow_ms=app.config.get('SQL_SLOW_QUERY_MS', 50),
+            slow_log=app.config.get('SQL_SLOW_QUERY_LOG')
+        )
+        app.profiler.init_app(app)
+
+    # Per-route request metrics; the pool, cache and queue gauges are read when scraped
+    app.metrics = None
+    if app.config.get('METRICS', True):
+        app.metrics = RequestMetrics()
+        app.metrics.init_app(app)
+
+    # Response cache for the read endpoints, invalidated by the write routes
+    shared = None
+    if app.config.get('CACHE_GENERATIONS', 'local') == 'shared':
+        shared = SharedGenerations(os.path.abspath(app.config['DATABASE']) + '-generations')
+    app.cache = ResponseCache(
+        app.db,
+        max_entries=app.config.get('RESPONSE_CACHE_SIZE', 256),
+        watch_data_version=app.config.get('RESPONSE_CACHE_WATCH_DATA_VERSION', False),
+        shared=shared
+    )
+    app.word_cache = WordCache(app.cache, max_entries=app.config.get('WORD_CACHE_SIZE', 1024))
+
+    # Optional write-behind queue for the review endpoints
+    app.review_queue = None
+    if app.config.get('REVIEW_WRITE_MODE', 'direct') == 'queue':
+        app.review_queue = ReviewQueue(
+            app.db,
+            batch_size=app.config.get('REVIEW_QUEUE_BATCH_SIZE', 500),
+            flush_interval_ms=app.config.get('REVIEW_QUEUE_FLUSH_MS', 20),
+            ack=app.config.get('REVIEW_QUEUE_ACK', 'commit'),
+            on_commit=lambda: app.cache.bump(*reviews.TABLES),
+            max_depth=app.config.get('REVIEW_QUEUE_MAX_DEPTH', 10000)
+        ).start()
+        atexit.register(app.review_queue.close)
+
+    # Columnar snapshots for /analytics (needs pyarrow and pandas to take one)
+    app.snapshots = Snapshots(app.db, app.config.get('SNAPSHOT_DIR', 'snapshots'))
+
     # Get allowed origins from study_activities table
     allowed_origins = get_allowed_origins(app)
     
@@ -57,7 +160,7 @@ def create_app(test_config=None):
         }
     })
 
-    # Close database connection
+    # Return the request's database connection to the pool
     @app.teardown_appcontext
     def close_db(exception):
         app.db.close()
@@ -68,6 +171,13 @@ def create_app(test_config=None):
     routes.study_sessions.load(app)
     routes.dashboard.load(app)
     routes.study_activities.load(app)
+    routes.export.load(app)
+    routes.debug.load(app)
+    routes.metrics.load(app)
+    routes.analytics.load(app)
+
+    if app.config.get('PRELOAD', False):
+        preload.run(app, words=app.config.get('PRELOAD_WORDS', 256))
     
     return app
 
@@ -0,0 +1,8 @@
+# ASGI entry point: uvicorn asgi:app
+#
+# Serves the same routes as app.py. See lib/asgi.py for how requests are
+# dispatched to the reader threads and the single writer thread.
+from app import app as flask_app
+from lib.asgi import AsgiAdapter
+
+app = AsgiAdapter(flask_app, readers=flask_app.config.get('ASGI_READERS', 4))
@@ -0,0 +1,201 @@
+import asyncio
+import io
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# ASGI front end for the Flask app (`uvicorn asgi:app`).
+#
+# The event loop reads request bodies and writes responses, so a slow client
+# never holds a thread while it uploads or downloads. Only the complete request
+# is handed to the Flask app, which runs (with its SQLite work) on one of two
+# executors: `readers` threads for GET/HEAD/OPTIONS and a single writer thread
+# for everything else. Writes are therefore serialised and never wait on each
+# other's database locks, while reads run in parallel under WAL. Routes and
+# JSON responses are exactly those of the WSGI app.
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Response chunks buffered between the app thread and the event loop
+MAX_PENDING_CHUNKS = 8
+
+class AsgiAdapter:
+  def __init__(self, wsgi_app, readers=4):
+    self.wsgi_app = wsgi_app
+    self.readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='asgi-reader')
+    self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asgi-writer')
+
+  async def __call__(self, scope, receive, send):
+    if scope['type'] == 'lifespan':
+      await self.lifespan(receive, send)
+    elif scope['type'] == 'http':
+      await self.http(scope, receive, send)
+
+  async def lifespan(self, receive, send):
+    while True:
+      message = await receive()
+      if message['type'] == 'lifespan.startup':
+        await send({'type': 'lifespan.startup.complete'})
+      elif message['type'] == 'lifespan.shutdown':
+        self.close()
+        await send({'type': 'lifespan.shutdown.complete'})
+        return
+
+  def close(self):
+    self.readers.shutdown(wait=True)
+    self.writer.shutdown(wait=True)
+    review_queue = getattr(self.wsgi_app, 'review_queue', None)
+    if review_queue is not None:
+      review_queue.close()
+    self.wsgi_app.db.dispose()
+
+  async def read_body(self, receive):
+    chunks = []
+    while True:
+      message = await receive()
+      if message['type'] == 'http.disconnect':
+        return None
+      chunks.append(message.get('body', b''))
+      if not message.get('more_body', False):
+        return b''.join(chunks)
+
+  def environ(self, scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+      'REQUEST_METHOD': scope['method'],
+      'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+      'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+      'QUERY_STRING': scope['query_string'].decode('latin-1'),
+      'SERVER_NAME': server[0],
+      'SERVER_PORT': str(server[1]),
+      'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+      'REMOTE_ADDR': client[0],
+      'CONTENT_LENGTH': str(len(body)),
+      'wsgi.version': (1, 0),
+      'wsgi.url_scheme': scope.get('scheme', 'http'),
+      'wsgi.input': io.BytesIO(body),
+      'wsgi.errors': sys.stderr,
+      'wsgi.multithread': True,
+      'wsgi.multiprocess': False,
+      'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+      name = name.decode('latin-1').upper().replace('-', '_')
+      value = value.decode('latin-1')
+      if name == 'CONTENT_TYPE':
+        environ['CONTENT_TYPE'] = value
+      elif name != 'CONTENT_LENGTH':
+        key = 'HTTP_' + name
+        environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+  async def http(self, scope, receive, send):
+    body = await self.read_body(receive)
+    if body is None:
+      return
+
+    loop = asyncio.get_running_loop()
+    chunks = asyncio.Queue(MAX_PENDING_CHUNKS)
+    disconnected = threading.Event()
+    executor = self.readers if scope['method'] in READ_METHODS else self.writer
+
+    def put(item):
+      # Blocks the app thread while the client is slower than the app
+      if disconnected.is_set():
+        raise ConnectionAbortedError('Client disconnected')
+      asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+    def run():
+      start = {}
+
+      def start_response(status, headers, exc_info=None):
+        start['status'] = int(status.split(' ', 1)[0])
+        start['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers]
+
+      try:
+        result = self.wsgi_app(self.environ(scope, body), start_response)
+        try:
+          put(('start', start))
+          for data in result:
+            if data:
+              put(('body', data))
+        finally:
+          if hasattr(result, 'close'):
+            result.close()
+        put(('end', None))
+      except ConnectionAbortedError:
+        pass
+      except Exception as e:
+        put(('error', e))
+
+    task = loop.run_in_executor(executor, run)
+    try:
+      await self.respond(chunks, send)
+    except BaseException:
+      # Unblock and stop the app thread, e.g. when the client went away mid-stream
+      disconnected.set()
+      while not task.done():
+        try:
+          chunks.get_nowait()
+        except asyncio.QueueEmpty:
+          await asyncio.sleep(0.001)
+      raise
+    await task
+
+  async def respond(self, chunks, send):
+    started = False
+    while True:
+      kind, value = await chunks.get()
+      if kind == 'start':
+        await send({'type': 'http.response.start', 'status': value['status'], 'headers': value['headers']})
+        started = True
+      elif kind == 'body':
+        await send({'type': 'http.response.body', 'body': value, 'more_body': True})
+      elif kind == 'end':
+        await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        return
+      else:
+        if not started:
+          await send({'type': 'http.response.start', 'status': 500,
+                      'headers': [(b'content-type', b'text/plain')]})
+          await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+        raise value
+
+async def call(app, method, path, body=b'', headers=(), upload_delay=0):
+  # In-process ASGI client for the contract check and the benchmarks; returns
+  # (status, headers, body). upload_delay simulates a client slow to send its body.
+  path, _, query = path.partition('?')
+  scope = {
+    'type': 'http',
+    'http_version': '1.1',
+    'method': method,
+    'scheme': 'http',
+    'path': path,
+    'root_path': '',
+    'query_string': query.encode('latin-1'),
+    'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    'server': ('127.0.0.1', 8000),
+    'client': ('127.0.0.1', 0),
+  }
+  received = False
+  response = {'status': None, 'headers': [], 'body': []}
+
+  async def receive():
+    nonlocal received
+    if received:
+      await asyncio.Event().wait()  # Nothing more to send until the client disconnects
+    received = True
+    if upload_delay:
+      await asyncio.sleep(upload_delay)
+    return {'type': 'http.request', 'body': body, 'more_body': False}
+
+  async def send(message):
+    if message['type'] == 'http.response.start':
+      response['status'] = message['status']
+      response['headers'] = message['headers']
+    else:
+      response['body'].append(message.get('body', b''))
+
+  await app(scope, receive, send)
+  return response['status'], response['headers'], b''.join(response['body'])
@@ -0,0 +1,913 @@
+import asyncio
+import contextlib
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from flask import Flask
+
+from lib import asgi, datagen, learning_stats, sampling, scheduler, snapshots
+from lib.db import Db
+
+# Routes timed by `invoke bench`
+DEFAULT_PATHS = ['/words', '/dashboard/stats']
+
+def percentile(samples, pct):
+  # Nearest-rank percentile over an unsorted list of samples
+  ordered = sorted(samples)
+  index = max(0, int(round(pct / 100.0 * len(ordered))) - 1)
+  return ordered[min(index, len(ordered) - 1)]
+
+def time_route(client, path, requests=200, warmup=10):
+  for _ in range(warmup):
+    client.get(path)
+
+  samples = []
+  for _ in range(requests):
+    start = time.perf_counter()
+    response = client.get(path)
+    samples.append((time.perf_counter() - start) * 1000)
+    if response.status_code != 200:
+      raise RuntimeError(f"{path} returned {response.status_code}")
+
+  return {
+    "path": path,
+    "requests": requests,
+    "p50_ms": round(percentile(samples, 50), 3),
+    "p99_ms": round(percentile(samples, 99), 3),
+    "rps": round(requests / (sum(samples) / 1000), 1)
+  }
+
+def build_database(path, sessions=200, reviews_per_session=20, seed=42):
+  # Seed data plus a reproducible study history so dashboard queries have work to do
+  if os.path.exists(path):
+    return
+  app = Flask(__name__)
+  Db(database=path).init(app)
+
+  rng = random.Random(seed)
+  connection = sqlite3.connect(path)
+  word_ids = [row[0] for row in connection.execute('SELECT id FROM words')]
+  start = datetime.now(timezone.utc) - timedelta(days=sessions // 4)
+  for i in range(sessions):
+    created_at = (start + timedelta(hours=i * 6)).strftime('%Y-%m-%d %H:%M:%S')
+    group_id = rng.choice([1, 2])
+    answers = [(rng.choice(word_ids), rng.random() < 0.7) for _ in range(reviews_per_session)]
+    cursor = connection.execute('''
+      INSERT INTO study_sessions (group_id, study_activity_id, created_at, ended_at, review_count, correct_count)
+      VALUES (?, 1, ?, ?, ?, ?)
+    ''', (group_id, created_at, created_at, reviews_per_session, sum(correct for _, correct in answers)))
+    session_id = cursor.lastrowid
+    connection.executemany('''
+      INSERT INTO word_review_items (word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?)
+    ''', [(word_id, session_id, correct, created_at) for word_id, correct in answers])
+  connection.commit()
+  learning_stats.rebuild(connection)
+  scheduler.rebuild(connection)
+  connection.close()
+
+SEARCH_QUERIES = ['水', '学校', 'kaki', 'school', 'to read', 'ka', 'tea']
+
+def build_search_database(path, words=500000, seed=42):
+  # Seed data plus `words` synthetic words, indexed by words_fts through its triggers
+  if os.path.exists(path):
+    return
+  app = Flask(__name__)
+  Db(database=path).init(app)
+
+  rng = random.Random(seed)
+  syllables = list(datagen.KANA)
+  connection = sqlite3.connect(path)
+  rows = [datagen.word(rng, syllables) for _ in range(words)]
+  connection.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)', rows)
+  connection.commit()
+  connection.close()
+
+def build_feature_database(path, **shape):
+  # Seed data plus only the synthetic data of `shape` (lib/datagen.py options),
+  # built once and reused afterwards
+  if not os.path.exists(path):
+    datagen.generate(path, **dict({"words": 0, "groups": 0, "sessions": 0, "reviews": 0}, **shape))
+
+def search_latency(create_app, database, queries=SEARCH_QUERIES, requests=100):
+  app = create_app({'DATABASE': database})
+  client = app.test_client()
+  try:
+    return [time_route(client, '/words/search?q=' + query.replace(' ', '+'), requests=requests) for query in queries]
+  finally:
+    app.db.dispose()
+
+# The overdue words of a group found by joining every member with its schedule
+# and sorting them, i.e. without the due_at copy on word_groups
+SCHEDULE_SCAN_SQL = '''
+  SELECT w.id, s.due_at
+  FROM word_groups wg INDEXED BY idx_word_groups_group_word
+  JOIN word_schedule s ON s.word_id = wg.word_id
+  JOIN words w ON w.id = wg.word_id
+  WHERE wg.group_id = ? AND s.due_at <= ?
+  ORDER BY s.due_at, wg.word_id
+  LIMIT ?
+'''
+
+SCHEDULE_SEEK_SQL = '''
+  SELECT w.id, wg.due_at
+  FROM word_groups wg
+  JOIN words w ON w.id = wg.word_id
+  WHERE wg.group_id = ? AND wg.due_at <= ?
+  ORDER BY wg.due_at, wg.word_id
+  LIMIT ?
+'''
+
+def time_query(connection, sql, params, requests=200, warmup=5):
+  return time_call(lambda: connection.execute(sql, params).fetchall(), requests=requests, warmup=warmup)
+
+def time_call(call, requests=200, warmup=5):
+  for _ in range(warmup):
+    call()
+  samples = []
+  for _ in range(requests):
+    start = time.perf_counter()
+    call()
+    samples.append((time.perf_counter() - start) * 1000)
+  return {
+    "p50_ms": round(percentile(samples, 50), 3),
+    "p95_ms": round(percentile(samples, 95), 3),
+    "p99_ms": round(percentile(samples, 99), 3)
+  }
+
+@contextlib.contextmanager
+def timing(create_app, database, **config):
+  # A connection to time queries on, the app (configured with `config`) and a
+  # function that times GET requests to one of its paths
+  connection = sqlite3.connect(database)
+  app = create_app(dict(config, DATABASE=database))
+  senders = [test_client_sender(app)]
+
+  def route(path, requests=200):
+    return time_endpoint(senders, {"path": path}, requests=requests)
+  try:
+    yield connection, app, route
+  finally:
+    app.db.dispose()
+    connection.close()
+
+def schedule_latency(create_app, database, n=20, requests=200):
+  # GET /groups/<id>/next-words on the largest, a middle and the smallest group,
+  # next to the index seek it runs and the scan-and-sort query it replaces
+  now = learning_stats.timestamp()
+  results = []
+  with timing(create_app, database, RESPONSE_CACHE_SIZE=0) as (connection, app, route):
+    scheduled = connection.execute('SELECT COUNT(*) FROM word_schedule').fetchone()[0]
+    sizes = connection.execute('''
+      SELECT id, words_count FROM groups WHERE words_count > 0 ORDER BY words_count DESC
+    ''').fetchall()
+    picked = [sizes[0], sizes[len(sizes) // 2], sizes[-1]] if sizes else []
+    for group_id, words in picked:
+      params = (group_id, now, n)
+      due = connection.execute(
+        'SELECT COUNT(*) FROM word_groups WHERE group_id = ? AND due_at <= ?', (group_id, now)
+      ).fetchone()[0]
+      results.append({
+        "group_id": group_id,
+        "words": words,
+        "due": due,
+        "route": route(f'/groups/{group_id}/next-words?n={n}', requests=requests),
+        "seek": time_query(connection, SCHEDULE_SEEK_SQL, params, requests=requests),
+        "scan": time_query(connection, SCHEDULE_SCAN_SQL, params, requests=max(requests // 10, 5))
+      })
+  return {"scheduled": scheduled, "n": n, "groups": results}
+
+# A /words page sorted by a review count as it was queried before the counts
+# were copied onto words: every word joined with its reviews, then sorted
+SORT_JOIN_SQL = '''
+  SELECT w.id, COALESCE(r.{sort_by}, 0) AS sort_value
+  FROM words w
+  LEFT JOIN word_reviews r ON w.id = r.word_id
+  ORDER BY COALESCE(r.{sort_by}, 0) {order}, w.id {order}
+  LIMIT 51
+'''
+
+def sort_latency(create_app, database, requests=100):
+  # First and later (cursor) page of every /words sort, and the join-and-sort
+  # query the review count sorts replace
+  results = []
+  with timing(create_app, database) as (connection, app, route):
+    words = connection.execute('SELECT COUNT(*) FROM words').fetchone()[0]
+    client = app.test_client()
+    for sort_by in ['kanji', 'romaji', 'english', 'correct_count', 'wrong_count']:
+      for order in ['asc', 'desc']:
+        path = f'/words?sort_by={sort_by}&order={order}&with_total=0'
+        after = client.get(path).get_json()["next_cursor"]
+        result = {
+          "sort_by": sort_by,
+          "order": order,
+          "first": route(path, requests=requests),
+          "cursor": route(f'{path}&after={after}', requests=requests)
+        }
+        if sort_by.endswith('_count'):
+          sql = SORT_JOIN_SQL.format(sort_by=sort_by, order=order)
+          result["join"] = time_query(connection, sql, (), requests=3, warmup=1)
+        results.append(result)
+  return {"words": words, "results": results}
+
+# A group sample drawn by shuffling the whole group
+SAMPLE_SHUFFLE_SQL = '''
+  SELECT wg.word_id
+  FROM word_groups wg
+  WHERE wg.group_id = ?
+  ORDER BY RANDOM()
+  LIMIT ?
+'''
+
+def sample_latency(create_app, database, n=20, requests=200):
+  # GET /groups/<id>/sample on each group, uniform, weighted and without the
+  # mastered words, and the uniform draw itself next to ORDER BY RANDOM() over
+  # the group
+  results = []
+  with timing(create_app, database) as (connection, app, route):
+    groups = connection.execute('SELECT id, words_count FROM groups WHERE words_count > 0 ORDER BY words_count DESC')
+    for group_id, words in groups.fetchall()[:3]:
+      path = f'/groups/{group_id}/sample?n={n}&seed=1'
+      results.append({
+        "group_id": group_id,
+        "words": words,
+        "uniform": route(path, requests=requests),
+        "weighted": route(f'{path}&weighted=1', requests=requests),
+        "exclude_mastered": route(f'{path}&weighted=1&exclude_mastered=1', requests=requests),
+        "draw": time_call(lambda: sampling.sample(connection.cursor(), group_id, words, n, 1), requests=requests),
+        "shuffle": time_query(connection, SAMPLE_SHUFFLE_SQL, (group_id, n), requests=max(requests // 10, 5))
+      })
+  return {"n": n, "groups": results}
+
+# The current streak as /dashboard/stats counted it before streaks were kept
+# in learning_stats: every session grouped by day on each request
+STREAK_SCAN_SQL = '''
+  WITH daily_sessions AS (
+    SELECT date(created_at) as study_date, COUNT(*) as session_count
+    FROM study_sessions
+    GROUP BY date(created_at)
+  ),
+  streak_calc AS (
+    SELECT study_date, julianday(study_date) - julianday(lag(study_date, 1) over (order by study_date)) as days_diff
+    FROM daily_sessions
+  )
+  SELECT COUNT(*) as streak
+  FROM (SELECT study_date FROM streak_calc WHERE days_diff = 1 OR days_diff IS NULL ORDER BY study_date DESC)
+'''
+
+STREAK_LOOKUP_SQL = 'SELECT current_streak, longest_streak, streak_end FROM learning_stats WHERE id = 1'
+
+def streak_latency(create_app, database, requests=200):
+  # /dashboard/stats next to the streak lookup it runs and the query it replaces,
+  # and the cost of recording a session (rolled back) on a new day and on a day
+  # before the whole history, which recounts the streaks
+  with timing(create_app, database, RESPONSE_CACHE_SIZE=0) as (connection, app, route):
+    sessions = connection.execute('SELECT COUNT(*) FROM study_sessions').fetchone()[0]
+    days, first_day = connection.execute('SELECT COUNT(*), MIN(day) FROM activity_days').fetchone()
+    streak = learning_stats.streaks(connection.cursor())
+
+    def record(created_at):
+      samples = []
+      for _ in range(requests):
+        start = time.perf_counter()
+        learning_stats.record_session(connection.cursor(), created_at)
+        samples.append((time.perf_counter() - start) * 1000)
+        connection.rollback()
+      return {"p50_ms": round(percentile(samples, 50), 3), "p95_ms": round(percentile(samples, 95), 3)}
+
+    tomorrow = learning_stats.day_after(learning_stats.timestamp()[:10]) + ' 12:00:00'
+    before_history = (datetime.fromisoformat(first_day) - timedelta(days=1)).strftime('%Y-%m-%d 12:00:00')
+    return {
+      "sessions": sessions,
+      "days": days,
+      "first_day": first_day,
+      **streak,
+      "route": route('/dashboard/stats', requests=requests),
+      "lookup": time_query(connection, STREAK_LOOKUP_SQL, (), requests=requests),
+      "scan": time_query(connection, STREAK_SCAN_SQL, (), requests=max(requests // 10, 5)),
+      "record_new_day": record(tomorrow),
+      "record_backfill": record(before_history)
+    }
+
+# Accuracy per group and day as a request handler would have to aggregate it
+GROUP_ACCURACY_SQL = '''
+  SELECT ss.group_id, date(wri.created_at) AS day, COUNT(*), SUM(wri.correct)
+  FROM word_review_items wri
+  JOIN study_sessions ss ON ss.id = wri.study_session_id
+  GROUP BY ss.group_id, day
+'''
+
+def analytics_latency(create_app, database, directory, requests=200):
+  # A first snapshot, a second one with nothing new to copy, and the
+  # /analytics/group-accuracy route next to the SQL aggregate it replaces
+  with timing(create_app, database, SNAPSHOT_DIR=directory) as (connection, app, route):
+    first = snapshots.take(connection, directory)
+    second = snapshots.take(connection, directory)
+    aggregate = time_query(connection, GROUP_ACCURACY_SQL, (), requests=3, warmup=0)
+    (group_id,) = connection.execute('SELECT group_id FROM study_sessions ORDER BY id LIMIT 1').fetchone()
+    return {
+      "rows": {table: entry["rows"] for table, entry in first["tables"].items()},
+      "first": first["timings_ms"],
+      "again": second["timings_ms"],
+      "route": route('/analytics/group-accuracy', requests=requests),
+      "route_group": route(f'/analytics/group-accuracy?group_id={group_id}', requests=requests),
+      "aggregate": aggregate
+    }
+
+def history_latency(create_app, database, requests=50):
+  # Routes and maintenance queries that read the review history, for the
+  # before/after report of `invoke compact-reviews`
+  connection = sqlite3.connect(database)
+  connection.row_factory = sqlite3.Row
+  ids = endpoint_ids(connection)
+  start = time.perf_counter()
+  learning_stats.recompute(connection.cursor())
+  recompute_ms = (time.perf_counter() - start) * 1000
+  connection.close()
+
+  paths = [
+    '/dashboard/stats',
+    '/dashboard/recent-session',
+    f"/api/study-sessions/{ids['session_id']}",
+    f"/words/{ids['word_id']}",
+    f"/groups/{ids['group_id']}/study_sessions"
+  ]
+  app = create_app({'DATABASE': database, 'RESPONSE_CACHE_SIZE': 0})
+  senders = [test_client_sender(app)]
+  try:
+    results = [time_endpoint(senders, {"path": path}, requests=requests, warmup=2) for path in paths]
+  finally:
+    app.db.dispose()
+  return {"recompute_ms": round(recompute_ms, 1), "results": results}
+
+def run(create_app, database, paths=DEFAULT_PATHS, requests=200, pool_size=5):
+  app = create_app({'DATABASE': database, 'DATABASE_POOL_SIZE': pool_size})
+  client = app.test_client()
+  try:
+    return [time_route(client, path, requests=requests) for path in paths]
+  finally:
+    app.db.dispose()
+
+def review_throughput(create_app, database, reviews=2000, batch_size=None, seed=42):
+  # Reviews/sec through POST /study_sessions/<id>/review (batch_size=None)
+  # or POST /study_sessions/<id>/reviews:batch
+  app = create_app({'DATABASE': database})
+  client = app.test_client()
+  rng = random.Random(seed)
+  with app.app_context():
+    cursor = app.db.cursor()
+    cursor.execute('SELECT id FROM words')
+    word_ids = [row['id'] for row in cursor.fetchall()]
+    cursor.execute('SELECT MAX(id) FROM study_sessions')
+    session_id = cursor.fetchone()[0]
+  answers = [{"word_id": rng.choice(word_ids), "correct": rng.random() < 0.7} for _ in range(reviews)]
+
+  try:
+    start = time.perf_counter()
+    if batch_size is None:
+      for answer in answers:
+        response = client.post(f'/study_sessions/{session_id}/review', json=answer)
+        if response.status_code != 200:
+          raise RuntimeError(f"review returned {response.status_code}")
+    else:
+      for offset in range(0, reviews, batch_size):
+        response = client.post(f'/study_sessions/{session_id}/reviews:batch',
+                               json={"reviews": answers[offset:offset + batch_size]})
+        if response.status_code != 200:
+          raise RuntimeError(f"reviews:batch returned {response.status_code}")
+    elapsed = time.perf_counter() - start
+  finally:
+    app.db.dispose()
+
+  return {
+    "endpoint": 'review' if batch_size is None else f'reviews:batch ({batch_size})',
+    "reviews": reviews,
+    "reviews_per_sec": round(reviews / elapsed, 1)
+  }
+
+def serve(app):
+  # Run the app on a threaded local HTTP server; returns the server (call shutdown())
+  from werkzeug.serving import WSGIRequestHandler, make_server
+
+  class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+      pass
+
+  server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+  threading.Thread(target=server.serve_forever, daemon=True).start()
+  return server
+
+def concurrent_reviews(create_app, database, config=None, clients=32, reviews_per_client=50, seed=42):
+  # Many clients posting single reviews at once over HTTP
+  app = create_app(dict({'DATABASE': database}, **(config or {})))
+  with app.app_context():
+    cursor = app.db.cursor()
+    cursor.execute('SELECT id FROM words')
+    word_ids = [row['id'] for row in cursor.fetchall()]
+    cursor.execute('SELECT id FROM study_sessions')
+    session_ids = [row['id'] for row in cursor.fetchall()]
+
+  server = serve(app)
+  samples = []
+  errors = []
+  lock = threading.Lock()
+
+  def client(number):
+    rng = random.Random(seed + number)
+    connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+    for _ in range(reviews_per_client):
+      body = json.dumps({"word_id": rng.choice(word_ids), "correct": rng.random() < 0.7})
+      start = time.perf_counter()
+      try:
+        connection.request('POST', f'/study_sessions/{rng.choice(session_ids)}/review', body,
+                           {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        payload = response.read()
+        status = response.status
+      except Exception as e:
+        status, payload = None, str(e).encode()
+        connection.close()
+        connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+      elapsed = (time.perf_counter() - start) * 1000
+      with lock:
+        samples.append(elapsed)
+        if status not in (200, 202):
+          errors.append(payload[:200])
+    connection.close()
+
+  threads = [threading.Thread(target=client, args=(number,)) for number in range(clients)]
+  start = time.perf_counter()
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  elapsed = time.perf_counter() - start
+
+  server.shutdown()
+  queue_metrics = None
+  if app.review_queue is not None:
+    app.review_queue.close()
+    queue_metrics = app.review_queue.metrics()
+  app.db.dispose()
+
+  total = clients * reviews_per_client
+  return {
+    "clients": clients,
+    "reviews": total,
+    "reviews_per_sec": round(total / elapsed, 1),
+    "p50_ms": round(percentile(samples, 50), 3),
+    "p99_ms": round(percentile(samples, 99), 3),
+    "errors": len(errors),
+    "locked_errors": sum(1 for error in errors if b'locked' in error),
+    "queue": queue_metrics
+  }
+
+def client_requests(rng, word_ids, count):
+  # A study activity client: mostly reads, plus a session created by a client slow to upload
+  requests = []
+  for number in range(count):
+    kind = number % 4
+    if kind == 0:
+      requests.append(('GET', f'/words?page={rng.randint(1, 3)}', None, False))
+    elif kind == 1:
+      requests.append(('GET', '/dashboard/stats', None, False))
+    elif kind == 2:
+      requests.append(('GET', f'/words/{rng.choice(word_ids)}', None, False))
+    else:
+      requests.append(('POST', '/study_sessions', {"group_id": 1, "study_activity_id": 1}, True))
+  return requests
+
+def server_modes(create_app, database, clients, requests_per_client=4, workers=8, readers=4,
+                 upload_delay=0.05, seed=42):
+  # Requests/sec of `clients` concurrent clients against the WSGI app on a fixed pool
+  # of `workers` threads (a slow upload holds its worker) and against the ASGI front end
+  # (slow uploads wait on the event loop). Returns {mode: result}.
+  results = {}
+  for mode in ('wsgi', 'asgi'):
+    app = create_app({'DATABASE': database})
+    client = app.test_client()
+    with app.app_context():
+      cursor = app.db.cursor()
+      cursor.execute('SELECT id FROM words')
+      word_ids = [row['id'] for row in cursor.fetchall()]
+    asgi_app = asgi.AsgiAdapter(app, readers=readers) if mode == 'asgi' else None
+    pool = ThreadPoolExecutor(max_workers=workers) if mode == 'wsgi' else None
+    samples = []
+    errors = []
+
+    def handle(method, path, data, slow):
+      if slow:
+        time.sleep(upload_delay)
+      response = client.open(path, method=method, json=data)
+      return response.status_code
+
+    async def request(method, path, data, slow):
+      if mode == 'wsgi':
+        return await asyncio.get_running_loop().run_in_executor(pool, handle, method, path, data, slow)
+      body, headers = b'', []
+      if data is not None:
+        body, headers = json.dumps(data).encode('utf-8'), [('Content-Type', 'application/json')]
+      status, _, _ = await asgi.call(asgi_app, method, path, body, headers, upload_delay if slow else 0)
+      return status
+
+    async def run_client(number):
+      for method, path, data, slow in client_requests(random.Random(seed + number), word_ids, requests_per_client):
+        start = time.perf_counter()
+        status = await request(method, path, data, slow)
+        samples.append((time.perf_counter() - start) * 1000)
+        if status not in (200, 201):
+          errors.append((path, status))
+
+    async def run_clients():
+      await asyncio.gather(*(run_client(number) for number in range(clients)))
+
+    start = time.perf_counter()
+    asyncio.run(run_clients())
+    elapsed = time.perf_counter() - start
+    if pool is not None:
+      pool.shutdown()
+    if asgi_app is not None:
+      asgi_app.close()
+    else:
+      app.db.dispose()
+
+    total = clients * requests_per_client
+    results[mode] = {
+      "clients": clients,
+      "requests": total,
+      "rps": round(total / elapsed, 1),
+      "p50_ms": round(percentile(samples, 50), 3),
+      "p99_ms": round(percentile(samples, 99), 3),
+      "errors": len(errors)
+    }
+  return results
+
+def read_paths(ids, words=200):
+  # The reads of `invoke bench-workers`: cached lists, hot words and uncached pages
+  return [
+    '/groups',
+    '/api/study-activities',
+    '/dashboard/stats',
+    f"/groups/{ids['group_id']}/words",
+    '/words?page=2&sort_by=correct_count&order=desc',
+  ] + [f"/words/{word_id}" for word_id in range(ids['word_id'], ids['word_id'] + words)]
+
+def free_port():
+  with socket.socket() as sock:
+    sock.bind(('127.0.0.1', 0))
+    return sock.getsockname()[1]
+
+def start_workers(database, workers, port, preload=True):
+  # `invoke serve` with `workers` processes, once it answers
+  process = subprocess.Popen(
+    [sys.executable, '-m', 'invoke', 'serve', '--database', os.path.abspath(database), '--workers', str(workers),
+     '--port', str(port), '--log-level', 'warning'] + ([] if preload else ['--no-preload']),
+    cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  )
+  deadline = time.time() + 120
+  while time.time() < deadline and process.poll() is None:
+    try:
+      connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+      connection.request('GET', '/api/study-activities')
+      if connection.getresponse().status == 200:
+        connection.close()
+        return process
+    except OSError:
+      time.sleep(0.2)
+  process.terminate()
+  raise RuntimeError(f"{workers} worker(s) did not start on port {port}")
+
+def stop_workers(process):
+  process.terminate()
+  try:
+    process.wait(timeout=30)
+  except subprocess.TimeoutExpired:
+    process.kill()
+
+def read_load(port, paths, seconds, seed):
+  # One client process: keep-alive GETs of random paths for `seconds`; returns (requests, errors)
+  rng = random.Random(seed)
+  connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+  count = errors = 0
+  deadline = time.perf_counter() + seconds
+  while time.perf_counter() < deadline:
+    try:
+      connection.request('GET', rng.choice(paths))
+      response = connection.getresponse()
+      response.read()
+      if response.status != 200:
+        errors += 1
+    except (OSError, http.client.HTTPException):
+      errors += 1
+      connection.close()
+      connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    count += 1
+  connection.close()
+  return count, errors
+
+def worker_scaling(database, worker_counts=(1, 2, 4), clients=8, seconds=5, warmup=2):
+  # Read requests/sec of uvicorn with 1, 2, 4... worker processes, loaded by
+  # `clients` client processes (so the load generator is not bound by one GIL)
+  connection = sqlite3.connect(database)
+  connection.row_factory = sqlite3.Row
+  paths = read_paths(endpoint_ids(connection))
+  connection.close()
+  results = []
+  with multiprocessing.Pool(clients) as pool:
+    for workers in worker_counts:
+      port = free_port()
+      process = start_workers(database, workers, port)
+      try:
+        pool.starmap(read_load, [(port, paths, warmup, number) for number in range(clients)])
+        counts = pool.starmap(read_load, [(port, paths, seconds, number) for number in range(clients)])
+      finally:
+        stop_workers(process)
+      total = sum(count for count, _ in counts)
+      results.append({
+        "workers": workers,
+        "rps": round(total / seconds, 1),
+        "errors": sum(errors for _, errors in counts)
+      })
+  for result in results:
+    result["speedup"] = round(result["rps"] / results[0]["rps"], 2) if results[0]["rps"] else None
+  return {"cpus": os.cpu_count(), "clients": clients, "paths": len(paths), "results": results}
+
+def endpoint_ids(connection):
+  # The busiest group, session, word and activity, so every route has real work to do
+  def first(sql):
+    row = connection.execute(sql).fetchone()
+    return row[0] if row and row[0] is not None else 1
+  return {
+    "group_id": first('SELECT group_id FROM study_sessions GROUP BY group_id ORDER BY COUNT(*) DESC LIMIT 1'),
+    "session_id": first('SELECT id FROM study_sessions ORDER BY review_count DESC LIMIT 1'),
+    "word_id": first('SELECT word_id FROM word_reviews ORDER BY correct_count + wrong_count DESC LIMIT 1'),
+    "activity_id": first('SELECT study_activity_id FROM study_sessions GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1')
+  }
+
+def endpoints(ids):
+  # Every route timed by `invoke bench-endpoints`. Writes come last and add
+  # sessions and reviews to the database; /api/study-sessions/reset and the
+  # /debug routes are left out.
+  group, session, word, activity = ids["group_id"], ids["session_id"], ids["word_id"], ids["activity_id"]
+  return [
+    {"path": '/words'},
+    {"path": '/words?page=2&sort_by=correct_count&order=desc'},
+    {"path": '/words?with_total=0&sort_by=english'},
+    {"path": '/words/search?q=school'},
+    {"path": '/words/search?q=ka'},
+    {"path": f'/words/{word}'},
+    {"path": '/words?ids=' + ','.join(str(word_id) for word_id in range(word, word + 100))},
+    {"method": 'POST', "path": '/words/batch', "json": {"ids": list(range(word, word + 2000))}},
+    {"path": '/groups'},
+    {"path": '/groups?sort_by=words_count&order=desc'},
+    {"path": f'/groups/{group}'},
+    {"path": f'/groups/{group}/words'},
+    {"path": f'/groups/{group}/words?sort_by=correct_count&order=desc'},
+    {"path": f'/groups/{group}/words/raw'},
+    {"path": f'/groups/{group}/next-words?n=20'},
+    {"path": f'/groups/{group}/sample?n=20&seed=1&weighted=1'},
+    {"path": f'/groups/{group}/study_sessions'},
+    {"path": f'/groups/{group}/study_sessions?sort_by=reviewItemsCount&order=desc'},
+    {"path": '/api/study-sessions'},
+    {"path": f'/api/study-sessions/{session}'},
+    {"path": '/api/study-activities'},
+    {"path": f'/api/study-activities/{activity}'},
+    {"path": f'/api/study-activities/{activity}/sessions'},
+    {"path": f'/api/study-activities/{activity}/launch'},
+    {"path": '/dashboard/recent-session'},
+    {"path": '/dashboard/stats'},
+    {"path": f'/export/words.ndjson?group_id={group}'},
+    {"path": f'/export/reviews.csv?study_session_id={session}'},
+    {"path": '/metrics'},
+    {"method": 'POST', "path": '/study_sessions', "json": {"group_id": group, "study_activity_id": activity}},
+    {"method": 'POST', "path": f'/study_sessions/{session}/review', "json": {"word_id": word, "correct": True}},
+    {"method": 'POST', "path": f'/study_sessions/{session}/reviews:batch',
+     "json": {"reviews": [{"word_id": word, "correct": number % 3 > 0} for number in range(20)]}},
+    {"method": 'POST', "path": f'/study_sessions/{session}/end'},
+  ]
+
+def test_client_sender(app):
+  client = app.test_client()
+
+  def send(endpoint):
+    response = client.open(endpoint["path"], method=endpoint.get("method", 'GET'), json=endpoint.get("json"))
+    response.get_data()
+    return response.status_code
+  return send
+
+def http_sender(port):
+  # Keep-alive connection of its own, one per client thread
+  connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+  def send(endpoint):
+    body, headers = None, {}
+    if "json" in endpoint:
+      body, headers = json.dumps(endpoint["json"]), {'Content-Type': 'application/json'}
+    connection.request(endpoint.get("method", 'GET'), endpoint["path"], body, headers)
+    response = connection.getresponse()
+    response.read()
+    return response.status
+  return send
+
+def time_endpoint(senders, endpoint, requests=200, warmup=10):
+  # Latency percentiles and requests/sec of `requests` calls spread over one thread per sender
+  for _ in range(warmup):
+    senders[0](endpoint)
+
+  samples = []
+  errors = []
+  lock = threading.Lock()
+
+  def client(send, count):
+    for _ in range(count):
+      start = time.perf_counter()
+      status = send(endpoint)
+      elapsed = (time.perf_counter() - start) * 1000
+      with lock:
+        samples.append(elapsed)
+        if status >= 400:
+          errors.append(status)
+
+  counts = [requests // len(senders) + (1 if number < requests % len(senders) else 0) for number in range(len(senders))]
+  start = time.perf_counter()
+  cpu_start = time.process_time()
+  if len(senders) == 1:
+    client(senders[0], requests)
+  else:
+    threads = [threading.Thread(target=client, args=(send, count)) for send, count in zip(senders, counts)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+  elapsed = time.perf_counter() - start
+  cpu = time.process_time() - cpu_start
+
+  return {
+    "method": endpoint.get("method", 'GET'),
+    "path": endpoint["path"],
+    "requests": requests,
+    "p50_ms": round(percentile(samples, 50), 3),
+    "p95_ms": round(percentile(samples, 95), 3),
+    "p99_ms": round(percentile(samples, 99), 3),
+    "rps": round(requests / elapsed, 1),
+    # Process CPU per request: the app, and the in-process client or server
+    "cpu_ms": round(cpu * 1000 / requests, 3),
+    "errors": len(errors)
+  }
+
+def table_counts(connection):
+  return {
+    table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    for table in ('words', 'groups', 'word_groups', 'study_sessions', 'word_review_items')
+  }
+
+def commit():
+  # (hash, dirty) of the working tree, (None, None) outside a git checkout
+  import subprocess
+  try:
+    head = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                            capture_output=True, text=True, check=True).stdout
+  except (OSError, subprocess.CalledProcessError):
+    return None, None
+  return head, bool(status.strip())
+
+def copy_database(source, target):
+  # Through the backup API so pages still in the WAL are included
+  source_connection, target_connection = sqlite3.connect(source), sqlite3.connect(target)
+  source_connection.backup(target_connection)
+  source_connection.close()
+  target_connection.close()
+
+def remove_database(path):
+  for suffix in ('', '-wal', '-shm'):
+    if os.path.exists(path + suffix):
+      os.remove(path + suffix)
+
+def endpoint_suite(create_app, database, mode='client', requests=200, clients=1, cache=False, copy=True):
+  # Time every route in `mode` 'client' (Flask test client) or 'http' (local
+  # threaded server, `clients` keep-alive connections). Returns a JSON-ready report.
+  # With `copy` the routes run against a scratch copy of the database, so the
+  # writes of one run do not change what the next run measures.
+  connection = sqlite3.connect(database)
+  ids = endpoint_ids(connection)
+  counts = table_counts(connection)
+  connection.close()
+
+  path = database
+  if copy:
+    path = database + '.bench'
+    remove_database(path)
+    copy_database(database, path)
+  config = {'DATABASE': path}
+  if not cache:
+    config['RESPONSE_CACHE_SIZE'] = 0
+  app = create_app(config)
+
+  server = None
+  if mode == 'http':
+    server = serve(app)
+    senders = [http_sender(server.port) for _ in range(clients)]
+  else:
+    senders = [test_client_sender(app)]
+  try:
+    results = [time_endpoint(senders, endpoint, requests=requests) for endpoint in endpoints(ids)]
+  finally:
+    if server is not None:
+      server.shutdown()
+    app.db.dispose()
+    if copy:
+      remove_database(path)
+
+  head, dirty = commit()
+  return {
+    "commit": head,
+    "dirty": dirty,
+    "created_at": datetime.now().astimezone().isoformat(timespec='seconds'),
+    "mode": mode,
+    "clients": len(senders),
+    "cache": cache,
+    "database": os.path.basename(database),
+    "counts": counts,
+    "ids": ids,
+    "results": results
+  }
+
+def save_report(report, directory='bench-results'):
+  os.makedirs(directory, exist_ok=True)
+  stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+  path = os.path.join(directory, f"{stamp}-{(report['commit'] or 'nogit')[:10]}-{report['mode']}.json")
+  with open(path, 'w', encoding='utf-8') as file:
+    json.dump(report, file, indent=2)
+  return path
+
+def compare(before, after, threshold=0.15, floor_ms=1.0, metrics=('p50_ms', 'p95_ms')):
+  # Per-route changes between two reports. A route regressed when one of `metrics`
+  # grew by more than `threshold` and by more than `floor_ms` (timer noise); p99 is
+  # reported but too noisy over a few hundred requests to fail on.
+  previous = {(result["method"], result["path"]): result for result in before["results"]}
+  changes = []
+  for result in after["results"]:
+    old = previous.get((result["method"], result["path"]))
+    if old is None:
+      continue
+    regressed = [
+      metric for metric in metrics
+      if result[metric] > old[metric] * (1 + threshold) and result[metric] - old[metric] > floor_ms
+    ]
+    changes.append({
+      "method": result["method"],
+      "path": result["path"],
+      "before": {metric: old.get(metric) for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'cpu_ms')},
+      "after": {metric: result.get(metric) for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'cpu_ms')},
+      "regressed": regressed
+    })
+  return changes
+
+# Cheap routes, where the per-request cost of the metrics shows the most
+OVERHEAD_PATHS = ['/api/study-activities/1', '/groups/1', '/words']
+
+def metrics_overhead(create_app, database, paths=OVERHEAD_PATHS, requests=4000, rounds=40):
+  # Median latency per route with METRICS on and off (response cache off). The
+  # two apps take turns for `rounds` rounds so drift of the machine hits both.
+  apps = {
+    enabled: create_app({'DATABASE': database, 'RESPONSE_CACHE_SIZE': 0, 'METRICS': enabled})
+    for enabled in (False, True)
+  }
+  senders = {enabled: [test_client_sender(app)] for enabled, app in apps.items()}
+  samples = {(path, enabled): [] for path in paths for enabled in apps}
+  try:
+    for _ in range(rounds):
+      for path in paths:
+        for enabled in apps:
+          result = time_endpoint(senders[enabled], {"path": path}, requests=requests // rounds)
+          samples[(path, enabled)].append(result["p50_ms"])
+  finally:
+    for app in apps.values():
+      app.db.dispose()
+
+  results = []
+  for path in paths:
+    without, with_metrics = percentile(samples[(path, False)], 50), percentile(samples[(path, True)], 50)
+    results.append({
+      "path": path,
+      "p50_ms_without": without,
+      "p50_ms_with": with_metrics,
+      "overhead_us": round((with_metrics - without) * 1000, 1)
+    })
+  return results
+
+def print_results(label, results):
+  for result in results:
+    print(f"{label:<10} {result['path']:<24} p50 {result['p50_ms']:>8.3f}ms  "
+          f"p99 {result['p99_ms']:>8.3f}ms  {result['rps']:>8.1f} req/s")
@@ -0,0 +1,112 @@
+import gzip
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from lib import export
+
+# Retention for word_review_items (`invoke compact-reviews`).
+#
+# Reviews logged before the horizon (whole UTC days) are rolled up into
+# daily_word_stats, one row per day, word and group, and the raw rows are
+# archived as gzipped NDJSON (the format of /export/reviews.ndjson) and then
+# deleted. The table is walked by id, CHUNK_SIZE ids at a time. Each chunk is
+# written to the archive and flushed before the transaction that rolls it up
+# and deletes it commits, so an interrupted run loses nothing; it may leave
+# rows in an archive that are still in the table, and the next run archives
+# them again (ids are unique, so archives can be de-duplicated by id).
+#
+# Everything derived from the reviews stays as it is: word_reviews, word_stats,
+# activity_days, learning_stats, word_schedule and the counts on study_sessions.
+# Recomputing them reads the review_days view, which puts the rollup and the
+# raw rows back together. Only the per-session word lists
+# (/api/study-sessions/<id> and /export/reviews) lose the compacted sessions.
+
+HORIZON_DAYS = 365
+CHUNK_SIZE = 100000
+
+def cutoff(horizon_days, now=None):
+  # Start (UTC) of the oldest day that is kept raw
+  now = now or datetime.now(timezone.utc)
+  day = (now - timedelta(days=horizon_days)).date()
+  return f'{day.isoformat()} 00:00:00'
+
+ROLL_UP = '''
+  INSERT INTO daily_word_stats (day, word_id, group_id, correct_count, wrong_count)
+  SELECT
+    date(wri.created_at),
+    wri.word_id,
+    ss.group_id,
+    SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN wri.correct = 1 THEN 0 ELSE 1 END)
+  FROM word_review_items wri
+  JOIN study_sessions ss ON wri.study_session_id = ss.id
+  WHERE wri.id >= ? AND wri.id < ? AND wri.created_at < ?
+  GROUP BY date(wri.created_at), wri.word_id, ss.group_id
+  ON CONFLICT(day, word_id, group_id) DO UPDATE SET
+    correct_count = correct_count + excluded.correct_count,
+    wrong_count = wrong_count + excluded.wrong_count
+'''
+
+def compact(connection, horizon_days=HORIZON_DAYS, archive_dir='archive', chunk_size=CHUNK_SIZE, now=None,
+            log=print):
+  # Returns a summary of the run; the archive is only kept when rows were compacted
+  before = cutoff(horizon_days, now)
+  started = time.perf_counter()
+  first_id, last_id = connection.execute('SELECT MIN(id), MAX(id) FROM word_review_items').fetchone()
+
+  os.makedirs(archive_dir, exist_ok=True)
+  stamp = datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')
+  path = os.path.join(archive_dir, f'reviews-before-{before[:10]}-{stamp}.ndjson.gz')
+  select = f'''
+    SELECT {export.EXPORTS['reviews']['json']} FROM word_review_items
+    WHERE id >= ? AND id < ? AND created_at < ?
+    ORDER BY id
+  '''
+
+  compacted = 0
+  with gzip.open(path, 'wt', encoding='utf-8') as archive:
+    for start in range(first_id or 0, (last_id or -1) + 1, chunk_size):
+      end = start + chunk_size
+      rows = connection.execute(select, (start, end, before)).fetchall()
+      if not rows:
+        continue
+      archive.write('\n'.join(row[0] for row in rows) + '\n')
+      archive.flush()
+      os.fsync(archive.fileno())
+
+      connection.execute(ROLL_UP, (start, end, before))
+      connection.execute('DELETE FROM word_review_items WHERE id >= ? AND id < ? AND created_at < ?',
+                         (start, end, before))
+      connection.commit()
+      compacted += len(rows)
+      log(f"  {compacted} reviews compacted (ids up to {end - 1})")
+
+  if not compacted:
+    os.remove(path)
+    path = None
+  return {
+    "cutoff": before,
+    "reviews": compacted,
+    "archive": path,
+    "archive_bytes": os.path.getsize(path) if path else 0,
+    "seconds": round(time.perf_counter() - started, 1)
+  }
+
+def space(connection):
+  # Size of the database file, its free pages and the largest tables and indexes
+  page_size = connection.execute('PRAGMA page_size').fetchone()[0]
+  pages = connection.execute('PRAGMA page_count').fetchone()[0]
+  free = connection.execute('PRAGMA freelist_count').fetchone()[0]
+  objects = connection.execute('''
+    SELECT name, SUM(pgsize) FROM dbstat GROUP BY name ORDER BY SUM(pgsize) DESC LIMIT 10
+  ''').fetchall()
+  return {
+    "file_bytes": pages * page_size,
+    "free_bytes": free * page_size,
+    "rows": {
+      table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+      for table in ('word_review_items', 'daily_word_stats')
+    },
+    "largest": {name: size for name, size in objects}
+  }
@@ -0,0 +1,92 @@
+import asyncio
+import json
+
+from lib import asgi
+
+# API contract shared by the WSGI app and its ASGI front end.
+#
+# tests/test_asgi_contract.py replays these requests in order against both,
+# each on its own copy of the same database, and fails on any difference in
+# status, content type or body. Requests marked "status_only" return the current time or
+# timings.
+REQUESTS = [
+  {"method": 'GET', "path": '/words'},
+  {"method": 'GET', "path": '/words?page=2&sort_by=english&order=desc'},
+  {"method": 'GET', "path": '/words?with_total=0&sort_by=correct_count'},
+  {"method": 'GET', "path": '/words/1'},
+  {"method": 'GET', "path": '/words/999999'},
+  {"method": 'GET', "path": '/words?ids=3,1,999999,1'},
+  {"method": 'GET', "path": '/words?ids=1,x'},
+  {"method": 'POST', "path": '/words/batch', "json": {"ids": [2, 1, 3]}},
+  {"method": 'POST', "path": '/words/batch', "json": {"ids": []}},
+  {"method": 'POST', "path": '/words/batch', "json": [1, 2]},
+  {"method": 'GET', "path": '/words/search?q=to'},
+  {"method": 'GET', "path": '/words/search?q=write'},
+  {"method": 'GET', "path": '/groups'},
+  {"method": 'GET', "path": '/groups?sort_by=words_count&order=desc'},
+  {"method": 'GET', "path": '/groups/1'},
+  {"method": 'GET', "path": '/groups/1/words'},
+  {"method": 'GET', "path": '/groups/1/words/raw'},
+  {"method": 'GET', "path": '/groups/1/next-words?n=5', "status_only": True},
+  {"method": 'GET', "path": '/groups/999999/next-words'},
+  {"method": 'GET', "path": '/groups/1/sample?n=5&seed=3'},
+  {"method": 'GET', "path": '/groups/1/sample?n=100&seed=3&weighted=1&exclude_mastered=1'},
+  {"method": 'GET', "path": '/groups/1/sample?seed=x'},
+  {"method": 'GET', "path": '/groups/1/sample?n=abc'},
+  {"method": 'GET', "path": '/groups/999999/sample'},
+  {"method": 'GET', "path": '/groups/1/study_sessions'},
+  {"method": 'GET', "path": '/groups/1/study_sessions?sort_by=reviewItemsCount&order=asc'},
+  {"method": 'GET', "path": '/api/study-sessions'},
+  {"method": 'GET', "path": '/api/study-sessions/1'},
+  {"method": 'GET', "path": '/api/study-activities'},
+  {"method": 'GET', "path": '/api/study-activities/1'},
+  {"method": 'GET', "path": '/api/study-activities/1/sessions'},
+  {"method": 'GET', "path": '/api/study-activities/1/launch'},
+  {"method": 'GET', "path": '/dashboard/recent-session'},
+  {"method": 'GET', "path": '/dashboard/stats'},
+  {"method": 'GET', "path": '/export/words.ndjson'},
+  {"method": 'GET', "path": '/export/reviews.csv?study_session_id=1'},
+  {"method": 'GET', "path": '/analytics/snapshot'},
+  {"method": 'GET', "path": '/analytics/group-accuracy?group_id=1'},
+  {"method": 'POST', "path": '/study_sessions', "json": {"group_id": 1, "study_activity_id": 1}, "status_only": True},
+  {"method": 'POST', "path": '/study_sessions', "json": {"study_activity_id": 1}},
+  {"method": 'POST', "path": '/study_sessions/1/review', "json": {"word_id": 1, "correct": True}},
+  {"method": 'POST', "path": '/study_sessions/1/review', "json": {"word_id": 999999, "correct": True}},
+  {"method": 'POST', "path": '/study_sessions/1/reviews:batch',
+   "json": {"reviews": [{"word_id": 2, "correct": False}, {"word_id": 999999, "correct": True}, {"word_id": 3}]}},
+  {"method": 'GET', "path": '/words/1'},
+  {"method": 'POST', "path": '/words/batch', "json": {"ids": [1, 2, 3]}},
+  {"method": 'POST', "path": '/study_sessions/1/end', "status_only": True},
+  {"method": 'POST', "path": '/study_sessions/999999/end'},
+  {"method": 'GET', "path": '/groups/1/study_sessions?sort_by=reviewItemsCount&order=desc'},
+  {"method": 'GET', "path": '/dashboard/stats'},
+  {"method": 'GET', "path": '/metrics', "status_only": True},
+]
+
+def normalize(status, content_type, body):
+  if content_type.startswith('application/json'):
+    body = json.loads(body)
+  return status, content_type, body
+
+def wsgi_response(client, request):
+  response = client.open(request["path"], method=request["method"], json=request.get("json"))
+  return normalize(response.status_code, response.content_type, response.get_data())
+
+def asgi_response(app, request):
+  body, headers = b'', []
+  if "json" in request:
+    body = json.dumps(request["json"]).encode('utf-8')
+    headers = [('Content-Type', 'application/json')]
+  status, response_headers, data = asyncio.run(asgi.call(app, request["method"], request["path"], body, headers))
+  content_type = dict(response_headers).get(b'content-type', b'').decode('latin-1')
+  return normalize(status, content_type, data)
+
+def compare(client, asgi_app, request):
+  # The difference between the two responses to `request`, None when they match
+  expected = wsgi_response(client, request)
+  actual = asgi_response(asgi_app, request)
+  if request.get("status_only"):
+    expected, actual = expected[:2], actual[:2]
+  if expected != actual:
+    return f"WSGI {str(expected)[:200]} != ASGI {str(actual)[:200]}"
+  return None
@@ -0,0 +1,125 @@
+# Counts maintained by triggers (migrations 0010, 0013, 0014 and 0018).
+#
+# table_counts holds the number of rows of each table in TABLES and
+# groups.words_count the number of words in each group. Triggers on the
+# counted tables update both in the statement that inserts or deletes the
+# rows, so the list totals are a primary key lookup instead of a COUNT(*).
+# words.correct_count and wrong_count are copies of the word's word_reviews
+# counts, so /words can sort by them through an index, and word_groups.position
+# numbers each group's members 0 .. words_count - 1 for lib/sampling.py.
+# groups.last_session_at is the start of the group's latest study session, for
+# the dashboard's active groups.
+# check() compares them with a recount and repair() rewrites them from one.
+
+TABLES = ('words', 'groups', 'word_groups', 'study_sessions', 'word_review_items')
+
+def get(cursor, table):
+  cursor.execute('SELECT count FROM table_counts WHERE name = ?', (table,))
+  row = cursor.fetchone()
+  if row is None:
+    # Not counted yet (database older than the migration): count it
+    cursor.execute(f'SELECT COUNT(*) FROM {table}')
+    row = cursor.fetchone()
+  return row[0]
+
+def recount(cursor):
+  return {table: cursor.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in TABLES}
+
+# Groups whose words_count differs from their word_groups rows
+STALE_GROUPS = '''
+  SELECT g.id, g.words_count, COALESCE(wg.words, 0) AS words
+  FROM groups g
+  LEFT JOIN (SELECT group_id, COUNT(*) AS words FROM word_groups GROUP BY group_id) wg ON wg.group_id = g.id
+  WHERE g.words_count IS NOT COALESCE(wg.words, 0)
+'''
+
+# Words whose review counts differ from word_reviews
+STALE_WORDS = '''
+  SELECT w.id, w.correct_count, w.wrong_count,
+         COALESCE(r.correct_count, 0) AS correct, COALESCE(r.wrong_count, 0) AS wrong
+  FROM words w
+  LEFT JOIN word_reviews r ON r.word_id = w.id
+  WHERE w.correct_count IS NOT COALESCE(r.correct_count, 0) OR w.wrong_count IS NOT COALESCE(r.wrong_count, 0)
+'''
+
+# Groups whose last_session_at differs from their latest session
+STALE_LAST_SESSIONS = '''
+  SELECT g.id, g.last_session_at, ss.last_session_at AS last_session
+  FROM groups g
+  LEFT JOIN (SELECT group_id, MAX(created_at) AS last_session_at FROM study_sessions GROUP BY group_id) ss
+    ON ss.group_id = g.id
+  WHERE g.last_session_at IS NOT ss.last_session_at
+'''
+
+# Groups whose positions are not exactly 0 .. words - 1
+GAPPED_GROUPS = '''
+  SELECT group_id, COUNT(*) AS words
+  FROM word_groups
+  GROUP BY group_id
+  HAVING MIN(position) IS NOT 0 OR MAX(position) IS NOT COUNT(*) - 1 OR COUNT(DISTINCT position) IS NOT COUNT(*)
+'''
+
+def check(connection):
+  # Returns a list of human readable differences (empty when exact)
+  cursor = connection.cursor()
+  problems = []
+  cursor.execute('SELECT name, count FROM table_counts')
+  stored = {row[0]: row[1] for row in cursor.fetchall()}
+  for table, count in recount(cursor).items():
+    if stored.get(table) != count:
+      problems.append(f"table_counts.{table}: {stored.get(table)} (expected {count})")
+
+  cursor.execute(STALE_GROUPS)
+  stale = cursor.fetchall()
+  for group_id, words_count, words in stale[:10]:
+    problems.append(f"groups.words_count of group {group_id}: {words_count} (expected {words})")
+  if len(stale) > 10:
+    problems.append(f"... and {len(stale) - 10} more stale group(s)")
+
+  cursor.execute(STALE_WORDS)
+  stale = cursor.fetchall()
+  for word_id, correct_count, wrong_count, correct, wrong in stale[:10]:
+    problems.append(f"review counts of word {word_id}: {correct_count}/{wrong_count} (expected {correct}/{wrong})")
+  if len(stale) > 10:
+    problems.append(f"... and {len(stale) - 10} more stale word(s)")
+
+  cursor.execute(STALE_LAST_SESSIONS)
+  stale = cursor.fetchall()
+  for group_id, last_session_at, last_session in stale[:10]:
+    problems.append(f"groups.last_session_at of group {group_id}: {last_session_at} (expected {last_session})")
+  if len(stale) > 10:
+    problems.append(f"... and {len(stale) - 10} more group(s) with a stale last session")
+
+  cursor.execute(GAPPED_GROUPS)
+  gapped = cursor.fetchall()
+  for group_id, words in gapped[:10]:
+    problems.append(f"word_groups.position of group {group_id}: not numbered 0 to {words - 1}")
+  if len(gapped) > 10:
+    problems.append(f"... and {len(gapped) - 10} more group(s) with gaps")
+  return problems
+
+def repair(connection):
+  # Rewrite every count from a recount
+  cursor = connection.cursor()
+  cursor.executemany('INSERT OR REPLACE INTO table_counts (name, count) VALUES (?, ?)', recount(cursor).items())
+  cursor.execute(f'UPDATE groups SET words_count = stale.words FROM ({STALE_GROUPS}) stale WHERE groups.id = stale.id')
+  cursor.execute(f'''
+    UPDATE words SET correct_count = stale.correct, wrong_count = stale.wrong
+    FROM ({STALE_WORDS}) stale
+    WHERE words.id = stale.id
+  ''')
+  cursor.execute(f'''
+    UPDATE groups SET last_session_at = stale.last_session
+    FROM ({STALE_LAST_SESSIONS}) stale
+    WHERE groups.id = stale.id
+  ''')
+  cursor.execute(f'''
+    UPDATE word_groups SET position = ranked.position
+    FROM (
+      SELECT rowid AS row_id, ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY word_id) - 1 AS position
+      FROM word_groups
+      WHERE group_id IN (SELECT group_id FROM ({GAPPED_GROUPS}))
+    ) ranked
+    WHERE word_groups.rowid = ranked.row_id
+  ''')
+  connection.commit()
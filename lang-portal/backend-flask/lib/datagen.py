@@ -0,0 +1,316 @@
+import bisect
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+from flask import Flask
+
+from lib import learning_stats, scheduler
+from lib.db import Db
+
+# Reproducible synthetic databases for benchmarking (`invoke generate-data`).
+#
+# On top of the seed data, generate() adds synthetic words, groups, study
+# sessions and review items with a realistic skew:
+# - group popularity and the words reviewed within a group follow a Zipf
+#   distribution, so a few groups and words get most of the attention;
+# - every word has its own difficulty (success rate drawn from a beta
+#   distribution);
+# - sessions lean towards recent days and their lengths are exponential, so
+#   many are short and a few are long (some have no reviews at all).
+# The same arguments and seed always produce the same database. Every derived
+# table (word_reviews, word_stats, activity_days, learning_stats, the study
+# session counters, word_schedule and groups.words_count) is filled in as the
+# app would.
+#
+# The benchmarks of single features shape the data further:
+# - group_sizes adds groups of exactly these sizes, their words drawn at random;
+# - practiced is the share of words that are each answered a Pareto-distributed
+#   number of times in one session within the last `days`, so that share of
+#   the words has review counts, stats and a schedule;
+# - daily_years adds that many years of daily sessions without reviews up to
+#   today, with a few days skipped at random.
+
+SCALES = {
+  'small': {"words": 10000, "groups": 100, "sessions": 10000, "reviews": 200000},
+  'medium': {"words": 100000, "groups": 1000, "sessions": 100000, "reviews": 5000000},
+  'large': {"words": 1000000, "groups": 10000, "sessions": 1000000, "reviews": 50000000},
+}
+
+ZIPF_EXPONENT = 1.1
+BATCH_SIZE = 100000
+SECONDS_PER_ANSWER = (4, 30)
+
+# Practice sessions (practiced): words per session and most answers per word
+PRACTICE_WORDS = 20
+MAX_PRACTICE_ANSWERS = 100
+
+# Daily sessions (daily_years): share of days skipped and most sessions on a day
+SKIP_RATE = 0.02
+MAX_DAILY_SESSIONS = 9
+
+# Review indexes are rebuilt once at the end instead of maintained row by row
+DEFERRED_INDEXES = ['idx_word_review_items_session_correct', 'idx_word_review_items_word']
+
+# Building blocks for synthetic words
+KANA = {
+  'a': 'あ', 'i': 'い', 'u': 'う', 'e': 'え', 'o': 'お',
+  'ka': 'か', 'ki': 'き', 'ku': 'く', 'ke': 'け', 'ko': 'こ',
+  'sa': 'さ', 'shi': 'し', 'su': 'す', 'se': 'せ', 'so': 'そ',
+  'ta': 'た', 'chi': 'ち', 'tsu': 'つ', 'te': 'て', 'to': 'と',
+  'na': 'な', 'ni': 'に', 'nu': 'ぬ', 'ne': 'ね', 'no': 'の',
+  'ha': 'は', 'hi': 'ひ', 'fu': 'ふ', 'he': 'へ', 'ho': 'ほ',
+  'ma': 'ま', 'mi': 'み', 'mu': 'む', 'me': 'め', 'mo': 'も',
+  'ra': 'ら', 'ri': 'り', 'ru': 'る', 're': 'れ', 'ro': 'ろ',
+  'ya': 'や', 'yu': 'ゆ', 'yo': 'よ', 'wa': 'わ', 'n': 'ん'
+}
+KANJI = [chr(code) for code in range(0x4E00, 0x4E00 + 2000)] + ['水', '学', '校', '火', '山']
+ENGLISH = [
+  'water', 'fire', 'mountain', 'river', 'school', 'teacher', 'student', 'book', 'to read',
+  'to write', 'to eat', 'to drink', 'to go', 'to come', 'big', 'small', 'new', 'old', 'red',
+  'blue', 'time', 'day', 'night', 'morning', 'friend', 'family', 'city', 'country', 'train',
+  'station', 'car', 'shop', 'money', 'work', 'to sleep', 'to speak', 'to listen', 'music',
+  'flower', 'tree', 'rain', 'snow', 'wind', 'sky', 'sea', 'fish', 'dog', 'cat', 'bird', 'tea'
+]
+
+def english(rng, syllables):
+  # Mostly made-up words, so each real English word appears in a few hundred entries
+  glosses = [''.join(rng.choice(syllables) for _ in range(rng.randint(2, 4))) for _ in range(rng.randint(1, 2))]
+  if rng.random() < 0.05:
+    glosses[0] = rng.choice(ENGLISH)
+  return '; '.join(glosses)
+
+def word(rng, syllables):
+  # (kanji, romaji, english, parts) of a made-up word
+  romaji = [rng.choice(syllables) for _ in range(rng.randint(2, 4))]
+  kanji = ''.join(rng.choice(KANJI) for _ in range(rng.randint(1, 3))) + KANA[romaji[-1]]
+  return (kanji, ''.join(romaji), english(rng, syllables), '[]')
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT):
+  # Cumulative weights of ranks 1..n
+  cumulative = []
+  total = 0.0
+  for rank in range(1, n + 1):
+    total += 1.0 / rank ** exponent
+    cumulative.append(total)
+  return cumulative
+
+def zipf_index(rng, cumulative, n):
+  # Index in [0, n) drawn with Zipf weights (cumulative covers at least n ranks)
+  return bisect.bisect_left(cumulative, rng.random() * cumulative[n - 1], 0, n - 1)
+
+def timestamp(seconds):
+  return datetime.fromtimestamp(seconds, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def insert_words(connection, rng, count):
+  syllables = list(KANA)
+  for start in range(0, count, BATCH_SIZE):
+    rows = [word(rng, syllables) for _ in range(min(BATCH_SIZE, count - start))]
+    connection.executemany('INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)', rows)
+  connection.commit()
+
+def insert_groups(connection, rng, count, word_ids):
+  # Returns {group_id: [word_id, ...]}; each word joins one group, some a second one
+  first_id = connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM groups').fetchone()[0]
+  group_ids = list(range(first_id, first_id + count))
+  connection.executemany('INSERT INTO groups (id, name) VALUES (?, ?)', [
+    (group_id, f'Synthetic group {number + 1}') for number, group_id in enumerate(group_ids)
+  ])
+
+  cumulative = zipf_weights(count)
+  members = {group_id: [] for group_id in group_ids}
+  for word_id in word_ids:
+    joined = {group_ids[zipf_index(rng, cumulative, count)]}
+    if rng.random() < 0.3:
+      joined.add(group_ids[zipf_index(rng, cumulative, count)])
+    for group_id in joined:
+      members[group_id].append(word_id)
+  members = {group_id: words for group_id, words in members.items() if words}
+
+  # groups.words_count is counted by the word_groups triggers
+  for group_id, words in members.items():
+    connection.executemany('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)',
+                           [(word_id, group_id) for word_id in words])
+  connection.commit()
+  return members
+
+def insert_sized_groups(connection, rng, sizes, word_ids):
+  # A group of each size, its words drawn at random; returns {group_id: [word_id, ...]}
+  members = {}
+  for size in sizes:
+    group_id = connection.execute('INSERT INTO groups (name) VALUES (?)', (f'Sample group {size}',)).lastrowid
+    members[group_id] = sorted(rng.sample(word_ids, size))
+    connection.executemany('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)',
+                           [(word_id, group_id) for word_id in members[group_id]])
+  connection.commit()
+  return members
+
+def insert_sessions(connection, session_rows, review_rows):
+  connection.executemany('''
+    INSERT INTO study_sessions (id, group_id, study_activity_id, created_at, ended_at, review_count,
+                                correct_count)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+  ''', session_rows)
+  connection.executemany('''
+    INSERT INTO word_review_items (word_id, study_session_id, correct, created_at) VALUES (?, ?, ?, ?)
+  ''', review_rows)
+
+def next_session_id(connection):
+  return connection.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM study_sessions').fetchone()[0]
+
+def insert_history(connection, rng, sessions, reviews, members, days):
+  # Sessions (oldest first) with their review items; returns the number of reviews inserted
+  group_ids = sorted(members, key=lambda group_id: -len(members[group_id]))
+  group_weights = zipf_weights(len(group_ids))
+  word_weights = zipf_weights(max(len(words) for words in members.values()))
+  activity_ids = [row[0] for row in connection.execute('SELECT id FROM study_activities')]
+  word_ids = sorted({word_id for words in members.values() for word_id in words})
+  difficulty = {word_id: rng.betavariate(7, 3) for word_id in word_ids}
+
+  now = int(time.time())
+  starts = sorted(now - int(days * 86400 * rng.random() ** 1.5) for _ in range(sessions))
+  mean_reviews = reviews / sessions if sessions else 0
+  first_id = next_session_id(connection)
+
+  session_rows, review_rows, total = [], [], 0
+  for number, start in enumerate(starts):
+    session_id = first_id + number
+    group_id = group_ids[zipf_index(rng, group_weights, len(group_ids))]
+    words = members[group_id]
+    count = int(rng.expovariate(1 / mean_reviews)) if mean_reviews else 0
+    at = start
+    correct_count = 0
+    for _ in range(count):
+      at += rng.randint(*SECONDS_PER_ANSWER)
+      word_id = words[zipf_index(rng, word_weights, len(words))]
+      correct = rng.random() < difficulty[word_id]
+      correct_count += correct
+      review_rows.append((word_id, session_id, correct, timestamp(at)))
+    total += count
+    session_rows.append((
+      session_id, group_id, rng.choice(activity_ids), timestamp(start),
+      timestamp(at) if count else None, count, correct_count
+    ))
+
+    if len(review_rows) >= BATCH_SIZE or number == len(starts) - 1:
+      insert_sessions(connection, session_rows, review_rows)
+      session_rows, review_rows = [], []
+  connection.commit()
+  return total
+
+def insert_practice(connection, rng, share, members, days):
+  # Sessions of PRACTICE_WORDS words each answered 1 to MAX_PRACTICE_ANSWERS times
+  # (Pareto) for `share` of the words; returns the number of reviews inserted
+  word_ids = [row[0] for row in connection.execute('SELECT id FROM words ORDER BY id')]
+  practiced = rng.sample(word_ids, int(len(word_ids) * share))
+  word_group = {word_id: group_id for group_id, words in members.items() for word_id in words}
+  (any_group,) = connection.execute('SELECT MIN(id) FROM groups').fetchone()
+  activity_ids = [row[0] for row in connection.execute('SELECT id FROM study_activities')]
+
+  now = int(time.time())
+  session_id = next_session_id(connection)
+  session_rows, review_rows, total = [], [], 0
+  for start in range(0, len(practiced), PRACTICE_WORDS):
+    words = practiced[start:start + PRACTICE_WORDS]
+    started_at = at = now - int(days * 86400 * rng.random())
+    correct_count = count = 0
+    for word_id in words:
+      difficulty = rng.betavariate(7, 3)
+      for _ in range(min(int(rng.paretovariate(1.2)), MAX_PRACTICE_ANSWERS)):
+        at += rng.randint(*SECONDS_PER_ANSWER)
+        correct = rng.random() < difficulty
+        correct_count += correct
+        count += 1
+        review_rows.append((word_id, session_id, correct, timestamp(at)))
+    session_rows.append((
+      session_id, word_group.get(words[0], any_group), rng.choice(activity_ids), timestamp(started_at),
+      timestamp(at), count, correct_count
+    ))
+    session_id += 1
+    total += count
+
+    if len(review_rows) >= BATCH_SIZE or start + PRACTICE_WORDS >= len(practiced):
+      insert_sessions(connection, session_rows, review_rows)
+      session_rows, review_rows = [], []
+  connection.commit()
+  return total
+
+def insert_daily_sessions(connection, rng, years):
+  # 1 to MAX_DAILY_SESSIONS sessions without reviews on every day of the last
+  # `years` up to today, but for SKIP_RATE of them
+  group_ids = [row[0] for row in connection.execute('SELECT id FROM groups')]
+  activity_ids = [row[0] for row in connection.execute('SELECT id FROM study_activities')]
+  today = int(time.time()) // 86400 * 86400
+  rows = []
+  for day in range(years * 365, -1, -1):
+    if day and rng.random() < SKIP_RATE:
+      continue
+    for _ in range(rng.randint(1, MAX_DAILY_SESSIONS)):
+      rows.append((rng.choice(group_ids), rng.choice(activity_ids),
+                   timestamp(today - day * 86400 + rng.randrange(86400))))
+  connection.executemany('INSERT INTO study_sessions (group_id, study_activity_id, created_at) VALUES (?, ?, ?)',
+                         rows)
+  connection.commit()
+  return len(rows)
+
+def generate(path, words=10000, groups=100, sessions=10000, reviews=200000, seed=42, days=365,
+             group_sizes=(), practiced=0.0, daily_years=0, log=print):
+  # Build a new database at `path`; returns the row counts of the main tables
+  if os.path.exists(path):
+    raise FileExistsError(f'{path} already exists')
+  started = time.perf_counter()
+  Db(database=path, pool_size=0).init(Flask(__name__))
+
+  rng = random.Random(seed)
+  connection = sqlite3.connect(path)
+  connection.execute('PRAGMA synchronous = OFF')
+  try:
+    log(f"Generating {words} words")
+    insert_words(connection, rng, words)
+    word_ids = [row[0] for row in connection.execute('SELECT id FROM words ORDER BY id')]
+
+    log(f"Generating {groups + len(group_sizes)} groups")
+    members = insert_groups(connection, rng, groups, word_ids) if groups else {}
+    members.update(insert_sized_groups(connection, rng, group_sizes, word_ids))
+
+    indexes = [row[0] for row in connection.execute(
+      f"SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({','.join('?' * len(DEFERRED_INDEXES))})",
+      DEFERRED_INDEXES
+    )]
+    for name in DEFERRED_INDEXES:
+      connection.execute(f'DROP INDEX IF EXISTS {name}')
+    if sessions:
+      log(f"Generating {sessions} sessions with ~{reviews} reviews")
+      insert_history(connection, rng, sessions, reviews, members, days)
+    if practiced:
+      log(f"Practicing {practiced:.0%} of the words")
+      insert_practice(connection, rng, practiced, members, days)
+    if daily_years:
+      log(f"Generating {daily_years} years of daily sessions")
+      insert_daily_sessions(connection, rng, daily_years)
+    for statement in indexes:
+      connection.execute(statement)
+
+    log("Computing review aggregates")
+    connection.execute('''
+      INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+      SELECT word_id, SUM(correct), SUM(NOT correct), MAX(created_at)
+      FROM word_review_items
+      GROUP BY word_id
+    ''')
+    connection.commit()
+    learning_stats.rebuild(connection)
+
+    log("Replaying the review schedule")
+    scheduler.rebuild(connection)
+
+    counts = {
+      table: connection.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+      for table in ('words', 'groups', 'word_groups', 'study_sessions', 'word_review_items')
+    }
+  finally:
+    connection.close()
+  log(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+  return counts
@@ -1,16 +1,99 @@
 import sqlite3
 import json
+import queue
+import threading
 from flask import g
 
+from lib import importer
+from lib.profiler import ProfilingConnection
+
+# Applied once to every new connection before it enters the pool
+PRAGMAS = [
+  'PRAGMA journal_mode = WAL',
+  'PRAGMA synchronous = NORMAL',
+  'PRAGMA mmap_size = 268435456',  # 256MB
+  'PRAGMA cache_size = -65536',  # 64MB (negative values are KiB)
+  'PRAGMA temp_store = MEMORY',
+]
+
 class Db:
-  def __init__(self, database='words.db'):
+  def __init__(self, database='words.db', pool_size=5, cached_statements=256):
     self.database = database
     self.connection = None
+    # Number of idle connections kept open between requests (0 disables pooling)
+    self.pool_size = pool_size
+    self.cached_statements = cached_statements
+    self.pool = queue.LifoQueue()
+    # Set by the app when SQL_PROFILE is on: connections then time their statements
+    self.profile = False
+    # Pool counters for /metrics
+    self.lock = threading.Lock()
+    self.opened = 0
+    self.closed = 0
+    self.in_use = 0
+
+  def connect(self):
+    # Connections are handed between request threads, so disable the same-thread check
+    connection = sqlite3.connect(
+      self.database,
+      check_same_thread=False,
+      cached_statements=self.cached_statements,
+      factory=ProfilingConnection if self.profile else sqlite3.Connection
+    )
+    connection.row_factory = sqlite3.Row  # Return rows as dictionaries
+    # executescript() bypasses the profiler, which should only see the routes' queries
+    connection.executescript(';\n'.join(PRAGMAS))
+    with self.lock:
+      self.opened += 1
+    return connection
+
+  def acquire(self):
+    # Reuse the most recently returned connection so its page cache is warm
+    try:
+      connection = self.pool.get_nowait()
+    except queue.Empty:
+      connection = self.connect()
+    with self.lock:
+      self.in_use += 1
+    return connection
+
+  def release(self, connection):
+    with self.lock:
+      self.in_use -= 1
+    # Never hand an open transaction to the next request
+    if connection.in_transaction:
+      connection.rollback()
+    if self.pool.qsize() < self.pool_size:
+      self.pool.put(connection)
+    else:
+      self.discard(connection)
+
+  def discard(self, connection):
+    connection.close()
+    with self.lock:
+      self.closed += 1
+
+  def dispose(self):
+    # Close every idle pooled connection
+    while True:
+      try:
+        self.discard(self.pool.get_nowait())
+      except queue.Empty:
+        break
+
+  def metrics(self):
+    with self.lock:
+      return {
+        "pool_size": self.pool_size,
+        "idle": self.pool.qsize(),
+        "in_use": self.in_use,
+        "opened": self.opened,
+        "closed": self.closed
+      }
 
   def get(self):
     if 'db' not in g:
-      g.db = sqlite3.connect(self.database)
-      g.db.row_factory = sqlite3.Row  # Return rows as dictionaries
+      g.db = self.acquire()
     return g.db
 
   def commit(self):
@@ -24,7 +107,7 @@ class Db:
   def close(self):
     db = g.pop('db', None)
     if db is not None:
-      db.close()
+      self.release(db)
 
   # Function to load SQL from a file
   def sql(self, filepath):
@@ -59,6 +142,11 @@ class Db:
     cursor.execute(self.sql('setup/create_table_study_sessions.sql'))
     self.get().commit()
 
+  def migrate(self):
+    # Apply pending versioned migrations from sql/migrations
+    import migrate
+    return migrate.migrate(self.get())
+
   def import_study_activities_json(self,cursor,data_json_path):
     study_actvities = self.load_json(data_json_path)
     for activity in study_actvities:
@@ -68,52 +156,17 @@ class Db:
     self.get().commit()
 
   def import_word_json(self,cursor,group_name,data_json_path):
-      # Insert a new group
-      cursor.execute('''
-        INSERT INTO groups (name) VALUES (?)
-      ''', (group_name,))
-      self.get().commit()
-
-      # Get the ID of the group
-      cursor.execute('SELECT id FROM groups WHERE name = ?', (group_name,))
-      core_verbs_group_id = cursor.fetchone()[0]
-
-      # Insert some sample words (verbs) from JSON file and associate with the group
-      words = self.load_json(data_json_path)
-
-      for word in words:
-        # Insert the word into the words table
-        cursor.execute('''
-          INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)
-        ''', (word['kanji'], word['romaji'], word['english'], json.dumps(word['parts'])))
-        
-        # Get the last inserted word's ID
-        word_id = cursor.lastrowid
-
-        # Insert the word-group relationship into word_groups table
-        cursor.execute('''
-          INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)
-        ''', (word_id, core_verbs_group_id))
-      self.get().commit()
-
-      # Update the words_count in the groups table by counting all words in the group
-      cursor.execute('''
-        UPDATE groups
-        SET words_count = (
-          SELECT COUNT(*) FROM word_groups WHERE group_id = ?
-        )
-        WHERE id = ?
-      ''', (core_verbs_group_id, core_verbs_group_id))
-
-      self.get().commit()
+      # Stream the words into the group (created if missing), skipping words already present
+      result = importer.import_words(self.get(), data_json_path, group_name, log=lambda message: None)
 
-      print(f"Successfully added {len(words)} verbs to the '{group_name}' group.")
+      print(f"Successfully added {result['records']} verbs to the '{group_name}' group.")
 
   # Initialize the database with sample data
   def init(self, app):
     with app.app_context():
       cursor = self.cursor()
       self.setup_tables(cursor)
+      self.migrate()
       self.import_word_json(
         cursor=cursor,
         group_name='Core Verbs',
@@ -0,0 +1,101 @@
+import csv
+import io
+import zlib
+
+# Streaming exports for /export/<name>.<format>.
+#
+# Rows are read in id order from a server-side cursor, FETCH_SIZE at a time, and
+# written out as NDJSON (one JSON object per line, built by SQLite's
+# json_object) or CSV. Nothing is buffered beyond the current batch, so memory
+# stays flat whatever the table size. Every row carries its id; a client that
+# lost the connection resumes with ?since_id=<last id received>.
+
+FETCH_SIZE = 1000
+
+EXPORTS = {
+  'words': {
+    "columns": ['id', 'kanji', 'romaji', 'english', 'parts'],
+    "json": '''json_object(
+      'id', id, 'kanji', kanji, 'romaji', romaji, 'english', english,
+      'parts', CASE WHEN json_valid(parts) THEN json(parts) ELSE parts END
+    )''',
+    "table": 'words',
+    # Optional ?group_id= filter, answered from the (group_id, word_id) index
+    "filters": {'group_id': 'id IN (SELECT word_id FROM word_groups WHERE group_id = ?)'}
+  },
+  'reviews': {
+    "columns": ['id', 'study_session_id', 'word_id', 'correct', 'created_at'],
+    "json": '''json_object(
+      'id', id, 'study_session_id', study_session_id, 'word_id', word_id,
+      'correct', json(CASE WHEN correct THEN 'true' ELSE 'false' END), 'created_at', created_at
+    )''',
+    "table": 'word_review_items',
+    "filters": {'study_session_id': 'study_session_id = ?'}
+  }
+}
+
+MIMETYPES = {
+  'ndjson': 'application/x-ndjson',
+  'csv': 'text/csv'
+}
+
+def query(name, format, since_id=0, filters=None):
+  # Returns (sql, params) selecting the rows after since_id in id order
+  export = EXPORTS[name]
+  select = export["json"] if format == 'ndjson' else ', '.join(export["columns"])
+  conditions, params = ['id > ?'], [since_id]
+  for key, value in (filters or {}).items():
+    conditions.append(export["filters"][key])
+    params.append(value)
+  return f'''
+    SELECT {select} FROM {export["table"]}
+    WHERE {' AND '.join(conditions)}
+    ORDER BY id
+  ''', params
+
+def rows(db, sql, params, size=FETCH_SIZE):
+  # Yield batches of rows on a connection of its own, held only while streaming
+  connection = db.acquire()
+  try:
+    cursor = connection.execute(sql, params)
+    while True:
+      batch = cursor.fetchmany(size)
+      if not batch:
+        break
+      yield batch
+    cursor.close()
+  finally:
+    db.release(connection)
+
+def ndjson(batches):
+  for batch in batches:
+    yield '\n'.join(row[0] for row in batch) + '\n'
+
+def csv_lines(columns, batches):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for batch in batches:
+    writer.writerows(batch)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+  if buffer.tell():
+    yield buffer.getvalue()
+
+def gzipped(chunks):
+  compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+  for chunk in chunks:
+    data = compressor.compress(chunk.encode('utf-8'))
+    if data:
+      yield data
+  yield compressor.flush()
+
+def stream(db, name, format, since_id=0, filters=None, gzip=False):
+  sql, params = query(name, format, since_id, filters)
+  batches = rows(db, sql, params)
+  if format == 'ndjson':
+    chunks = ndjson(batches)
+  else:
+    chunks = csv_lines(EXPORTS[name]["columns"], batches)
+  return gzipped(chunks) if gzip else chunks
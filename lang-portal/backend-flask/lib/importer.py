@@ -0,0 +1,265 @@
+import csv
+import json
+import os
+import time
+
+try:
+  import orjson
+except ImportError:  # Optional: only makes parsing and re-encoding faster
+  orjson = None
+
+# Streaming bulk importer for word lists (`invoke import-words`).
+#
+# Records are read incrementally from JSON arrays, JSON Lines or CSV files and
+# loaded in chunks: each chunk is bulk-inserted into a temp table, then copied
+# into words (skipping any (kanji, romaji) pair that already exists) and
+# word_groups with two INSERT ... SELECT statements. The chunk and the
+# import_checkpoints row are committed together, so an interrupted import
+# resumes after the last committed chunk. The words sort indexes are dropped
+# for the duration of the import and rebuilt once at the end. The group's
+# words_count and the table counts are kept up to date by triggers.
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Secondary indexes on words that are rebuilt after the import instead of being
+# maintained row by row (idx_words_kanji_romaji is needed for de-duplication).
+# Only worth it for large files: rebuilding costs a pass over the whole table.
+DEFERRED_INDEXES = ['idx_words_kanji', 'idx_words_romaji', 'idx_words_english']
+DEFER_INDEXES_MIN_BYTES = 8 * 1024 * 1024
+
+READ_SIZE = 1 << 16
+
+def iter_json_array(file):
+  # Yield the elements of a top-level JSON array without loading the whole file
+  decoder = json.JSONDecoder()
+  buffer = ''
+  pos = 0
+  eof = False
+
+  def fill():
+    nonlocal buffer, pos, eof
+    data = file.read(READ_SIZE)
+    if not data:
+      eof = True
+    buffer = buffer[pos:] + data
+    pos = 0
+
+  def skip_whitespace():
+    nonlocal pos
+    while True:
+      while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+        pos += 1
+      if pos < len(buffer) or eof:
+        return
+      fill()
+
+  skip_whitespace()
+  if buffer[pos:pos + 1] != '[':
+    raise ValueError('Expected a JSON array of words')
+  pos += 1
+
+  while True:
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ']':
+      return
+    while True:
+      try:
+        value, end = decoder.raw_decode(buffer, pos)
+        break
+      except json.JSONDecodeError:
+        if eof:
+          raise
+        fill()
+    pos = end
+    yield value
+    skip_whitespace()
+    if buffer[pos:pos + 1] == ',':
+      pos += 1
+    elif buffer[pos:pos + 1] != ']':
+      raise ValueError(f'Expected "," or "]" after array element, got {buffer[pos:pos + 10]!r}')
+
+def iter_json_lines(file):
+  loads = orjson.loads if orjson else json.loads
+  for line in file:
+    line = line.strip()
+    if line:
+      yield loads(line)
+
+def iter_csv(file):
+  # Columns: kanji, romaji, english and optionally parts (as a JSON string)
+  for row in csv.DictReader(file):
+    yield row
+
+READERS = {
+  'json': iter_json_array,
+  'jsonl': iter_json_lines,
+  'ndjson': iter_json_lines,
+  'csv': iter_csv,
+}
+
+def detect_format(path):
+  extension = os.path.splitext(path)[1].lstrip('.').lower()
+  if extension not in READERS:
+    raise ValueError(f'Unknown word list format {extension!r}, use one of {", ".join(READERS)}')
+  return extension
+
+def dumps(value):
+  # Keys sorted at every depth, as jsonify() writes them, so /groups/<id>/words/raw
+  # can nest the stored text without re-encoding it (words.parts_unsorted = 0)
+  if orjson:
+    return orjson.dumps(value, option=orjson.OPT_SORT_KEYS).decode('utf-8')
+  return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+def to_row(word):
+  # parts_unsorted is NULL for parts given as JSON text, which the words trigger checks
+  parts = word.get('parts') or []
+  if isinstance(parts, str):
+    return (word['kanji'], word['romaji'], word['english'], parts, None)
+  return (word['kanji'], word['romaji'], word['english'], dumps(parts), 0)
+
+def chunked(records, size):
+  chunk = []
+  for record in records:
+    chunk.append(record)
+    if len(chunk) >= size:
+      yield chunk
+      chunk = []
+  if chunk:
+    yield chunk
+
+def upsert_group(cursor, group_name):
+  cursor.execute('SELECT id FROM groups WHERE name = ? ORDER BY id LIMIT 1', (group_name,))
+  group = cursor.fetchone()
+  if group:
+    return group[0]
+  cursor.execute('INSERT INTO groups (name) VALUES (?)', (group_name,))
+  return cursor.lastrowid
+
+def load_checkpoint(cursor, source, group_name):
+  cursor.execute('''
+    SELECT records_done, deferred_indexes, finished_at
+    FROM import_checkpoints
+    WHERE source = ? AND group_name = ?
+  ''', (source, group_name))
+  return cursor.fetchone()
+
+def defer_indexes(cursor):
+  # Drop the deferred indexes, returning their CREATE statements
+  placeholders = ','.join('?' * len(DEFERRED_INDEXES))
+  cursor.execute(f'''
+    SELECT sql FROM sqlite_master WHERE type = 'index' AND name IN ({placeholders})
+  ''', DEFERRED_INDEXES)
+  statements = [row[0] for row in cursor.fetchall()]
+  for name in DEFERRED_INDEXES:
+    cursor.execute(f'DROP INDEX IF EXISTS {name}')
+  return statements
+
+def import_chunk(cursor, group_id, rows):
+  cursor.execute('DELETE FROM temp.import_words')
+  cursor.executemany('''
+    INSERT INTO temp.import_words (kanji, romaji, english, parts, parts_unsorted) VALUES (?, ?, ?, ?, ?)
+  ''', rows)
+
+  # New words only, one row per (kanji, romaji) even if the chunk repeats it
+  cursor.execute('''
+    INSERT INTO words (kanji, romaji, english, parts, parts_unsorted)
+    SELECT iw.kanji, iw.romaji, iw.english, iw.parts, iw.parts_unsorted
+    FROM temp.import_words iw
+    WHERE iw.seq IN (SELECT MIN(seq) FROM temp.import_words GROUP BY kanji, romaji)
+      AND NOT EXISTS (
+        SELECT 1 FROM words w WHERE w.kanji = iw.kanji AND w.romaji = iw.romaji
+      )
+  ''')
+  inserted = cursor.rowcount
+
+  # Add every word of the chunk to the group unless it is already a member
+  # (CROSS JOIN keeps the chunk as the outer loop instead of scanning words)
+  cursor.execute('''
+    INSERT INTO word_groups (word_id, group_id)
+    SELECT DISTINCT w.id, ?
+    FROM temp.import_words iw
+    CROSS JOIN words w ON w.kanji = iw.kanji AND w.romaji = iw.romaji
+    WHERE NOT EXISTS (
+      SELECT 1 FROM word_groups wg WHERE wg.group_id = ? AND wg.word_id = w.id
+    )
+  ''', (group_id, group_id))
+  return inserted
+
+def import_words(connection, path, group_name, format=None, chunk_size=DEFAULT_CHUNK_SIZE, restart=False, log=print):
+  # Import (or resume importing) a word list into `group_name`; returns a summary dict
+  source = os.path.abspath(path)
+  format = format or detect_format(path)
+  reader = READERS[format]
+  cursor = connection.cursor()
+  start = time.perf_counter()
+
+  cursor.execute('''
+    CREATE TEMP TABLE IF NOT EXISTS import_words (
+      seq INTEGER PRIMARY KEY,
+      kanji TEXT NOT NULL,
+      romaji TEXT NOT NULL,
+      english TEXT NOT NULL,
+      parts TEXT NOT NULL,
+      parts_unsorted INTEGER
+    )
+  ''')
+
+  checkpoint = load_checkpoint(cursor, source, group_name)
+  unfinished = checkpoint is not None and checkpoint['finished_at'] is None
+  # Indexes dropped by an unfinished run are already gone, so carry them over
+  deferred = json.loads(checkpoint['deferred_indexes'] or '[]') if unfinished else []
+  if unfinished and not restart:
+    skip = checkpoint['records_done']
+    log(f"Resuming import of {path} after {skip} records")
+  else:
+    skip = 0
+    if os.path.getsize(path) >= DEFER_INDEXES_MIN_BYTES:
+      deferred += [statement for statement in defer_indexes(cursor) if statement not in deferred]
+    cursor.execute('''
+      INSERT INTO import_checkpoints (source, group_name, records_done, deferred_indexes)
+      VALUES (?, ?, 0, ?)
+      ON CONFLICT(source, group_name) DO UPDATE SET
+        records_done = 0,
+        deferred_indexes = excluded.deferred_indexes,
+        started_at = CURRENT_TIMESTAMP,
+        updated_at = CURRENT_TIMESTAMP,
+        finished_at = NULL
+    ''', (source, group_name, json.dumps(deferred)))
+  group_id = upsert_group(cursor, group_name)
+  connection.commit()
+
+  records = 0
+  inserted = 0
+  with open(path, 'r', encoding='utf-8', newline='' if format == 'csv' else None) as file:
+    words = reader(file)
+    for _ in range(skip):
+      if next(words, None) is None:
+        break
+    records = skip
+
+    for chunk in chunked(words, chunk_size):
+      inserted += import_chunk(cursor, group_id, [to_row(word) for word in chunk])
+      records += len(chunk)
+      cursor.execute('''
+        UPDATE import_checkpoints SET records_done = ?, updated_at = CURRENT_TIMESTAMP
+        WHERE source = ? AND group_name = ?
+      ''', (records, source, group_name))
+      connection.commit()
+      log(f"  {records} records imported")
+
+  # Rebuild the deferred indexes once
+  for statement in deferred:
+    cursor.execute(statement.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1))
+  cursor.execute('''
+    UPDATE import_checkpoints SET finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+    WHERE source = ? AND group_name = ?
+  ''', (source, group_name))
+  cursor.execute('DROP TABLE IF EXISTS temp.import_words')
+  connection.commit()
+
+  return {
+    "group_id": group_id,
+    "records": records,
+    "inserted": inserted,
+    "seconds": round(time.perf_counter() - start, 2)
+  }
@@ -0,0 +1,94 @@
+import json
+import re
+
+from flask import current_app, jsonify
+from flask.json.provider import DefaultJSONProvider
+
+try:
+  import orjson
+except ImportError:  # Optional: without it every response goes through Flask's encoder
+  orjson = None
+
+# JSON responses whose rows are serialised by SQLite.
+#
+# List routes select one json_object(...) per row (object_sql() orders the keys
+# as Flask's sort_keys does) and respond() splices those rows into the envelope
+# as they come out of the cursor, without building dicts or encoding them again.
+# The bytes are the same as jsonify() produces: compact separators, sorted keys
+# and every non-ASCII character escaped as \uXXXX (see ascii()). When jsonify()
+# would pretty-print (debug mode), the rows are decoded and passed to it instead.
+#
+# OrjsonProvider encodes every other response with orjson when it is installed
+# (JSON_PROVIDER='orjson'), with the same output as Flask's provider.
+
+# Characters json.dumps(ensure_ascii=True) escapes but SQLite's JSON functions keep
+NOT_ASCII = re.compile('[^\x00-\x7e]+')
+# Characters the backslashreplace codec escapes differently from json.dumps
+# (\x7f, \xe9 and \U0001f600 instead of \u007f, \u00e9 and a surrogate pair)
+NOT_BACKSLASHREPLACE = re.compile('[\x7f-\xff\U00010000-\U0010ffff]')
+
+def object_sql(fields):
+  # json_object() over {key: SQL expression}, keys in sorted order
+  return 'json_object(' + ', '.join(f"'{key}', {fields[key]}" for key in sorted(fields)) + ')'
+
+def sort_keys(text):
+  # A JSON text re-encoded with its object keys sorted at every depth
+  return json.dumps(json.loads(text), ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+
+def escape(match):
+  # A run of non-ASCII characters contains no quotes, backslashes or control characters
+  return json.encoder.encode_basestring_ascii(match.group())[1:-1]
+
+def ascii(text):
+  # JSON text with non-ASCII characters escaped exactly as json.dumps does
+  if text.isascii() and '\x7f' not in text:
+    return text
+  if not NOT_BACKSLASHREPLACE.search(text):
+    # Only BMP characters from U+0100: the codec writes the same \uXXXX, without a callback per run
+    return text.encode('ascii', 'backslashreplace').decode('ascii')
+  return NOT_ASCII.sub(escape, text)
+
+def spliceable(provider):
+  return (
+    provider.sort_keys and provider.ensure_ascii
+    and provider.compact is not False and not (provider.compact is None and current_app.debug)
+  )
+
+def respond(fields, **rows):
+  # `fields` are plain values; each keyword is a list of JSON texts, one per row
+  provider = current_app.json
+  if not spliceable(provider):
+    return jsonify(dict(fields, **{key: [json.loads(row) for row in texts] for key, texts in rows.items()}))
+
+  members = []
+  for key in sorted(list(fields) + list(rows)):
+    if key in rows:
+      value = '[' + ','.join(rows[key]) + ']'
+    else:
+      value = provider.dumps(fields[key], separators=(',', ':'))
+    members.append(f'{json.dumps(key)}:{value}')
+  return current_app.response_class(ascii('{' + ','.join(members) + '}') + '\n', mimetype=provider.mimetype)
+
+def respond_object(key, text):
+  # {key: row} for a single JSON text
+  provider = current_app.json
+  if not spliceable(provider):
+    return jsonify({key: json.loads(text)})
+  return current_app.response_class(ascii('{' + json.dumps(key) + ':' + text + '}') + '\n',
+                                    mimetype=provider.mimetype)
+
+class OrjsonProvider(DefaultJSONProvider):
+  # Output of Flask's provider, encoded by orjson. Pretty-printing, other dumps()
+  # arguments and values orjson rejects (e.g. integers over 64 bits) fall back to
+  # Flask's encoder. Floats that json.dumps writes with an exponent (1e-05) or as
+  # NaN come out as 0.00001 or null.
+  OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+             | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+  def dumps(self, obj, **kwargs):
+    if kwargs != {"separators": (',', ':')} or not self.sort_keys or not self.ensure_ascii:
+      return super().dumps(obj, **kwargs)
+    try:
+      return ascii(orjson.dumps(obj, default=self.default, option=self.OPTIONS).decode('utf-8'))
+    except orjson.JSONEncodeError:
+      return super().dumps(obj, **kwargs)
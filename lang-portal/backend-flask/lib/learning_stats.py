@@ -0,0 +1,322 @@
+from datetime import date, datetime, timedelta, timezone
+
+# Incrementally maintained review statistics.
+#
+# word_stats holds per-word attempts/correct counts and the mastered flag,
+# activity_days the days with at least one review or new session, and
+# learning_stats a single summary row with the totals read by /dashboard/stats.
+# record_reviews() keeps all three up to date and must run inside the
+# transaction that inserts the word_review_items rows, so the summary never
+# drifts from the history; record_session() does the same for new sessions.
+#
+# The summary row also holds the current and longest streak of consecutive
+# active days (UTC). A day that becomes active extends the streak ending the
+# day before or starts a new one, so keeping them costs one row update; only a
+# day filled in before the last active one recounts the runs of activity_days.
+
+# A word is mastered after this many attempts at this success rate or better
+MASTERED_MIN_ATTEMPTS = 5
+MASTERED_MIN_SUCCESS_RATE = 0.8
+
+# SQLite's default limit on host parameters per statement
+MAX_PARAMS = 900
+
+SUMMARY_COLUMNS = ['total_attempts', 'total_correct', 'words_studied', 'mastered_words', 'active_days']
+
+def is_mastered(attempts, correct):
+  return attempts >= MASTERED_MIN_ATTEMPTS and correct * 1.0 / attempts >= MASTERED_MIN_SUCCESS_RATE
+
+def timestamp():
+  # word_review_items.created_at format (UTC, like CURRENT_TIMESTAMP)
+  return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+def chunks(items, size=MAX_PARAMS):
+  for start in range(0, len(items), size):
+    yield items[start:start + size]
+
+def day_after(day):
+  return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+def mark_active(cursor, day):
+  # Add `day` (YYYY-MM-DD) to activity_days, advancing the streaks if it is new
+  cursor.execute('INSERT OR IGNORE INTO activity_days (day) VALUES (?)', (day,))
+  if cursor.rowcount != 1:
+    return
+  cursor.execute('INSERT OR IGNORE INTO learning_stats (id) VALUES (1)')
+  cursor.execute('SELECT current_streak, streak_end FROM learning_stats WHERE id = 1')
+  current, end = cursor.fetchone()
+  if end is not None and day < end:
+    recount_streaks(cursor)
+    return
+  current = current + 1 if end is not None and day_after(end) == day else 1
+  cursor.execute('''
+    UPDATE learning_stats
+    SET current_streak = ?, longest_streak = MAX(longest_streak, ?), streak_end = ?
+    WHERE id = 1
+  ''', (current, current, day))
+
+def record_session(cursor, created_at):
+  # created_at: word_review_items.created_at format, see timestamp()
+  day = str(created_at)[:10]
+  mark_active(cursor, day)
+  cursor.execute('UPDATE activity_days SET sessions = sessions + 1 WHERE day = ?', (day,))
+
+def record_reviews(cursor, reviews):
+  # reviews: iterable of (word_id, correct, created_at) that were just inserted
+  per_word = {}
+  per_day = {}
+  for word_id, correct, created_at in reviews:
+    counts = per_word.setdefault(word_id, [0, 0])
+    counts[0] += 1
+    counts[1] += 1 if correct else 0
+    day = str(created_at)[:10]
+    per_day[day] = per_day.get(day, 0) + 1
+
+  if not per_word:
+    return
+
+  # Fold the counts into word_stats, then read the rows back (inside the same
+  # write transaction) to find new words and mastered flag transitions
+  cursor.executemany('''
+    INSERT INTO word_stats (word_id, attempts, correct) VALUES (?, ?, ?)
+    ON CONFLICT(word_id) DO UPDATE SET
+      attempts = attempts + excluded.attempts,
+      correct = correct + excluded.correct
+  ''', [(word_id, attempts, correct) for word_id, (attempts, correct) in per_word.items()])
+
+  new_words = 0
+  mastered_delta = 0
+  changed = []
+  for word_ids in chunks(list(per_word)):
+    cursor.execute(f'''
+      SELECT word_id, attempts, correct, mastered
+      FROM word_stats
+      WHERE word_id IN ({','.join('?' * len(word_ids))})
+    ''', word_ids)
+    for row in cursor.fetchall():
+      if row['attempts'] == per_word[row['word_id']][0]:
+        new_words += 1
+      mastered = is_mastered(row['attempts'], row['correct'])
+      if mastered != bool(row['mastered']):
+        mastered_delta += 1 if mastered else -1
+        changed.append((mastered, row['word_id']))
+
+  cursor.executemany('UPDATE word_stats SET mastered = ? WHERE word_id = ?', changed)
+
+  # Same for the activity days
+  for day in sorted(per_day):
+    mark_active(cursor, day)
+  cursor.executemany('''
+    INSERT INTO activity_days (day, reviews) VALUES (?, ?)
+    ON CONFLICT(day) DO UPDATE SET reviews = reviews + excluded.reviews
+  ''', list(per_day.items()))
+
+  new_days = 0
+  days = list(per_day)
+  cursor.execute(f'''
+    SELECT day, reviews FROM activity_days WHERE day IN ({','.join('?' * len(days))})
+  ''', days)
+  for row in cursor.fetchall():
+    if row['reviews'] == per_day[row['day']]:
+      new_days += 1
+
+  cursor.execute('INSERT OR IGNORE INTO learning_stats (id) VALUES (1)')
+  cursor.execute('''
+    UPDATE learning_stats SET
+      total_attempts = total_attempts + ?,
+      total_correct = total_correct + ?,
+      words_studied = words_studied + ?,
+      mastered_words = mastered_words + ?,
+      active_days = active_days + ?
+    WHERE id = 1
+  ''', (
+    sum(attempts for attempts, _ in per_word.values()),
+    sum(correct for _, correct in per_word.values()),
+    new_words,
+    mastered_delta,
+    new_days
+  ))
+
+def summary(cursor):
+  cursor.execute(f'SELECT {", ".join(SUMMARY_COLUMNS)} FROM learning_stats WHERE id = 1')
+  row = cursor.fetchone()
+  if row is None:
+    return {column: 0 for column in SUMMARY_COLUMNS}
+  return {column: row[column] for column in SUMMARY_COLUMNS}
+
+# Runs of consecutive days in activity_days: (first day, last day, length)
+STREAK_RUNS = '''
+  SELECT MIN(day) as first_day, MAX(day) as last_day, COUNT(*) as length
+  FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) as run FROM activity_days)
+  GROUP BY run
+'''
+
+def recount_streaks(cursor):
+  cursor.execute('INSERT OR IGNORE INTO learning_stats (id) VALUES (1)')
+  cursor.execute(f'''
+    UPDATE learning_stats SET
+      current_streak = COALESCE((SELECT length FROM ({STREAK_RUNS}) ORDER BY last_day DESC LIMIT 1), 0),
+      longest_streak = COALESCE((SELECT MAX(length) FROM ({STREAK_RUNS})), 0),
+      streak_end = (SELECT MAX(day) FROM activity_days)
+    WHERE id = 1
+  ''')
+
+def streaks(cursor, today=None):
+  # Current and longest streak; the current one is broken once a whole day
+  # (UTC) has passed without activity
+  today = today or datetime.now(timezone.utc).date().isoformat()
+  cursor.execute('SELECT current_streak, longest_streak, streak_end FROM learning_stats WHERE id = 1')
+  row = cursor.fetchone()
+  if row is None or row[2] is None:
+    return {"current_streak": 0, "longest_streak": 0}
+  current, longest, end = row
+  if end != today and day_after(end) != today:
+    current = 0
+  return {"current_streak": current, "longest_streak": longest}
+
+def reset(cursor):
+  # Called when the study history is cleared
+  cursor.execute('DELETE FROM word_stats')
+  cursor.execute('DELETE FROM activity_days')
+  cursor.execute('DELETE FROM learning_stats')
+
+# Full recompute from the review history, used by rebuild() and check(): the
+# days rolled up by `invoke compact-reviews` plus the raw reviews, as in the
+# review_days view. Each side is aggregated on its own first, so the raw
+# reviews are still grouped by word through idx_word_review_items_word.
+RECOMPUTE_WORD_STATS = f'''
+  SELECT
+    word_id,
+    SUM(attempts) as attempts,
+    SUM(correct) as correct,
+    SUM(attempts) >= {MASTERED_MIN_ATTEMPTS}
+      AND SUM(correct) * 1.0 / SUM(attempts) >= {MASTERED_MIN_SUCCESS_RATE} as mastered
+  FROM (
+    SELECT word_id, SUM(correct_count + wrong_count) as attempts, SUM(correct_count) as correct
+    FROM daily_word_stats
+    GROUP BY word_id
+    UNION ALL
+    SELECT
+      wri.word_id,
+      COUNT(*) as attempts,
+      SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END) as correct
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    GROUP BY wri.word_id
+  )
+  GROUP BY word_id
+'''
+
+# Reviews and new sessions per day
+RECOMPUTE_ACTIVITY_DAYS = '''
+  SELECT day, SUM(reviews) as reviews, SUM(sessions) as sessions
+  FROM (
+    SELECT day, SUM(correct_count + wrong_count) as reviews, 0 as sessions
+    FROM daily_word_stats
+    GROUP BY day
+    UNION ALL
+    SELECT date(wri.created_at) as day, COUNT(*) as reviews, 0 as sessions
+    FROM word_review_items wri
+    JOIN study_sessions ss ON wri.study_session_id = ss.id
+    GROUP BY date(wri.created_at)
+    UNION ALL
+    SELECT date(created_at) as day, 0 as reviews, COUNT(*) as sessions
+    FROM study_sessions
+    GROUP BY date(created_at)
+  )
+  GROUP BY day
+'''
+
+def recompute(cursor):
+  cursor.execute(f'''
+    SELECT
+      COALESCE(SUM(attempts), 0) as total_attempts,
+      COALESCE(SUM(correct), 0) as total_correct,
+      COUNT(*) as words_studied,
+      COALESCE(SUM(mastered), 0) as mastered_words,
+      (SELECT COUNT(*) FROM ({RECOMPUTE_ACTIVITY_DAYS}) WHERE reviews > 0) as active_days
+    FROM ({RECOMPUTE_WORD_STATS})
+  ''')
+  row = cursor.fetchone()
+  return {column: row[column] for column in SUMMARY_COLUMNS}
+
+def rebuild(connection):
+  # Backfill (or repair) all three tables from the full study history
+  cursor = connection.cursor()
+  reset(cursor)
+  cursor.execute(f'INSERT INTO word_stats (word_id, attempts, correct, mastered) {RECOMPUTE_WORD_STATS}')
+  cursor.execute(f'INSERT INTO activity_days (day, reviews, sessions) {RECOMPUTE_ACTIVITY_DAYS}')
+  cursor.execute('''
+    INSERT INTO learning_stats (id, total_attempts, total_correct, words_studied, mastered_words, active_days)
+    SELECT
+      1,
+      COALESCE(SUM(attempts), 0),
+      COALESCE(SUM(correct), 0),
+      COUNT(*),
+      COALESCE(SUM(mastered), 0),
+      (SELECT COUNT(*) FROM activity_days WHERE reviews > 0)
+    FROM word_stats
+  ''')
+  recount_streaks(cursor)
+  connection.commit()
+
+def check(connection):
+  # Compare the maintained tables against a full recompute.
+  # Returns a list of human readable differences (empty when consistent).
+  cursor = connection.cursor()
+  problems = []
+
+  expected = recompute(cursor)
+  actual = summary(cursor)
+  for column in SUMMARY_COLUMNS:
+    if expected[column] != actual[column]:
+      problems.append(f"learning_stats.{column}: {actual[column]} (expected {expected[column]})")
+
+  cursor.execute(f'''
+    SELECT COUNT(*) FROM (
+      SELECT * FROM ({RECOMPUTE_WORD_STATS})
+      EXCEPT SELECT word_id, attempts, correct, mastered FROM word_stats
+    )
+  ''')
+  missing = cursor.fetchone()[0]
+  cursor.execute(f'''
+    SELECT COUNT(*) FROM (
+      SELECT word_id, attempts, correct, mastered FROM word_stats
+      EXCEPT SELECT * FROM ({RECOMPUTE_WORD_STATS})
+    )
+  ''')
+  extra = cursor.fetchone()[0]
+  if missing or extra:
+    problems.append(f"word_stats: {missing} row(s) missing or stale, {extra} row(s) unexpected")
+
+  cursor.execute(f'''
+    SELECT COUNT(*) FROM (
+      SELECT * FROM ({RECOMPUTE_ACTIVITY_DAYS})
+      EXCEPT SELECT day, reviews, sessions FROM activity_days
+    )
+  ''')
+  missing = cursor.fetchone()[0]
+  cursor.execute(f'''
+    SELECT COUNT(*) FROM (
+      SELECT day, reviews, sessions FROM activity_days
+      EXCEPT SELECT * FROM ({RECOMPUTE_ACTIVITY_DAYS})
+    )
+  ''')
+  extra = cursor.fetchone()[0]
+  if missing or extra:
+    problems.append(f"activity_days: {missing} row(s) missing or stale, {extra} row(s) unexpected")
+
+  cursor.execute(f'''
+    SELECT
+      COALESCE((SELECT length FROM ({STREAK_RUNS}) ORDER BY last_day DESC LIMIT 1), 0),
+      COALESCE((SELECT MAX(length) FROM ({STREAK_RUNS})), 0),
+      (SELECT MAX(day) FROM activity_days)
+  ''')
+  expected = tuple(cursor.fetchone())
+  cursor.execute('SELECT current_streak, longest_streak, streak_end FROM learning_stats WHERE id = 1')
+  row = cursor.fetchone()
+  actual = tuple(row) if row is not None else (0, 0, None)
+  if actual != expected:
+    problems.append(f"learning_stats streaks (current, longest, last day): {actual} (expected {expected})")
+
+  return problems
@@ -0,0 +1,168 @@
+import bisect
+import threading
+import time
+
+from flask import g, request
+
+# Prometheus metrics for GET /metrics (text exposition format 0.0.4).
+#
+# RequestMetrics counts every request by route, method and status and keeps a
+# latency histogram per route. Routes are labelled with their URL rule
+# (/words/<int:word_id>), never the raw path, so the number of series stays
+# bounded. Recording a request is one dict lookup and a few additions under a
+# lock; the text is only built when /metrics is scraped, together with the
+# gauges of the connection pool, the response and hot-word caches, the review queue and, when
+# SQL_PROFILE is on, the SQL profiler.
+#
+# Latency is measured until the response is ready, so a streamed export counts
+# the time to its first byte.
+
+PREFIX = 'lang_portal'
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+class RequestMetrics:
+  def __init__(self, buckets=BUCKETS):
+    self.buckets = tuple(buckets)
+    self.routes = {}
+    self.lock = threading.Lock()
+
+  def init_app(self, app):
+    app.before_request(self.start)
+    app.after_request(self.finish)
+
+  def start(self):
+    g.metrics_started = time.perf_counter()
+
+  def finish(self, response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+      rule = request.url_rule.rule if request.url_rule else '<unmatched>'
+      self.observe(request.method, rule, response.status_code, time.perf_counter() - started)
+    return response
+
+  def observe(self, method, route, status, seconds):
+    bucket = bisect.bisect_left(self.buckets, seconds)
+    with self.lock:
+      stats = self.routes.get((method, route))
+      if stats is None:
+        stats = self.routes[(method, route)] = {
+          "statuses": {},
+          "buckets": [0] * (len(self.buckets) + 1),
+          "sum": 0.0,
+          "count": 0
+        }
+      stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+      stats["buckets"][bucket] += 1
+      stats["sum"] += seconds
+      stats["count"] += 1
+
+  def snapshot(self):
+    with self.lock:
+      return {
+        key: dict(stats, statuses=dict(stats["statuses"]), buckets=list(stats["buckets"]))
+        for key, stats in self.routes.items()
+      }
+
+  def lines(self):
+    routes = sorted(self.snapshot().items())
+    yield from header('http_requests_total', 'counter', 'Requests by route, method and status.')
+    for (method, route), stats in routes:
+      for status, count in sorted(stats["statuses"].items()):
+        yield sample('http_requests_total', count, method=method, route=route, status=status)
+
+    yield from header('http_request_duration_seconds', 'histogram',
+                      'Time until the response is ready, by route and method.')
+    for (method, route), stats in routes:
+      cumulative = 0
+      for bound, count in zip(self.buckets + (float('inf'),), stats["buckets"]):
+        cumulative += count
+        yield sample('http_request_duration_seconds_bucket', cumulative, method=method, route=route,
+                     le='+Inf' if bound == float('inf') else repr(bound))
+      yield sample('http_request_duration_seconds_sum', stats["sum"], method=method, route=route)
+      yield sample('http_request_duration_seconds_count', stats["count"], method=method, route=route)
+
+def escape(value):
+  return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def sample(name, value, **labels):
+  if labels:
+    label_text = ','.join(f'{key}="{escape(label)}"' for key, label in labels.items())
+    return f'{PREFIX}_{name}{{{label_text}}} {value}'
+  return f'{PREFIX}_{name} {value}'
+
+def header(name, kind, help):
+  yield f'# HELP {PREFIX}_{name} {help}'
+  yield f'# TYPE {PREFIX}_{name} {kind}'
+
+def metric(name, kind, help, value, **labels):
+  yield from header(name, kind, help)
+  yield sample(name, value, **labels)
+
+def pool_lines(db):
+  pool = db.metrics()
+  yield from metric('db_pool_size', 'gauge', 'Idle connections the pool keeps at most.', pool["pool_size"])
+  yield from metric('db_connections_idle', 'gauge', 'Connections waiting in the pool.', pool["idle"])
+  yield from metric('db_connections_in_use', 'gauge', 'Connections held by requests and streams.', pool["in_use"])
+  yield from metric('db_connections_opened_total', 'counter', 'Connections opened.', pool["opened"])
+  yield from metric('db_connections_closed_total', 'counter', 'Connections closed.', pool["closed"])
+
+def cache_lines(cache):
+  stats = cache.metrics()
+  yield from metric('cache_entries', 'gauge', 'Responses in the response cache.', stats["entries"])
+  yield from metric('cache_max_entries', 'gauge', 'Capacity of the response cache.', stats["max_entries"])
+  yield from metric('cache_hits_total', 'counter', 'Response cache hits.', stats["hits"])
+  yield from metric('cache_misses_total', 'counter', 'Response cache misses.', stats["misses"])
+  yield from metric('cache_not_modified_total', 'counter', 'Cached responses answered with 304.',
+                    stats["not_modified"])
+  yield from metric('cache_hit_ratio', 'gauge', 'Hits over lookups since start.', stats["hit_ratio"])
+
+def word_cache_lines(word_cache):
+  stats = word_cache.metrics()
+  yield from metric('word_cache_entries', 'gauge', 'Words in the hot-word cache.', stats["entries"])
+  yield from metric('word_cache_max_entries', 'gauge', 'Capacity of the hot-word cache.', stats["max_entries"])
+  yield from metric('word_cache_hits_total', 'counter', 'Hot-word cache hits.', stats["hits"])
+  yield from metric('word_cache_misses_total', 'counter', 'Hot-word cache misses.', stats["misses"])
+
+def queue_lines(review_queue):
+  if review_queue is None:
+    return
+  stats = review_queue.metrics()
+  yield from metric('review_queue_depth', 'gauge', 'Submissions waiting for the review writer.', stats["depth"])
+  yield from metric('review_queue_enqueued_total', 'counter', 'Reviews submitted to the queue.', stats["enqueued"])
+  yield from metric('review_queue_committed_total', 'counter', 'Reviews committed by the writer.',
+                    stats["committed"])
+  yield from metric('review_queue_failed_total', 'counter', 'Reviews whose batch failed.', stats["failed"])
+  yield from metric('review_queue_rejected_total', 'counter', 'Reviews refused because the queue was full.',
+                    stats["rejected"])
+  yield from metric('review_queue_batches_total', 'counter', 'Batches flushed by the writer.', stats["batches"])
+  yield from metric('review_queue_last_flush_seconds', 'gauge', 'Duration of the last flush.',
+                    stats["last_flush_ms"] / 1000)
+
+def profiler_lines(profiler):
+  if profiler is None:
+    return
+  routes = sorted(profiler.metrics()["routes"].items())
+  yield from header('sql_queries_total', 'counter', 'SQL statements run by route (SQL_PROFILE).')
+  for route, stats in routes:
+    method, rule = route.split(' ', 1)
+    yield sample('sql_queries_total', stats["queries"], method=method, route=rule)
+  yield from header('sql_seconds_total', 'counter', 'Time spent in SQL by route (SQL_PROFILE).')
+  for route, stats in routes:
+    method, rule = route.split(' ', 1)
+    yield sample('sql_seconds_total', stats["sql_ms"] / 1000, method=method, route=rule)
+
+def render(app):
+  # The whole exposition for `app`, ending with a newline as the format requires
+  lines = []
+  if app.metrics is not None:
+    lines.extend(app.metrics.lines())
+  lines.extend(pool_lines(app.db))
+  lines.extend(cache_lines(app.cache))
+  lines.extend(word_cache_lines(app.word_cache))
+  lines.extend(queue_lines(app.review_queue))
+  lines.extend(profiler_lines(app.profiler))
+  return '\n'.join(lines) + '\n'
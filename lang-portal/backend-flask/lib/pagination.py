@@ -0,0 +1,48 @@
+import base64
+import json
+
+# Keyset (cursor) pagination shared by the list endpoints.
+#
+# A cursor is an opaque token holding the sort key and id of the last row of a
+# page. Passing it back as ?after=<token> seeks straight to the next page through
+# the (sort column, id) index instead of skipping rows with OFFSET.
+
+class InvalidCursor(ValueError):
+  pass
+
+def encode_cursor(sort_by, order, value, id):
+  payload = json.dumps([sort_by, order, value, id], separators=(',', ':'))
+  return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(token, sort_by, order):
+  # Returns (value, id), rejecting tokens issued for a different sort
+  try:
+    padded = token + '=' * (-len(token) % 4)
+    cursor_sort_by, cursor_order, value, id = json.loads(base64.urlsafe_b64decode(padded))
+  except Exception:
+    raise InvalidCursor('Invalid cursor')
+  if cursor_sort_by != sort_by or cursor_order != order or not isinstance(id, int):
+    raise InvalidCursor('Cursor does not match the requested sort order')
+  return value, id
+
+def seek(sort_expression, id_expression, order):
+  # Row-value comparison, which SQLite turns into a range seek on the index
+  operator = '>' if order == 'asc' else '<'
+  return f'({sort_expression}, {id_expression}) {operator} (?, ?)'
+
+def with_total(args):
+  # ?with_total=0 skips the COUNT(*) query; totals are then returned as null
+  return args.get('with_total', '1') not in ('0', 'false')
+
+def next_cursor(rows, per_page, sort_by, order, sort_key=None):
+  # Rows are fetched with LIMIT per_page + 1; the extra row means there is another page.
+  # sort_key names the result column holding the sort value (defaults to sort_by).
+  if len(rows) <= per_page:
+    return None
+  last = rows[per_page - 1]
+  return encode_cursor(sort_by, order, last[sort_key or sort_by], last['id'])
+
+def total_pages(total, per_page):
+  if total is None:
+    return None
+  return (total + per_page - 1) // per_page
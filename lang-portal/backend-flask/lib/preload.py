@@ -0,0 +1,32 @@
+import time
+
+# Startup preload (PRELOAD=True).
+#
+# Before a worker serves its first client, the hot read routes are requested
+# once through the test client: their responses land in the response cache,
+# PRELOAD_WORDS words in the hot-word cache, and the pages they read in SQLite's
+# page cache. The words are those answered correctly most often, read off
+# idx_words_correct_count, as a stand-in for the most studied. Every worker of
+# a multi-process server warms its own caches.
+
+PATHS = ['/groups', '/api/study-activities', '/dashboard/stats', '/dashboard/recent-session', '/words']
+
+HOT_WORDS_SQL = 'SELECT id FROM words ORDER BY correct_count DESC LIMIT ?'
+
+def run(app, words=256):
+  started = time.perf_counter()
+  with app.app_context():
+    cursor = app.db.cursor()
+    cursor.execute(HOT_WORDS_SQL, (words,))
+    word_ids = [row['id'] for row in cursor.fetchall()]
+    app.db.close()
+
+  client = app.test_client()
+  failed = 0
+  paths = PATHS + [f'/words/{word_id}' for word_id in word_ids]
+  for path in paths:
+    if client.get(path).status_code != 200:
+      failed += 1
+  app.logger.info('Preloaded %d routes in %.0fms (%d failed)', len(paths), (time.perf_counter() - started) * 1000,
+                  failed)
+  return {"paths": len(paths), "failed": failed}
@@ -0,0 +1,173 @@
+import json
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+# Opt-in SQL profiler (SQL_PROFILE=True in the app config).
+#
+# Connections opened by Db use ProfilingConnection, whose cursors time every
+# statement from execute() until its rows are fetched and count the rows
+# returned. During a request the statements are collected in `g`; when the
+# response is ready the profiler adds a Server-Timing header, logs statements
+# slower than SQL_SLOW_QUERY_MS together with their EXPLAIN QUERY PLAN, and
+# folds the request into per-route totals (GET /debug/queries).
+#
+# Statements run while a streamed response is being sent (the exports) happen
+# after the response is ready and are not counted.
+
+class ProfilingCursor(sqlite3.Cursor):
+  def execute(self, sql, parameters=()):
+    self.statement = record(sql, parameters)
+    start = time.perf_counter()
+    try:
+      return super().execute(sql, parameters)
+    finally:
+      self.timed(start, 0)
+
+  def executemany(self, sql, seq_of_parameters):
+    self.statement = record(sql, None)
+    start = time.perf_counter()
+    try:
+      return super().executemany(sql, seq_of_parameters)
+    finally:
+      self.timed(start, 0)
+
+  def fetchone(self):
+    start = time.perf_counter()
+    row = super().fetchone()
+    self.timed(start, 1 if row is not None else 0)
+    return row
+
+  def fetchmany(self, size=None):
+    start = time.perf_counter()
+    rows = super().fetchmany(self.arraysize if size is None else size)
+    self.timed(start, len(rows))
+    return rows
+
+  def fetchall(self):
+    start = time.perf_counter()
+    rows = super().fetchall()
+    self.timed(start, len(rows))
+    return rows
+
+  def timed(self, start, rows):
+    statement = getattr(self, 'statement', None)
+    if statement is not None:
+      statement["ms"] += (time.perf_counter() - start) * 1000
+      statement["rows"] += rows
+
+class ProfilingConnection(sqlite3.Connection):
+  def cursor(self, factory=ProfilingCursor):
+    return super().cursor(factory)
+
+  def execute(self, sql, parameters=()):
+    return self.cursor().execute(sql, parameters)
+
+  def executemany(self, sql, seq_of_parameters):
+    return self.cursor().executemany(sql, seq_of_parameters)
+
+def record(sql, parameters):
+  # Start recording a statement for the current request (None outside requests)
+  if not has_request_context() or 'sql_statements' not in g:
+    return None
+  statement = {"sql": sql, "params": parameters, "ms": 0.0, "rows": 0}
+  g.sql_statements.append(statement)
+  return statement
+
+def compact(sql):
+  return ' '.join(sql.split())
+
+class QueryProfiler:
+  def __init__(self, db, slow_ms=50, slow_log=None):
+    self.db = db
+    self.slow_ms = slow_ms
+    self.slow_log = slow_log
+    self.routes = {}
+    self.lock = threading.Lock()
+
+  def init_app(self, app):
+    self.logger = app.logger
+    app.before_request(self.start)
+    app.after_request(self.finish)
+
+  def start(self):
+    g.sql_statements = []
+
+  def finish(self, response):
+    statements = g.pop('sql_statements', None)
+    if statements is None:
+      return response
+    total_ms = sum(statement["ms"] for statement in statements)
+    response.headers.add('Server-Timing', f'sql;desc="{len(statements)} queries";dur={total_ms:.3f}')
+
+    route = f"{request.method} {request.url_rule.rule if request.url_rule else '<unmatched>'}"
+    slowest = max(statements, key=lambda statement: statement["ms"], default=None)
+    self.aggregate(route, statements, total_ms, slowest)
+    for statement in statements:
+      if statement["ms"] >= self.slow_ms:
+        self.log_slow(route, statement)
+    return response
+
+  def aggregate(self, route, statements, total_ms, slowest):
+    with self.lock:
+      stats = self.routes.setdefault(route, {
+        "requests": 0,
+        "queries": 0,
+        "rows": 0,
+        "sql_ms": 0.0,
+        "max_request_sql_ms": 0.0,
+        "slowest": None
+      })
+      stats["requests"] += 1
+      stats["queries"] += len(statements)
+      stats["rows"] += sum(statement["rows"] for statement in statements)
+      stats["sql_ms"] += total_ms
+      stats["max_request_sql_ms"] = max(stats["max_request_sql_ms"], total_ms)
+      if slowest is not None and (stats["slowest"] is None or slowest["ms"] > stats["slowest"]["ms"]):
+        stats["slowest"] = {"sql": compact(slowest["sql"]), "ms": round(slowest["ms"], 3), "rows": slowest["rows"]}
+
+  def explain(self, statement):
+    if statement["params"] is None:
+      return []
+    try:
+      rows = self.db.get().execute('EXPLAIN QUERY PLAN ' + statement["sql"], statement["params"]).fetchall()
+      return [row[3] for row in rows]
+    except sqlite3.Error as e:
+      return [f'EXPLAIN failed: {e}']
+
+  def log_slow(self, route, statement):
+    entry = {
+      "at": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+      "route": route,
+      "ms": round(statement["ms"], 3),
+      "rows": statement["rows"],
+      "sql": compact(statement["sql"]),
+      "params": statement["params"] if isinstance(statement["params"], (list, tuple, dict)) else None,
+      "plan": self.explain(statement)
+    }
+    if self.slow_log is None:
+      self.logger.warning('Slow query: %s', json.dumps(entry, default=str, ensure_ascii=False))
+      return
+    with self.lock:
+      with open(self.slow_log, 'a', encoding='utf-8') as log:
+        log.write(json.dumps(entry, default=str, ensure_ascii=False) + '\n')
+
+  def metrics(self):
+    with self.lock:
+      routes = {}
+      for route, stats in self.routes.items():
+        routes[route] = dict(
+          stats,
+          sql_ms=round(stats["sql_ms"], 3),
+          max_request_sql_ms=round(stats["max_request_sql_ms"], 3),
+          avg_queries=round(stats["queries"] / stats["requests"], 2),
+          avg_sql_ms=round(stats["sql_ms"] / stats["requests"], 3)
+        )
+      return {"slow_ms": self.slow_ms, "routes": routes}
+
+  def reset(self):
+    with self.lock:
+      self.routes.clear()
@@ -0,0 +1,285 @@
+from lib import pagination
+
+# Hot queries from the routes, with the index each one must be served by.
+# tests/test_query_plans.py fails if a plan no longer mentions the index, falls back
+# to scanning a table named in `no_scan` (as it appears in the plan, i.e. its
+# alias) or, with `no_sort`, sorts the result instead of walking the index.
+HOT_QUERIES = [
+  {
+    "name": "/api/study-sessions (cursor page)",
+    "sql": '''
+      SELECT ss.id, g.name, sa.name, ss.ended_at, ss.review_count
+      FROM study_sessions ss
+      JOIN groups g ON g.id = ss.group_id
+      JOIN study_activities sa ON sa.id = ss.study_activity_id
+      WHERE (ss.created_at, ss.id) < (?, ?)
+      ORDER BY ss.created_at DESC, ss.id DESC
+      LIMIT 11
+    ''',
+    "params": ('2025-01-01 00:00:00', 100),
+    "uses": ["idx_study_sessions_created_at"],
+    "no_scan": ["ss"],
+    "no_sort": True
+  },
+  {
+    "name": "/api/study-activities/<id>/sessions (cursor page)",
+    "sql": '''
+      SELECT ss.id, g.name, sa.name
+      FROM study_sessions ss
+      JOIN groups g ON g.id = ss.group_id
+      JOIN study_activities sa ON sa.id = ss.study_activity_id
+      WHERE ss.study_activity_id = ? AND (ss.created_at, ss.id) < (?, ?)
+      ORDER BY ss.created_at DESC, ss.id DESC
+      LIMIT 11
+    ''',
+    "params": (1, '2025-01-01 00:00:00', 100),
+    "uses": ["idx_study_sessions_activity_created_at"],
+    "no_scan": ["ss"],
+    "no_sort": True
+  },
+  {
+    "name": "/groups?sort_by=name (cursor page)",
+    "sql": '''
+      SELECT id, name, words_count
+      FROM groups
+      WHERE (name, id) > (?, ?)
+      ORDER BY name asc, id asc
+      LIMIT 11
+    ''',
+    "params": ('', 0),
+    "uses": ["idx_groups_name"],
+    "no_scan": ["groups"],
+    "no_sort": True
+  },
+  {
+    "name": "/words/search (full-text)",
+    "sql": '''
+      WITH m AS MATERIALIZED (
+        SELECT rowid AS id, bm25(words_fts, 10.0, 5.0, 1.0) AS score
+        FROM words_fts
+        WHERE words_fts MATCH ?
+      )
+      SELECT w.id, w.correct_count, m.score
+      FROM m
+      JOIN words w ON w.id = m.id
+      ORDER BY m.score, m.id
+      LIMIT 51
+    ''',
+    "params": ('"school"',),
+    "uses": ["VIRTUAL TABLE INDEX"],
+    "no_scan": ["w"]
+  },
+  {
+    "name": "/words/search (short prefix)",
+    "sql": '''
+      SELECT id, romaji <> ? FROM words WHERE romaji >= ? AND romaji < ? || char(1114111)
+      UNION ALL
+      SELECT id, english <> ? FROM words WHERE english >= ? AND english < ? || char(1114111)
+    ''',
+    "params": ('ka',) * 6,
+    "uses": ["COVERING INDEX idx_words_romaji", "COVERING INDEX idx_words_english"],
+    "no_scan": ["words"]
+  },
+  {
+    "name": "/words?ids= and POST /words/batch",
+    "sql": '''
+      SELECT w.id, w.correct_count, (
+        SELECT json_group_array(g.name)
+        FROM word_groups wg
+        JOIN groups g ON g.id = wg.group_id
+        WHERE wg.word_id = w.id
+      ) AS groups
+      FROM json_each(?) ids
+      JOIN words w ON w.id = ids.value
+      ORDER BY ids.key
+    ''',
+    "params": ('[1, 2, 3]',),
+    "uses": ["INTEGER PRIMARY KEY", "idx_word_groups_word"],
+    "no_scan": ["w", "wg", "g"]
+  },
+  {
+    "name": "/dashboard/recent-session",
+    "sql": '''
+      SELECT ss.id, sa.name, ss.correct_count, ss.review_count - ss.correct_count as wrong_count
+      FROM study_sessions ss
+      JOIN study_activities sa ON ss.study_activity_id = sa.id
+      ORDER BY ss.created_at DESC
+      LIMIT 1
+    ''',
+    "params": (),
+    # Walks the index from the newest end and stops at the first row (SCAN ... USING INDEX)
+    "uses": ["idx_study_sessions_created_at"],
+    "no_scan": [],
+    "no_sort": True
+  },
+  {
+    "name": "/dashboard/stats (active groups)",
+    "sql": '''
+      SELECT COUNT(*) as active_groups
+      FROM groups
+      WHERE last_session_at >= date('now', '-30 days')
+    ''',
+    "params": (),
+    "uses": ["idx_groups_last_session_at"],
+    "no_scan": ["groups"]
+  },
+  {
+    "name": "/groups/<id>/study_sessions",
+    "sql": '''
+      SELECT s.id, s.review_count, COALESCE(s.ended_at, '') as last_activity_time
+      FROM study_sessions s
+      WHERE s.group_id = ?
+      ORDER BY s.created_at DESC
+      LIMIT 10
+    ''',
+    "params": (1,),
+    "uses": ["idx_study_sessions_group_created_at"],
+    "no_scan": ["s"]
+  },
+  {
+    "name": "/groups/<id>/words",
+    "sql": '''
+      SELECT w.id
+      FROM words w
+      JOIN word_groups wg ON w.id = wg.word_id
+      WHERE wg.group_id = ?
+    ''',
+    "params": (1,),
+    # Any of the word_groups indexes led by group_id covers this one; which the
+    # planner takes is a tie (group_word, group_due, group_position)
+    "uses": ["COVERING INDEX idx_word_groups_group_"],
+    "no_scan": ["wg"]
+  },
+  {
+    "name": "word reviews by word",
+    "sql": 'SELECT COUNT(*) FROM word_review_items WHERE word_id = ?',
+    "params": (1,),
+    "uses": ["idx_word_review_items_word"],
+    "no_scan": ["word_review_items"]
+  },
+  {
+    "name": "log_review aggregate lookup",
+    "sql": 'SELECT * FROM word_reviews WHERE word_id = ?',
+    "params": (1,),
+    "uses": ["idx_word_reviews_word"],
+    "no_scan": ["word_reviews"]
+  },
+  {
+    "name": "/groups/<id>/next-words (overdue)",
+    "sql": '''
+      SELECT w.id, wg.due_at, s.interval_days
+      FROM word_groups wg
+      JOIN words w ON w.id = wg.word_id
+      LEFT JOIN word_schedule s ON s.word_id = wg.word_id
+      WHERE wg.group_id = ? AND wg.due_at <= ?
+      ORDER BY wg.due_at, wg.word_id
+      LIMIT 10
+    ''',
+    "params": (1, '2025-01-01 00:00:00'),
+    "uses": ["idx_word_groups_group_due"],
+    "no_scan": ["wg", "w", "s"],
+    "no_sort": True
+  },
+  {
+    "name": "/groups/<id>/next-words (new)",
+    "sql": '''
+      SELECT w.id, wg.due_at, s.interval_days
+      FROM word_groups wg
+      JOIN words w ON w.id = wg.word_id
+      LEFT JOIN word_schedule s ON s.word_id = wg.word_id
+      WHERE wg.group_id = ? AND wg.due_at IS NULL
+      ORDER BY wg.word_id
+      LIMIT 10
+    ''',
+    "params": (1,),
+    "uses": ["idx_word_groups_group_due"],
+    "no_scan": ["wg", "w", "s"],
+    "no_sort": True
+  },
+  {
+    "name": "/groups/<id>/sample (probe)",
+    "sql": '''
+      SELECT wg.position, wg.word_id, COALESCE(s.attempts, 0), COALESCE(s.mastered, 0)
+      FROM json_each(?) p
+      JOIN word_groups wg ON wg.group_id = ? AND wg.position = p.value
+      LEFT JOIN word_stats s ON s.word_id = wg.word_id
+      ORDER BY p.key
+    ''',
+    "params": ('[3, 1, 2]', 1),
+    "uses": ["idx_word_groups_group_position"],
+    "no_scan": ["wg", "s"]
+  },
+  {
+    "name": "word_groups position fill-in (delete trigger)",
+    "sql": '''
+      UPDATE word_groups SET position = ?
+      WHERE group_id = ?
+        AND position = (SELECT MAX(position) FROM word_groups WHERE group_id = ?)
+        AND +position > ?
+    ''',
+    "params": (0, 1, 1, 0),
+    "uses": ["idx_word_groups_group_position (group_id=? AND position=?)"],
+    "no_scan": ["word_groups"]
+  },
+  {
+    "name": "schedule copy to word_groups",
+    "sql": 'UPDATE word_groups SET due_at = ? WHERE word_id = ?',
+    "params": ('2025-01-01 00:00:00', 1),
+    "uses": ["idx_word_groups_word"],
+    "no_scan": ["word_groups"]
+  },
+]
+
+# Index of each /words sort column; every sort, in both orders and from a
+# cursor, walks it and stops after the page
+WORDS_SORT_INDEXES = {
+  'kanji': 'idx_words_kanji',
+  'romaji': 'idx_words_romaji',
+  'english': 'idx_words_english',
+  'correct_count': 'idx_words_correct_count',
+  'wrong_count': 'idx_words_wrong_count'
+}
+
+def words_page(sort_by, order, after):
+  where = 'WHERE ' + pagination.seek(f'w.{sort_by}', 'w.id', order) if after else ''
+  return {
+    "name": f"/words?sort_by={sort_by}&order={order} ({'cursor' if after else 'first'} page)",
+    "sql": f'''
+      SELECT w.id, w.{sort_by}, w.correct_count, w.wrong_count
+      FROM words w
+      {where}
+      ORDER BY w.{sort_by} {order}, w.id {order}
+      LIMIT 51
+    ''',
+    "params": (0, 0) if after else (),
+    "uses": [WORDS_SORT_INDEXES[sort_by]],
+    # The first page walks the index from one end (SCAN ... USING INDEX), a cursor page seeks into it
+    "no_scan": ["w"] if after else [],
+    "no_sort": True
+  }
+
+HOT_QUERIES += [
+  words_page(sort_by, order, after)
+  for sort_by in WORDS_SORT_INDEXES for order in ('asc', 'desc') for after in (False, True)
+]
+
+def explain(connection, sql, params=()):
+  rows = connection.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+  return [row[3] for row in rows]
+
+def check(connection, queries=HOT_QUERIES):
+  # Returns a list of (query name, problem, plan) for every failing expectation
+  failures = []
+  for query in queries:
+    plan = explain(connection, query["sql"], query["params"])
+    text = '\n'.join(plan)
+    for index in query["uses"]:
+      if index not in text:
+        failures.append((query["name"], f"does not use {index}", plan))
+    for table in query["no_scan"]:
+      for step in plan:
+        if step == f"SCAN {table}" or step.startswith(f"SCAN {table} "):
+          failures.append((query["name"], f"scans {table}", plan))
+    if query.get("no_sort") and 'USE TEMP B-TREE' in text:
+      failures.append((query["name"], "sorts instead of walking the index", plan))
+  return failures
@@ -0,0 +1,162 @@
+import functools
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from flask import Response, request, make_response
+
+# HTTP response cache for read endpoints that rarely change.
+#
+# Responses are keyed by path and query string and tagged with the generation
+# counters of the tables they read. Write routes bump the counters of the tables
+# they touch (see invalidates()), which makes every cached response that read
+# those tables stale. Optionally, `PRAGMA data_version` is polled so commits from
+# other processes (tasks, other workers) invalidate everything as well.
+#
+# With `shared` (a SharedGenerations, lib/shared_generations.py) the counters
+# are shared by the worker processes of a server instead, so a write handled by
+# one worker invalidates the others' entries for the tables it bumped. The
+# entries themselves stay in each process.
+#
+# Every cached response carries a strong ETag; a matching If-None-Match gets a 304.
+
+class ResponseCache:
+  def __init__(self, db, max_entries=256, watch_data_version=False, shared=None):
+    self.db = db
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.generations = {}
+    self.shared = shared
+    # Bumped by bump_all() when the counters are shared: invalidates this process only
+    self.epoch = 0
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.not_modified = 0
+    # Dedicated connection whose data_version changes when any other connection commits
+    self.watcher = None
+    self.data_version = None
+    if watch_data_version:
+      self.watcher = sqlite3.connect(db.database, check_same_thread=False)
+
+  def bump(self, *tables):
+    with self.lock:
+      if self.shared is not None:
+        self.shared.bump(tables)
+        return
+      for table in tables:
+        self.generations[table] = self.generations.get(table, 0) + 1
+
+  def bump_all(self):
+    with self.lock:
+      self.epoch += 1
+      for table in self.generations:
+        self.generations[table] += 1
+      self.entries.clear()
+
+  def sync(self):
+    # Invalidate everything when the database was changed by another connection
+    if self.watcher is None:
+      return
+    with self.lock:
+      data_version = self.watcher.execute('PRAGMA data_version').fetchone()[0]
+      changed = self.data_version is not None and data_version != self.data_version
+      self.data_version = data_version
+    if changed:
+      self.bump_all()
+
+  def register(self, tables):
+    # Tables listed by the metrics (their shared counters are only read when tagging)
+    with self.lock:
+      for table in tables:
+        self.generations.setdefault(table, 0)
+
+  def tag(self, tables):
+    if self.shared is not None:
+      return (self.epoch,) + tuple(self.shared.get(table) for table in tables)
+    with self.lock:
+      return tuple(self.generations.setdefault(table, 0) for table in tables)
+
+  def lookup(self, key, tag):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is None or entry[0] != tag:
+        self.misses += 1
+        return None
+      self.entries.move_to_end(key)
+      self.hits += 1
+      return entry
+
+  def store(self, key, entry):
+    if self.max_entries <= 0:
+      return
+    with self.lock:
+      self.entries[key] = entry
+      self.entries.move_to_end(key)
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+
+  def metrics(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self.entries),
+        "max_entries": self.max_entries,
+        "hits": self.hits,
+        "misses": self.misses,
+        "not_modified": self.not_modified,
+        "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        "generations": (
+          {table: self.shared.get(table) for table in self.generations} if self.shared is not None
+          else dict(self.generations)
+        ),
+        "shared": self.shared is not None
+      }
+
+  def respond(self, entry, cache_status):
+    _, body, status, mimetype, etag = entry
+    response = Response(body, status=status, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['X-Cache'] = cache_status
+    response.make_conditional(request)
+    if response.status_code == 304:
+      with self.lock:
+        self.not_modified += 1
+    return response
+
+  def cached(self, *tables):
+    # Decorator for GET views whose response depends only on `tables` and the URL
+    self.register(tables)
+    def decorator(view):
+      @functools.wraps(view)
+      def wrapper(*args, **kwargs):
+        self.sync()
+        key = request.full_path
+        tag = self.tag(tables)
+        entry = self.lookup(key, tag)
+        if entry is not None:
+          return self.respond(entry, 'HIT')
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code != 200 or response.is_streamed:
+          return response
+        body = response.get_data()
+        entry = (tag, body, response.status_code, response.mimetype, hashlib.sha1(body).hexdigest())
+        self.store(key, entry)
+        return self.respond(entry, 'MISS')
+      return wrapper
+    return decorator
+
+  def invalidates(self, *tables):
+    # Decorator for write views: bump the tables once the view has committed
+    self.register(tables)
+    def decorator(view):
+      @functools.wraps(view)
+      def wrapper(*args, **kwargs):
+        try:
+          return view(*args, **kwargs)
+        finally:
+          self.bump(*tables)
+      return wrapper
+    return decorator
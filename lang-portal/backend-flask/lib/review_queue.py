@@ -0,0 +1,186 @@
+import logging
+import queue
+import threading
+import time
+
+from lib import reviews
+
+# Write-behind queue for the review endpoints.
+#
+# Request threads validate their answers and submit() them; a single writer
+# thread drains the queue and commits up to `batch_size` submissions (or
+# whatever arrived within `flush_interval_ms`) in one transaction. With one
+# writer there is no lock contention between concurrent study activities.
+#
+# ack='commit' makes the request wait until its batch is committed;
+# ack='enqueue' answers as soon as the review is queued (faster, but queued
+# reviews are lost if the process dies before the next flush).
+#
+# The queue holds at most `max_depth` submissions; submit() raises QueueFull
+# beyond that, so clients are told to retry instead of reviews piling up in
+# memory. on_commit, if given, is called by the writer after every flush; a
+# failure there is logged and never stops the writer.
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+  pass
+
+class Ticket:
+  # Handed back by submit(); wait() blocks until the writer committed it
+  def __init__(self, session_id, items):
+    self.session_id = session_id
+    self.items = items
+    self.error = None
+    self.done = threading.Event()
+
+  def wait(self, timeout=None):
+    if not self.done.wait(timeout):
+      raise TimeoutError('Review was not committed in time')
+    if self.error is not None:
+      raise self.error
+
+class ReviewQueue:
+  def __init__(self, db, batch_size=500, flush_interval_ms=20, ack='commit', on_commit=None, max_depth=10000):
+    if ack not in ('commit', 'enqueue'):
+      raise ValueError("ack must be 'commit' or 'enqueue'")
+    self.db = db
+    self.batch_size = batch_size
+    self.flush_interval = flush_interval_ms / 1000.0
+    self.ack = ack
+    self.on_commit = on_commit
+    self.max_depth = max_depth
+    self.queue = queue.Queue(maxsize=max_depth)
+    self.lock = threading.Lock()
+    self.stats = {
+      "enqueued": 0,
+      "committed": 0,
+      "failed": 0,
+      "rejected": 0,
+      "batches": 0,
+      "last_flush_ms": 0.0,
+      "max_flush_ms": 0.0,
+      "total_flush_ms": 0.0
+    }
+    self.thread = None
+
+  def start(self):
+    self.thread = threading.Thread(target=self.run, name='review-writer', daemon=True)
+    self.thread.start()
+    return self
+
+  def submit(self, session_id, items):
+    ticket = Ticket(session_id, items)
+    try:
+      self.queue.put_nowait(ticket)
+    except queue.Full:
+      with self.lock:
+        self.stats["rejected"] += len(items)
+      raise QueueFull(f"Review queue is full ({self.max_depth} submissions waiting), retry later")
+    with self.lock:
+      self.stats["enqueued"] += len(items)
+    return ticket
+
+  def close(self, timeout=5):
+    # Flush everything already queued, then stop the writer
+    if self.thread is not None:
+      self.queue.put(None)
+      self.thread.join(timeout)
+      self.thread = None
+
+  def metrics(self):
+    with self.lock:
+      stats = dict(self.stats)
+    stats["depth"] = self.queue.qsize()
+    stats["avg_flush_ms"] = round(stats["total_flush_ms"] / stats["batches"], 3) if stats["batches"] else 0.0
+    del stats["total_flush_ms"]
+    return stats
+
+  def next_batch(self):
+    # Block for the first ticket, then gather more until the batch is full or the interval ends
+    first = self.queue.get()
+    if first is None:
+      return None, True
+    batch = [first]
+    deadline = time.monotonic() + self.flush_interval
+    while len(batch) < self.batch_size:
+      remaining = deadline - time.monotonic()
+      if remaining <= 0:
+        break
+      try:
+        ticket = self.queue.get(timeout=remaining)
+      except queue.Empty:
+        break
+      if ticket is None:
+        return batch, True
+      batch.append(ticket)
+    return batch, False
+
+  def run(self):
+    connection = self.db.connect()
+    try:
+      stopping = False
+      while not stopping:
+        batch, stopping = self.next_batch()
+        if batch:
+          self.flush(connection, batch)
+      # Drain anything submitted after the stop request
+      while True:
+        try:
+          ticket = self.queue.get_nowait()
+        except queue.Empty:
+          break
+        if ticket is not None:
+          self.flush(connection, [ticket])
+    finally:
+      connection.close()
+
+  def flush(self, connection, batch):
+    # Every ticket is released and the writer keeps running, whatever happens while writing
+    try:
+      self.write(connection, batch)
+    except Exception as e:
+      logger.exception('Review queue flush failed')
+      for ticket in batch:
+        if ticket.error is None:
+          ticket.error = e
+    finally:
+      for ticket in batch:
+        ticket.done.set()
+
+  def write(self, connection, batch):
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+      for ticket in batch:
+        reviews.log_reviews(cursor, ticket.session_id, ticket.items)
+      connection.commit()
+      failed = []
+    except Exception:
+      # Retry one submission per transaction so a bad one cannot sink the others
+      connection.rollback()
+      failed = []
+      for ticket in batch:
+        try:
+          reviews.log_reviews(cursor, ticket.session_id, ticket.items)
+          connection.commit()
+        except Exception as e:
+          connection.rollback()
+          ticket.error = e
+          failed.append(ticket)
+    elapsed = (time.perf_counter() - start) * 1000
+
+    with self.lock:
+      committed = sum(len(ticket.items) for ticket in batch if ticket.error is None)
+      self.stats["committed"] += committed
+      self.stats["failed"] += sum(len(ticket.items) for ticket in failed)
+      self.stats["batches"] += 1
+      self.stats["last_flush_ms"] = round(elapsed, 3)
+      self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], round(elapsed, 3))
+      self.stats["total_flush_ms"] += elapsed
+
+    if self.on_commit is not None:
+      try:
+        self.on_commit()
+      except Exception:
+        logger.exception('Review queue on_commit failed')
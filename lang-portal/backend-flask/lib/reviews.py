@@ -0,0 +1,60 @@
+import json
+
+from lib import learning_stats, scheduler
+
+# Writes for logged review answers, shared by the single and batch review endpoints.
+
+# Tables written when reviews are logged (for response cache invalidation)
+TABLES = ('word_review_items', 'word_reviews', 'word_stats', 'activity_days', 'learning_stats', 'study_sessions',
+          'word_schedule')
+
+# Largest number of answers accepted by one POST /study_sessions/<id>/reviews:batch
+MAX_BATCH_SIZE = 10000
+
+def existing_word_ids(cursor, word_ids):
+  # One query for the whole set, however large, by passing the ids as a JSON array
+  cursor.execute('''
+    SELECT id FROM words WHERE id IN (SELECT value FROM json_each(?))
+  ''', (json.dumps(list(word_ids)),))
+  return {row[0] for row in cursor.fetchall()}
+
+def log_reviews(cursor, session_id, reviews):
+  # reviews: list of (word_id, correct) for an existing session and existing words.
+  # Runs inside the caller's transaction; the caller commits.
+  created_at = learning_stats.timestamp()
+  items = [(word_id, bool(correct), created_at) for word_id, correct in reviews]
+
+  # Insert the individual review attempts into word_review_items
+  cursor.executemany('''
+    INSERT INTO word_review_items (word_id, correct, study_session_id, created_at) VALUES (?, ?, ?, ?)
+  ''', [(word_id, correct, session_id, created_at) for word_id, correct, created_at in items])
+
+  # Fold the answers into one aggregate word_reviews upsert per word
+  per_word = {}
+  for word_id, correct, _ in items:
+    counts = per_word.setdefault(word_id, [0, 0])
+    counts[0 if correct else 1] += 1
+
+  cursor.executemany('''
+    INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(word_id) DO UPDATE SET
+      correct_count = correct_count + excluded.correct_count,
+      wrong_count = wrong_count + excluded.wrong_count,
+      last_reviewed = excluded.last_reviewed
+  ''', [(word_id, correct, wrong, created_at) for word_id, (correct, wrong) in per_word.items()])
+
+  # Advance the session's review counts and end time
+  cursor.execute('''
+    UPDATE study_sessions
+    SET review_count = review_count + ?,
+        correct_count = correct_count + ?,
+        ended_at = MAX(COALESCE(ended_at, ''), ?)
+    WHERE id = ?
+  ''', (len(items), sum(1 for _, correct, _ in items if correct), created_at, session_id))
+
+  # Update the dashboard counters in the same transaction
+  learning_stats.record_reviews(cursor, items)
+
+  # And advance the spaced-repetition schedule of the reviewed words
+  scheduler.record_reviews(cursor, items)
@@ -0,0 +1,87 @@
+import heapq
+import json
+import random
+
+# Random samples of a group's words for GET /groups/<id>/sample.
+#
+# word_groups.position numbers each group's members 0 .. words_count - 1
+# (triggers keep it dense, migration 0014), so a uniform draw is a random
+# position looked up on idx_word_groups_group_position. Positions are drawn
+# PROBE_BATCH at a time and resolved in one query; the cost grows with n, not
+# with the group.
+#
+# A weighted sample favours the words answered wrong most often: a drawn word
+# is kept with probability weight(), its smoothed error rate, and otherwise put
+# back (rejection sampling, which draws in proportion to the weights). Mastered
+# words can be left out. If too many draws are rejected (e.g. a group that is
+# nearly all mastered), the rest of the sample is drawn from a walk over the
+# group's eligible members instead, which still doesn't sort it.
+#
+# The same seed over the same group gives the same sample.
+
+# Largest n accepted by /groups/<id>/sample
+MAX_SAMPLE = 100
+
+# Draws per query, and draws per requested word before falling back to the walk
+PROBE_BATCH = 64
+MAX_PROBES_PER_WORD = 20
+
+MAX_SEED = 2 ** 32
+
+PROBE_SQL = '''
+  SELECT wg.position, wg.word_id, COALESCE(s.attempts, 0), COALESCE(s.correct, 0), COALESCE(s.mastered, 0)
+  FROM json_each(?) p
+  JOIN word_groups wg ON wg.group_id = ? AND wg.position = p.value
+  LEFT JOIN word_stats s ON s.word_id = wg.word_id
+  ORDER BY p.key
+'''
+
+MEMBERS_SQL = '''
+  SELECT wg.position, wg.word_id, COALESCE(s.attempts, 0), COALESCE(s.correct, 0)
+  FROM word_groups wg
+  LEFT JOIN word_stats s ON s.word_id = wg.word_id
+  WHERE wg.group_id = ? AND (? = 0 OR COALESCE(s.mastered, 0) = 0)
+  ORDER BY wg.position
+'''
+
+def weight(attempts, correct):
+  # Error rate with one wrong and one correct answer added, in (0, 1); 0.5 for a new word
+  return (attempts - correct + 1) / (attempts + 2)
+
+def sample(cursor, group_id, size, n, seed, weighted=False, exclude_mastered=False):
+  # Word ids of up to n distinct members of a group of `size` words, in the order drawn
+  rng = random.Random(seed)
+  n = min(n, size)
+  chosen = []
+  taken = set()  # Positions drawn for good: chosen, or mastered ones left out
+  probes, max_probes = 0, n * MAX_PROBES_PER_WORD
+  while len(chosen) < n and probes < max_probes:
+    positions = []
+    while len(positions) < PROBE_BATCH and probes < max_probes:
+      probes += 1
+      position = rng.randrange(size)
+      if position not in taken:
+        positions.append(position)
+    cursor.execute(PROBE_SQL, (json.dumps(positions), group_id))
+    for position, word_id, attempts, correct, mastered in cursor.fetchall():
+      if len(chosen) == n or position in taken:
+        continue
+      if exclude_mastered and mastered:
+        taken.add(position)
+      elif not weighted or rng.random() < weight(attempts, correct):
+        taken.add(position)
+        chosen.append(word_id)
+
+  if len(chosen) < n:
+    chosen += fill(cursor, group_id, n - len(chosen), taken, rng, weighted, exclude_mastered)
+  return chosen
+
+def fill(cursor, group_id, k, taken, rng, weighted, exclude_mastered):
+  # The rest of the sample from one walk over the eligible members not taken yet
+  cursor.execute(MEMBERS_SQL, (group_id, 1 if exclude_mastered else 0))
+  members = [row for row in cursor.fetchall() if row[0] not in taken]
+  if not weighted:
+    return [row[1] for row in rng.sample(members, min(k, len(members)))]
+  # Weighted sampling without replacement: the k largest of random() ** (1 / weight)
+  keyed = ((rng.random() ** (1 / weight(row[2], row[3])), row[1]) for row in members)
+  return [word_id for _, word_id in heapq.nlargest(k, keyed)]
@@ -0,0 +1,148 @@
+import heapq
+from datetime import datetime, timedelta
+
+from lib import learning_stats
+
+# Spaced-repetition scheduling (SM-2).
+#
+# word_schedule holds each reviewed word's interval, ease, run of correct
+# answers and next due time. record_reviews() advances it in the transaction
+# that logs the answers, and the word_schedule triggers copy due_at onto the
+# word's word_groups rows, where idx_word_groups_group_due lets
+# GET /groups/<id>/next-words read a group's most overdue words straight off the
+# index. Answers are applied in the order they were logged; the state does not
+# depend on how late a word was reviewed, only the due time does.
+
+# SM-2 quality (0-5) of a correct and of a wrong answer
+CORRECT_QUALITY = 4
+WRONG_QUALITY = 2
+
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+
+# Intervals (days) after the first and second correct answer in a row; later
+# ones multiply the previous interval by the ease
+FIRST_INTERVALS = (1, 6)
+
+# Interval after a wrong answer
+RELEARN_INTERVAL = 1
+
+# Longest interval (days), so long runs of correct answers stay within datetime's range
+MAX_INTERVAL = 36500
+
+BATCH_SIZE = 50000
+
+def ease_delta(quality):
+  return round(0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02), 2)
+
+EASE_DELTAS = {True: ease_delta(CORRECT_QUALITY), False: ease_delta(WRONG_QUALITY)}
+
+def answer(state, correct):
+  # state: (interval_days, ease, repetitions, lapses), None for a word never reviewed
+  interval, ease, repetitions, lapses = state or (0, INITIAL_EASE, 0, 0)
+  ease = max(MIN_EASE, round(ease + EASE_DELTAS[bool(correct)], 2))
+  if not correct:
+    return (RELEARN_INTERVAL, ease, 0, lapses + (1 if repetitions else 0))
+  if repetitions < len(FIRST_INTERVALS):
+    interval = FIRST_INTERVALS[repetitions]
+  else:
+    interval = min(round(interval * ease), MAX_INTERVAL)
+  return (interval, ease, repetitions + 1, lapses)
+
+def due_at(reviewed_at, interval):
+  # word_review_items.created_at plus `interval` days, in the same format
+  reviewed = datetime.fromisoformat(str(reviewed_at))
+  return (reviewed + timedelta(days=interval)).strftime('%Y-%m-%d %H:%M:%S')
+
+def schedule_row(word_id, state, reviewed_at):
+  interval, ease, repetitions, lapses = state
+  return (word_id, due_at(reviewed_at, interval), interval, ease, repetitions, lapses, str(reviewed_at))
+
+UPSERT = '''
+  INSERT INTO word_schedule (word_id, due_at, interval_days, ease, repetitions, lapses, reviewed_at)
+  VALUES (?, ?, ?, ?, ?, ?, ?)
+  ON CONFLICT(word_id) DO UPDATE SET
+    due_at = excluded.due_at,
+    interval_days = excluded.interval_days,
+    ease = excluded.ease,
+    repetitions = excluded.repetitions,
+    lapses = excluded.lapses,
+    reviewed_at = excluded.reviewed_at
+'''
+
+def record_reviews(cursor, reviews):
+  # reviews: iterable of (word_id, correct, created_at) that were just inserted, oldest first
+  per_word = {}
+  for word_id, correct, created_at in reviews:
+    per_word.setdefault(word_id, []).append((correct, created_at))
+
+  if not per_word:
+    return
+
+  states = {}
+  for word_ids in learning_stats.chunks(list(per_word)):
+    cursor.execute(f'''
+      SELECT word_id, interval_days, ease, repetitions, lapses
+      FROM word_schedule
+      WHERE word_id IN ({','.join('?' * len(word_ids))})
+    ''', word_ids)
+    for row in cursor.fetchall():
+      states[row[0]] = tuple(row[1:])
+
+  rows = []
+  for word_id, answers in per_word.items():
+    state = states.get(word_id)
+    for correct, _ in answers:
+      state = answer(state, correct)
+    rows.append(schedule_row(word_id, state, answers[-1][1]))
+  cursor.executemany(UPSERT, rows)
+
+def reset(cursor):
+  # Called when the study history is cleared; the triggers clear word_groups.due_at
+  cursor.execute('DELETE FROM word_schedule')
+
+def rolled_up(connection):
+  # (word_id, correct, reviewed_at) of the days compacted into daily_word_stats.
+  # The order of the answers within a day is not kept: wrong ones come first,
+  # dated at the start of the day.
+  days = connection.execute('''
+    SELECT word_id, day, SUM(correct_count), SUM(wrong_count)
+    FROM daily_word_stats
+    GROUP BY word_id, day
+    ORDER BY word_id, day
+  ''')
+  for word_id, day, correct, wrong in days:
+    reviewed_at = f'{day} 00:00:00'
+    for _ in range(wrong):
+      yield word_id, False, reviewed_at
+    for _ in range(correct):
+      yield word_id, True, reviewed_at
+
+def history(connection):
+  # Every answer by word, oldest first: the compacted days, then the raw reviews
+  # in the order they were logged
+  raw = connection.execute('SELECT word_id, correct, created_at FROM word_review_items ORDER BY word_id, id')
+  return heapq.merge(rolled_up(connection), raw, key=lambda review: review[0])
+
+def rebuild(connection):
+  # Backfill (or repair) word_schedule by replaying the review history
+  cursor = connection.cursor()
+  reset(cursor)
+  reviews = history(connection)
+  rows = []
+  word_id, state, reviewed_at = None, None, None
+  for review_word_id, correct, created_at in reviews:
+    if review_word_id != word_id:
+      if word_id is not None:
+        rows.append(schedule_row(word_id, state, reviewed_at))
+      word_id, state = review_word_id, None
+    state = answer(state, correct)
+    reviewed_at = created_at
+    if len(rows) >= BATCH_SIZE:
+      cursor.executemany(UPSERT, rows)
+      rows = []
+  if word_id is not None:
+    rows.append(schedule_row(word_id, state, reviewed_at))
+  cursor.executemany(UPSERT, rows)
+  connection.commit()
+  return cursor.execute('SELECT COUNT(*) FROM word_schedule').fetchone()[0]
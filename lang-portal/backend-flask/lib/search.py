@@ -0,0 +1,87 @@
+from lib import pagination
+
+# Word search for GET /words/search, backed by the words_fts trigram index.
+#
+# The query is split on whitespace and every term must match (as a substring of
+# kanji, romaji or english). Terms of 3+ characters go to the FTS index and the
+# results are ranked by bm25; shorter terms cannot be looked up by trigram and
+# are checked against the matched rows instead. A query made only of short terms
+# (e.g. a single kanji) falls back to a prefix match through the words sort
+# indexes, exact matches first.
+
+MIN_TRIGRAM_LENGTH = 3
+
+# bm25 column weights for kanji, romaji and english
+WEIGHTS = (10.0, 5.0, 1.0)
+
+SORT_BY = 'relevance'
+ORDER = 'asc'
+
+SELECT_WORD = '''
+  SELECT w.id, w.kanji, w.romaji, w.english, w.correct_count, w.wrong_count, m.score
+'''
+
+def terms(query):
+  return [term for term in query.split() if term]
+
+def match_expression(long_terms):
+  # Every term as a quoted phrase, so FTS5 operators in user input are taken literally
+  return ' AND '.join('"' + term.replace('"', '""') + '"' for term in long_terms)
+
+def contains_terms(short_terms):
+  # Substring filter for terms too short for the trigram index
+  conditions, params = [], []
+  for term in short_terms:
+    conditions.append('(instr(w.kanji, ?) OR instr(lower(w.romaji), ?) OR instr(lower(w.english), ?))')
+    params += [term, term.lower(), term.lower()]
+  return conditions, params
+
+def search_words(cursor, query, limit, after=None):
+  # Returns up to `limit` rows ordered by (score, id); `after` is a decoded (score, id)
+  query_terms = terms(query)
+  long_terms = [term for term in query_terms if len(term) >= MIN_TRIGRAM_LENGTH]
+  short_terms = [term for term in query_terms if len(term) < MIN_TRIGRAM_LENGTH]
+  conditions, params = contains_terms(short_terms)
+
+  if long_terms:
+    # Materialized so bm25() is evaluated inside the full-text query
+    matches = f'''
+      WITH m AS MATERIALIZED (
+        SELECT rowid AS id, bm25(words_fts, {', '.join(map(str, WEIGHTS))}) AS score
+        FROM words_fts
+        WHERE words_fts MATCH ?
+      )
+    '''
+    match_params = [match_expression(long_terms)]
+  else:
+    # Prefix ranges on the kanji/romaji/english indexes (covering, so no row
+    # lookups), exact matches ranked first
+    term = short_terms[0]
+    matches = '''
+      WITH m AS MATERIALIZED (
+        SELECT id, MIN(inexact) AS score FROM (
+          SELECT id, kanji <> ? AS inexact FROM words WHERE kanji >= ? AND kanji < ? || char(1114111)
+          UNION ALL
+          SELECT id, romaji <> ? FROM words WHERE romaji >= ? AND romaji < ? || char(1114111)
+          UNION ALL
+          SELECT id, english <> ? FROM words WHERE english >= ? AND english < ? || char(1114111)
+        )
+        GROUP BY id
+      )
+    '''
+    match_params = [term] * 9
+    conditions, params = conditions[1:], params[3:]
+
+  if after is not None:
+    conditions.append(pagination.seek('m.score', 'm.id', ORDER))
+    params += list(after)
+  where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+  cursor.execute(matches + SELECT_WORD + f'''
+    FROM m
+    JOIN words w ON w.id = m.id
+    {where}
+    ORDER BY m.score, m.id
+    LIMIT ?
+  ''', match_params + params + [limit])
+  return cursor.fetchall()
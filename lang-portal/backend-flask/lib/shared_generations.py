@@ -0,0 +1,49 @@
+import fcntl
+import mmap
+import os
+import struct
+import zlib
+
+# Table generation counters shared by the worker processes of one server.
+#
+# The response cache (lib/response_cache.py) tags its entries, and the hot-word
+# cache its words, with a counter per table that write routes bump. In a single
+# process those counters are a dict. With CACHE_GENERATIONS='shared' they live
+# in a small file next to the database that every worker maps into memory, so a
+# write handled by one worker makes the other workers' entries for that table
+# stale on their next lookup. Reading a counter is a memory read; bumps take an
+# flock on the file so that concurrent bumps from two workers are not lost.
+#
+# Tables are hashed onto SLOTS counters. Two tables that share a slot only
+# invalidate each other's entries more often than needed.
+
+SLOTS = 512
+COUNTER = struct.Struct('<Q')
+
+class SharedGenerations:
+  def __init__(self, path):
+    self.path = path
+    self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    size = SLOTS * COUNTER.size
+    # Only ever grown, and to the same size by every worker, so counters are never reset
+    if os.fstat(self.fd).st_size < size:
+      os.ftruncate(self.fd, size)
+    self.map = mmap.mmap(self.fd, size)
+
+  def offset(self, table):
+    return zlib.crc32(table.encode('utf-8')) % SLOTS * COUNTER.size
+
+  def get(self, table):
+    return COUNTER.unpack_from(self.map, self.offset(table))[0]
+
+  def bump(self, tables):
+    fcntl.flock(self.fd, fcntl.LOCK_EX)
+    try:
+      for offset in {self.offset(table) for table in tables}:
+        COUNTER.pack_into(self.map, offset, COUNTER.unpack_from(self.map, offset)[0] + 1)
+    finally:
+      fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+  def close(self):
+    self.map.close()
+    os.close(self.fd)
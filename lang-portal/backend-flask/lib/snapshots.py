@@ -0,0 +1,317 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+  import pandas as pd
+  import pyarrow as pa
+  import pyarrow.ipc
+except ImportError:  # Optional: without them no snapshot is taken and /analytics answers 503
+  pa = None
+  pd = None
+
+# Columnar snapshots of the learning data, and the analytics views computed from them.
+#
+# take() copies word_review_items, study_sessions and words into Arrow IPC
+# files under the snapshot directory, one subdirectory per table, in one read
+# transaction. Reviews and sessions are only ever appended to, so each snapshot
+# writes the rows after the last id the previous one saw (its watermark) as new
+# part files of about PART_ROWS rows. Of the sessions only the columns that
+# never change are kept (group, activity, start). Words are edited in place and
+# are rewritten whole. Reviews compacted away (lib/compaction.py) after they
+# were snapshotted stay in the snapshot; take one before compacting. Clearing
+# the study history drops them all: the next snapshot copies reviews and
+# sessions again from scratch.
+#
+# The views (accuracy per group and day, retention per activity) are then
+# computed with pandas over the parts, read memory-mapped, and written to
+# views.json. The /analytics routes serve that file, reloaded only when a new
+# snapshot replaces it, so no request aggregates the review history.
+# manifest.json is replaced last: a snapshot that fails half-way leaves the
+# previous one in place, and its stray part files are removed by the next one.
+# A lock file keeps two processes (server workers, `invoke snapshot`) from
+# taking snapshots into the same directory at once.
+
+PART_ROWS = 1000000
+FETCH_SIZE = 65536
+
+# Columns and their Arrow types: 'timestamp' is seconds since the epoch (UTC)
+TABLES = {
+  'word_review_items': {
+    "sql": '''
+      SELECT id, word_id, study_session_id, CASE WHEN correct THEN 1 ELSE 0 END,
+             CAST(strftime('%s', created_at) AS INTEGER)
+      FROM word_review_items
+      WHERE id > ?
+      ORDER BY id
+    ''',
+    "columns": [('id', 'int64'), ('word_id', 'int64'), ('study_session_id', 'int64'),
+                ('correct', 'int8'), ('created_at', 'timestamp')],
+    "append": True
+  },
+  'study_sessions': {
+    "sql": '''
+      SELECT id, group_id, study_activity_id, CAST(strftime('%s', created_at) AS INTEGER)
+      FROM study_sessions
+      WHERE id > ?
+      ORDER BY id
+    ''',
+    "columns": [('id', 'int64'), ('group_id', 'int64'), ('study_activity_id', 'int64'),
+                ('created_at', 'timestamp')],
+    "append": True
+  },
+  'words': {
+    "sql": 'SELECT id, kanji, romaji, english FROM words WHERE id > ? ORDER BY id',
+    "columns": [('id', 'int64'), ('kanji', 'string'), ('romaji', 'string'), ('english', 'string')],
+    "append": False
+  }
+}
+
+# Retention buckets: days since the word's previous review, [start, end)
+RETENTION_BINS = [0, 1, 2, 4, 8, 15, 31, 61, float('inf')]
+RETENTION_LABELS = ['<1', '1', '2-3', '4-7', '8-14', '15-30', '31-60', '61+']
+
+class Unavailable(Exception):
+  pass
+
+class Busy(Exception):
+  pass
+
+def available():
+  return pa is not None and pd is not None
+
+def schema(table):
+  return pa.schema([
+    (name, pa.timestamp('s') if kind == 'timestamp' else getattr(pa, kind)())
+    for name, kind in TABLES[table]["columns"]
+  ])
+
+def read_json(path, default=None):
+  try:
+    with open(path, encoding='utf-8') as f:
+      return json.load(f)
+  except FileNotFoundError:
+    return default
+
+def write_json(path, data):
+  # Written next to the target and renamed over it, so readers see the old or the new file
+  with open(path + '.tmp', 'w', encoding='utf-8') as f:
+    json.dump(data, f)
+  os.replace(path + '.tmp', path)
+
+def manifest(directory):
+  return read_json(os.path.join(directory, 'manifest.json'), {"version": 0, "tables": {}})
+
+def write_parts(connection, directory, table, since_id, name=None):
+  # Rows after since_id as part files of about PART_ROWS rows; returns (parts, rows, last id)
+  target = schema(table)
+  cursor = connection.cursor()
+  cursor.row_factory = None
+  cursor.execute(TABLES[table]["sql"], (since_id,))
+  os.makedirs(os.path.join(directory, table), exist_ok=True)
+  parts, rows, last_id = [], 0, since_id
+  writer, part_rows = None, 0
+  try:
+    while True:
+      batch = cursor.fetchmany(FETCH_SIZE)
+      if not batch:
+        break
+      if writer is None or part_rows >= PART_ROWS:
+        if writer is not None:
+          writer.close()
+        # Named after its first id (or the snapshot, when rewritten whole)
+        part = os.path.join(table, f'{name or batch[0][0]:012d}.arrow')
+        writer = pa.ipc.new_file(os.path.join(directory, part), target)
+        parts.append(part)
+        part_rows = 0
+      columns = list(zip(*batch))
+      writer.write_batch(pa.record_batch(
+        [pa.array(values, type=field.type) for values, field in zip(columns, target)], schema=target
+      ))
+      part_rows += len(batch)
+      rows += len(batch)
+      last_id = batch[-1][0]
+  finally:
+    if writer is not None:
+      writer.close()
+    cursor.close()
+  return parts, rows, last_id
+
+def remove_strays(directory, current):
+  # Part files no snapshot refers to: left by a failed snapshot, or replaced
+  keep = {part for entry in current["tables"].values() for part in entry["parts"]}
+  for table in TABLES:
+    folder = os.path.join(directory, table)
+    if not os.path.isdir(folder):
+      continue
+    for filename in os.listdir(folder):
+      if os.path.join(table, filename) not in keep:
+        os.remove(os.path.join(folder, filename))
+
+def take(connection, directory):
+  # Append the new rows, rewrite the words, recompute the views; returns the new manifest
+  if not available():
+    raise Unavailable("Snapshots need pyarrow and pandas (pip install pyarrow pandas)")
+  os.makedirs(directory, exist_ok=True)
+  with open(os.path.join(directory, 'snapshot.lock'), 'w') as lock:
+    try:
+      fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+      raise Busy("A snapshot is already being taken")
+    return take_locked(connection, directory)
+
+def take_locked(connection, directory):
+  previous = manifest(directory)
+  remove_strays(directory, previous)
+  version = previous["version"] + 1
+  tables = {}
+  started = time.perf_counter()
+  connection.execute('BEGIN')
+  try:
+    # Sessions are only deleted when the study history is cleared
+    # (/api/study-sessions/reset), which doesn't lower sqlite_sequence: when some
+    # of the snapshotted ones are gone, the reviews and sessions start over
+    sessions = previous["tables"].get('study_sessions')
+    cleared = sessions is not None and connection.execute(
+      'SELECT COUNT(*) FROM study_sessions WHERE id <= ?', (sessions["watermark"],)
+    ).fetchone()[0] < sessions["rows"]
+    for table, spec in TABLES.items():
+      entry = previous["tables"].get(table, {"watermark": 0, "rows": 0, "parts": []})
+      # The highest id ever handed out (AUTOINCREMENT), which compaction doesn't lower
+      (last_id,) = connection.execute(
+        'SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)', (table,)
+      ).fetchone()
+      if not spec["append"] or cleared or last_id < entry["watermark"]:
+        # Rewritten whole: the words, a cleared history, or a table recreated since the last snapshot
+        entry = {"watermark": 0, "rows": 0, "parts": []}
+      name = None if spec["append"] else version
+      parts, rows, last_id = write_parts(connection, directory, table, entry["watermark"], name)
+      tables[table] = {
+        "watermark": last_id,
+        "rows": entry["rows"] + rows,
+        "added": rows,
+        "parts": entry["parts"] + parts
+      }
+  finally:
+    connection.rollback()
+  copied_ms = (time.perf_counter() - started) * 1000
+
+  current = {
+    "version": version,
+    "taken_at": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+    "tables": tables
+  }
+  started = time.perf_counter()
+  write_json(os.path.join(directory, 'views.json'), dict(compute_views(directory, current), version=version,
+                                                        taken_at=current["taken_at"]))
+  current["timings_ms"] = {"copy": round(copied_ms, 1), "views": round((time.perf_counter() - started) * 1000, 1)}
+  write_json(os.path.join(directory, 'manifest.json'), current)
+  remove_strays(directory, current)
+  return current
+
+def read_table(directory, current, table, columns=None):
+  # The table's parts, memory-mapped rather than read into memory, as one Arrow table
+  parts = [
+    pa.ipc.open_file(pa.memory_map(os.path.join(directory, part))).read_all()
+    for part in current["tables"].get(table, {"parts": []})["parts"]
+  ]
+  data = pa.concat_tables(parts) if parts else schema(table).empty_table()
+  return data.select(columns) if columns else data
+
+def compute_views(directory, current):
+  reviews = read_table(directory, current, 'word_review_items',
+                       ['word_id', 'study_session_id', 'correct', 'created_at']).to_pandas()
+  sessions = read_table(directory, current, 'study_sessions', ['id', 'group_id', 'study_activity_id']).to_pandas()
+  reviews = reviews.merge(sessions.rename(columns={'id': 'study_session_id'}), on='study_session_id')
+  return {
+    "group_accuracy": group_accuracy(reviews),
+    "activity_retention": activity_retention(reviews)
+  }
+
+def group_accuracy(reviews):
+  # Reviews, correct answers and accuracy per group and UTC day
+  reviews = reviews.dropna(subset=['created_at'])
+  daily = reviews.groupby(['group_id', reviews['created_at'].dt.floor('D')]).agg(
+    reviews=('correct', 'size'), correct=('correct', 'sum')
+  ).reset_index()
+  groups = []
+  for group_id, days in daily.groupby('group_id', sort=True):
+    groups.append({"group_id": int(group_id), "days": [{
+      "day": day.strftime('%Y-%m-%d'),
+      "reviews": int(count),
+      "correct": int(correct),
+      "accuracy": round(correct / count, 4)
+    } for day, count, correct in zip(days['created_at'], days['reviews'], days['correct'])]})
+  return groups
+
+def activity_retention(reviews):
+  # Accuracy per activity by the days since the word was last reviewed (in any
+  # activity): the activity's forgetting curve. First reviews of a word are left out.
+  reviews = reviews.dropna(subset=['created_at']).sort_values(['word_id', 'created_at'], kind='stable')
+  gap = reviews['created_at'] - reviews.groupby('word_id')['created_at'].shift()
+  days = gap.dt.total_seconds() / 86400
+  reviews = reviews.assign(bucket=pd.cut(days, RETENTION_BINS, right=False, labels=RETENTION_LABELS))
+  curves = reviews.dropna(subset=['bucket']).groupby(['study_activity_id', 'bucket'], observed=True).agg(
+    reviews=('correct', 'size'), correct=('correct', 'sum')
+  ).reset_index()
+  activities = []
+  for activity_id, buckets in curves.groupby('study_activity_id', sort=True):
+    activities.append({"study_activity_id": int(activity_id), "curve": [{
+      "days_since_review": str(bucket),
+      "reviews": int(count),
+      "correct": int(correct),
+      "retention": round(correct / count, 4)
+    } for bucket, count, correct in zip(buckets['bucket'], buckets['reviews'], buckets['correct'])]})
+  return activities
+
+class Snapshots:
+  # The app's snapshot directory: a background job to take snapshots and the views of the latest one
+  def __init__(self, db, directory):
+    self.db = db
+    self.directory = directory
+    self.lock = threading.Lock()
+    self.thread = None
+    self.last_error = None
+    self.loaded = (None, None)  # (views.json stat, views)
+
+  def start(self):
+    # Take a snapshot on a thread of its own; False if one is already running
+    if not available():
+      raise Unavailable("Snapshots need pyarrow and pandas (pip install pyarrow pandas)")
+    with self.lock:
+      if self.running():
+        return False
+      self.thread = threading.Thread(target=self.run, name='snapshot', daemon=True)
+      self.thread.start()
+    return True
+
+  def run(self):
+    connection = self.db.connect()
+    try:
+      take(connection, self.directory)
+      self.last_error = None
+    except Exception as e:
+      self.last_error = str(e)
+    finally:
+      connection.close()
+
+  def running(self):
+    return self.thread is not None and self.thread.is_alive()
+
+  def status(self):
+    return dict(manifest(self.directory), running=self.running(), error=self.last_error)
+
+  def views(self):
+    # The latest views, read again only when a snapshot (of any process) replaced the file
+    path = os.path.join(self.directory, 'views.json')
+    try:
+      stat = os.stat(path)
+    except FileNotFoundError:
+      return None
+    key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if self.loaded[0] != key:
+      self.loaded = (key, read_json(path))
+    return self.loaded[1]
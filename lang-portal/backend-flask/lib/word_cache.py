@@ -0,0 +1,56 @@
+import threading
+from collections import OrderedDict
+
+# Process-local LRU of the hottest GET /words/<id> lookups.
+#
+# Entries hold a word's JSON text, as built by SQLite, keyed by word id and
+# tagged with the generation counters of the tables it reads (the response
+# cache's, see lib/response_cache.py). A write route that bumps any of them
+# makes every entry stale; the next lookup of the word reloads it. The cache
+# sits below the response cache, so it keeps serving words whose responses were
+# evicted by other routes, and it is bounded on its own.
+
+TABLES = ('words', 'word_reviews', 'word_groups', 'groups')
+
+class WordCache:
+  def __init__(self, generations, max_entries=1024):
+    self.generations = generations
+    self.max_entries = max_entries
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, word_id, load):
+    # The word's JSON text, from the cache or from load(word_id) (None when missing)
+    self.generations.sync()
+    tag = self.generations.tag(TABLES)
+    with self.lock:
+      entry = self.entries.get(word_id)
+      if entry is not None and entry[0] == tag:
+        self.entries.move_to_end(word_id)
+        self.hits += 1
+        return entry[1]
+      self.misses += 1
+
+    # Tagged with the generations read before loading, so a write that lands
+    # meanwhile leaves the entry stale rather than wrongly current
+    text = load(word_id)
+    if text is not None and self.max_entries > 0:
+      with self.lock:
+        self.entries[word_id] = (tag, text)
+        self.entries.move_to_end(word_id)
+        while len(self.entries) > self.max_entries:
+          self.entries.popitem(last=False)
+    return text
+
+  def metrics(self):
+    with self.lock:
+      lookups = self.hits + self.misses
+      return {
+        "entries": len(self.entries),
+        "max_entries": self.max_entries,
+        "hits": self.hits,
+        "misses": self.misses,
+        "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+      }
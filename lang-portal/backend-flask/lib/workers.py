@@ -0,0 +1,55 @@
+import multiprocessing
+import signal
+import socket
+
+# Multi-process serving (`invoke serve`).
+#
+# Each worker is a uvicorn server running asgi:app in a process of its own,
+# with its own app, connection pool and caches. Every worker listens on the
+# same port with SO_REUSEPORT and the kernel spreads connections across them.
+# The sockets are created with IPPROTO_TCP because asyncio only sets
+# TCP_NODELAY on sockets that declare it. uvicorn's own --workers socket doesn't,
+# and every response then waits ~40ms on a delayed ACK between its headers and
+# its body.
+#
+# Cached responses stay per worker. CACHE_GENERATIONS='shared' makes a write in
+# one worker invalidate them in all (lib/shared_generations.py). Settings reach
+# the workers as FLASK_<NAME> environment variables.
+
+def listen(host, port):
+  sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+  sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+  sock.bind((host, port))
+  return sock
+
+def worker(host, port, log_level):
+  import uvicorn
+  config = uvicorn.Config('asgi:app', host=host, port=port, log_level=log_level)
+  uvicorn.Server(config).run(sockets=[listen(host, port)])
+
+def serve(host='127.0.0.1', port=5000, workers=4, log_level='info'):
+  # Start the workers and wait; SIGTERM or Ctrl-C stops them all
+  context = multiprocessing.get_context('spawn')
+  processes = [
+    context.Process(target=worker, args=(host, port, log_level), name=f'worker-{number}')
+    for number in range(workers)
+  ]
+  for process in processes:
+    process.start()
+
+  def stop(signum, frame):
+    raise KeyboardInterrupt
+
+  signal.signal(signal.SIGTERM, stop)
+  try:
+    for process in processes:
+      process.join()
+  except KeyboardInterrupt:
+    pass
+  finally:
+    for process in processes:
+      if process.is_alive():
+        process.terminate()
+    for process in processes:
+      process.join()
@@ -1,31 +1,66 @@
 import sqlite3
 import os
+import sys
 
-def run_migrations():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'sql', 'migrations')
+
+def migration_files():
+    # Migration files are named <version>_<description>.sql, e.g. 0001_add_indexes.sql
+    migrations = []
+    for migration_file in sorted(os.listdir(MIGRATIONS_DIR)):
+        if not migration_file.endswith('.sql'):
+            continue
+        version = int(migration_file.split('_', 1)[0])
+        migrations.append((version, migration_file))
+    return migrations
+
+def applied_versions(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+def migrate(conn):
+    # Apply every migration that is not yet recorded in schema_migrations.
+    # Each migration runs in its own transaction together with its bookkeeping row.
+    applied = applied_versions(conn)
+    pending = [(version, name) for version, name in migration_files() if version not in applied]
+
+    for version, migration_file in pending:
+        print(f"Running migration: {migration_file}")
+        with open(os.path.join(MIGRATIONS_DIR, migration_file)) as f:
+            migration_sql = f.read()
+        try:
+            conn.executescript('BEGIN;\n' + migration_sql + '''
+                ;INSERT INTO schema_migrations (version, name) VALUES ({version}, '{name}');
+                COMMIT;
+            '''.format(version=version, name=migration_file))
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+    return [migration_file for _, migration_file in pending]
+
+def run_migrations(db_path=None):
     # Connect to the database
-    db_path = os.path.join(os.path.dirname(__file__), 'word_bank.db')
+    if db_path is None:
+        db_path = os.path.join(os.path.dirname(__file__), 'words.db')
     conn = sqlite3.connect(db_path)
     conn.row_factory = sqlite3.Row
-    
+
     try:
-        # Get list of migration files
-        migrations_dir = os.path.join(os.path.dirname(__file__), 'sql', 'migrations')
-        migration_files = sorted([f for f in os.listdir(migrations_dir) if f.endswith('.sql')])
-        
-        # Run each migration
-        for migration_file in migration_files:
-            print(f"Running migration: {migration_file}")
-            with open(os.path.join(migrations_dir, migration_file)) as f:
-                migration_sql = f.read()
-                conn.executescript(migration_sql)
-                conn.commit()
-        
+        migrate(conn)
         print("Migrations completed successfully")
     except Exception as e:
         print(f"Error running migrations: {str(e)}")
-        conn.rollback()
     finally:
         conn.close()
 
 if __name__ == '__main__':
-    run_migrations()
+    run_migrations(sys.argv[1] if len(sys.argv) > 1 else None)
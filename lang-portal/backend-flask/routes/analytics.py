@@ -0,0 +1,63 @@
+from flask import request, jsonify
+from flask_cors import cross_origin
+
+from lib import snapshots
+
+def load(app):
+  def view(name, key):
+    # One view of the latest snapshot, narrowed to ?<key>= when given
+    views = app.snapshots.views()
+    if views is None:
+      return jsonify({"error": "No snapshot yet; POST /analytics/snapshot to take one"}), 404
+    rows = views[name]
+    value = request.args.get(key, type=int)
+    if value is not None:
+      rows = [row for row in rows if row[key] == value]
+    return jsonify({
+      "snapshot": {"version": views["version"], "taken_at": views["taken_at"]},
+      name: rows
+    })
+
+  # Endpoint: GET /analytics/snapshot for the latest snapshot's tables and
+  # whether one is being taken
+  @app.route('/analytics/snapshot', methods=['GET'])
+  @cross_origin()
+  def get_snapshot():
+    try:
+      return jsonify(app.snapshots.status())
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: POST /analytics/snapshot to take a snapshot in the background
+  # (new reviews and sessions since the last one, all the words) and recompute the views
+  @app.route('/analytics/snapshot', methods=['POST'])
+  @cross_origin()
+  def post_snapshot():
+    try:
+      if not app.snapshots.start():
+        return jsonify({"error": "A snapshot is already being taken"}), 409
+      return jsonify({"running": True}), 202
+    except snapshots.Unavailable as e:
+      return jsonify({"error": str(e)}), 503
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /analytics/group-accuracy[?group_id=] for reviews and accuracy
+  # per group and day, as of the latest snapshot
+  @app.route('/analytics/group-accuracy', methods=['GET'])
+  @cross_origin()
+  def get_group_accuracy():
+    try:
+      return view('group_accuracy', 'group_id')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  # Endpoint: GET /analytics/activity-retention[?study_activity_id=] for each
+  # activity's accuracy by the days since the word was last reviewed, as of the latest snapshot
+  @app.route('/analytics/activity-retention', methods=['GET'])
+  @cross_origin()
+  def get_activity_retention():
+    try:
+      return view('activity_retention', 'study_activity_id')
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
@@ -2,6 +2,8 @@ from flask import jsonify
 from flask_cors import cross_origin
 from datetime import datetime, timedelta
 
+from lib import counts, learning_stats
+
 def load(app):
     @app.route('/dashboard/recent-session', methods=['GET'])
     @cross_origin()
@@ -9,19 +11,18 @@ def load(app):
         try:
             cursor = app.db.cursor()
             
-            # Get the most recent study session with activity name and results
+            # Get the most recent study session with activity name and results,
+            # from the counts maintained on the session (its reviews may be compacted)
             cursor.execute('''
                 SELECT 
                     ss.id,
                     ss.group_id,
                     sa.name as activity_name,
                     ss.created_at,
-                    COUNT(CASE WHEN wri.correct = 1 THEN 1 END) as correct_count,
-                    COUNT(CASE WHEN wri.correct = 0 THEN 1 END) as wrong_count
+                    ss.correct_count,
+                    ss.review_count - ss.correct_count as wrong_count
                 FROM study_sessions ss
                 JOIN study_activities sa ON ss.study_activity_id = sa.id
-                LEFT JOIN word_review_items wri ON ss.id = wri.study_session_id
-                GROUP BY ss.id
                 ORDER BY ss.created_at DESC
                 LIMIT 1
             ''')
@@ -50,80 +51,34 @@ def load(app):
             cursor = app.db.cursor()
             
             # Get total vocabulary count
-            cursor.execute('SELECT COUNT(*) as total_vocabulary FROM words')
-            total_vocabulary = cursor.fetchone()["total_vocabulary"]
+            total_vocabulary = counts.get(cursor, 'words')
 
-            # Get total unique words studied
-            cursor.execute('''
-                SELECT COUNT(DISTINCT word_id) as total_words
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
-            ''')
-            total_words = cursor.fetchone()["total_words"]
-            
-            # Get mastered words (words with >80% success rate and at least 5 attempts)
-            cursor.execute('''
-                WITH word_stats AS (
-                    SELECT 
-                        word_id,
-                        COUNT(*) as total_attempts,
-                        SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                    FROM word_review_items wri
-                    JOIN study_sessions ss ON wri.study_session_id = ss.id
-                    GROUP BY word_id
-                    HAVING total_attempts >= 5
-                )
-                SELECT COUNT(*) as mastered_words
-                FROM word_stats
-                WHERE success_rate >= 0.8
-            ''')
-            mastered_words = cursor.fetchone()["mastered_words"]
-            
-            # Get overall success rate
-            cursor.execute('''
-                SELECT 
-                    SUM(CASE WHEN correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) as success_rate
-                FROM word_review_items wri
-                JOIN study_sessions ss ON wri.study_session_id = ss.id
-            ''')
-            success_rate = cursor.fetchone()["success_rate"] or 0
+            # Get words studied, mastered words (>80% success rate and at least
+            # 5 attempts) and the overall success rate from the maintained summary
+            stats = learning_stats.summary(cursor)
+            total_words = stats["words_studied"]
+            mastered_words = stats["mastered_words"]
+            if stats["total_attempts"]:
+                success_rate = stats["total_correct"] * 1.0 / stats["total_attempts"]
+            else:
+                success_rate = 0
             
             # Get total number of study sessions
-            cursor.execute('SELECT COUNT(*) as total_sessions FROM study_sessions')
-            total_sessions = cursor.fetchone()["total_sessions"]
+            total_sessions = counts.get(cursor, 'study_sessions')
             
-            # Get number of groups with activity in the last 30 days
+            # Get number of groups with activity in the last 30 days, from the
+            # start of each group's latest session (maintained by triggers)
             cursor.execute('''
-                SELECT COUNT(DISTINCT group_id) as active_groups
-                FROM study_sessions
-                WHERE created_at >= date('now', '-30 days')
+                SELECT COUNT(*) as active_groups
+                FROM groups
+                WHERE last_session_at >= date('now', '-30 days')
             ''')
             active_groups = cursor.fetchone()["active_groups"]
             
-            # Calculate current streak (consecutive days with at least one study session)
-            cursor.execute('''
-                WITH daily_sessions AS (
-                    SELECT 
-                        date(created_at) as study_date,
-                        COUNT(*) as session_count
-                    FROM study_sessions
-                    GROUP BY date(created_at)
-                ),
-                streak_calc AS (
-                    SELECT 
-                        study_date,
-                        julianday(study_date) - julianday(lag(study_date, 1) over (order by study_date)) as days_diff
-                    FROM daily_sessions
-                )
-                SELECT COUNT(*) as streak
-                FROM (
-                    SELECT study_date
-                    FROM streak_calc
-                    WHERE days_diff = 1 OR days_diff IS NULL
-                    ORDER BY study_date DESC
-                )
-            ''')
-            current_streak = cursor.fetchone()["streak"]
+            # Current streak (consecutive days with a new session or a review,
+            # ending today or yesterday) and the longest one, maintained as
+            # sessions and reviews are created
+            streaks = learning_stats.streaks(cursor)
             
             return jsonify({
                 "total_vocabulary": total_vocabulary,
@@ -132,7 +87,8 @@ def load(app):
                 "success_rate": success_rate,
                 "total_sessions": total_sessions,
                 "active_groups": active_groups,
-                "current_streak": current_streak
+                "current_streak": streaks["current_streak"],
+                "longest_streak": streaks["longest_streak"]
             })
             
         except Exception as e:
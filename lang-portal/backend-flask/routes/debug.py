@@ -0,0 +1,30 @@
+from flask import jsonify, request
+from flask_cors import cross_origin
+
+def load(app):
+  @app.route('/debug/review-queue', methods=['GET'])
+  @cross_origin()
+  def get_review_queue_metrics():
+    # Queue depth and flush latency of the write-behind queue
+    if app.review_queue is None:
+      return jsonify({"mode": "direct"})
+    return jsonify(dict(app.review_queue.metrics(), mode="queue", ack=app.review_queue.ack))
+
+  @app.route('/debug/cache', methods=['GET'])
+  @cross_origin()
+  def get_cache_metrics():
+    # Size, hit/miss counters and table generations of the response cache,
+    # and size and hit/miss counters of the hot-word cache
+    return jsonify(dict(app.cache.metrics(), word_cache=app.word_cache.metrics()))
+
+  @app.route('/debug/queries', methods=['GET'])
+  @cross_origin()
+  def get_query_metrics():
+    # Per-route query counts, SQL time and slowest statement (SQL_PROFILE=True);
+    # ?reset=1 clears the totals after reading them
+    if app.profiler is None:
+      return jsonify({"enabled": False})
+    metrics = dict(app.profiler.metrics(), enabled=True)
+    if request.args.get('reset') in ('1', 'true'):
+      app.profiler.reset()
+    return jsonify(metrics)
@@ -0,0 +1,33 @@
+from flask import Response, request, jsonify
+from flask_cors import cross_origin
+
+from lib import export
+
+def load(app):
+  # Endpoint: GET /export/words.ndjson, /export/words.csv, /export/reviews.ndjson, /export/reviews.csv
+  # Streams the whole table in id order; ?since_id=<id> resumes after that row,
+  # ?group_id= (words) or ?study_session_id= (reviews) narrows the export
+  @app.route('/export/<any(words, reviews):name>.<any(ndjson, csv):format>', methods=['GET'])
+  @cross_origin()
+  def export_table(name, format):
+    try:
+      since_id = request.args.get('since_id', 0, type=int)
+      filters = {}
+      for key in export.EXPORTS[name]["filters"]:
+        value = request.args.get(key, type=int)
+        if value is not None:
+          filters[key] = value
+
+      # Compress on the fly when the client accepts gzip
+      gzip = request.accept_encodings['gzip'] > 0
+      response = Response(
+        export.stream(app.db, name, format, since_id, filters, gzip=gzip),
+        mimetype=export.MIMETYPES[format]
+      )
+      response.headers['Content-Disposition'] = f'attachment; filename={name}.{format}'
+      response.vary.add('Accept-Encoding')
+      if gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+      return response
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
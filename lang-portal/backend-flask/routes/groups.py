@@ -1,10 +1,54 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
+import secrets
+
+from lib import counts, json_response, learning_stats, pagination, sampling
+from routes.words import WORD_JSON
+
+GROUP_JSON = json_response.object_sql({'id': 'id', 'group_name': 'name', 'word_count': 'words_count'})
+
+# Words of /groups/<id>/words/raw with their parts as nested JSON
+RAW_WORD_JSON = json_response.object_sql({
+  'id': 'w.id',
+  'kanji': 'w.kanji',
+  'romaji': 'w.romaji',
+  'english': 'w.english',
+  'parts': 'json(w.parts)'
+})
+
+# Sessions of /groups/<id>/study_sessions; sessions without reviews are shown as lasting 30 minutes
+GROUP_SESSION_JSON = json_response.object_sql({
+  'id': 's.id',
+  'group_id': 's.group_id',
+  'group_name': 'g.name',
+  'study_activity_id': 's.study_activity_id',
+  'activity_name': 'a.name',
+  'start_time': 's.created_at',
+  'end_time': "COALESCE(s.ended_at, datetime(s.created_at, '+30 minutes'))",
+  'review_items_count': 's.review_count'
+})
+
+# Words of /groups/<id>/next-words with their schedule (null for new words)
+NEXT_WORD_JSON = json_response.object_sql({
+  'id': 'w.id',
+  'kanji': 'w.kanji',
+  'romaji': 'w.romaji',
+  'english': 'w.english',
+  'due_at': 'wg.due_at',
+  'interval_days': 's.interval_days',
+  'ease': 's.ease',
+  'repetitions': 's.repetitions',
+  'lapses': 's.lapses'
+})
+
+# Largest n accepted by /groups/<id>/next-words
+MAX_NEXT_WORDS = 100
 
 def load(app):
   @app.route('/groups', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups')
   def get_groups():
     try:
       cursor = app.db.cursor()
@@ -25,41 +69,46 @@ def load(app):
       if order not in ['asc', 'desc']:
         order = 'asc'
 
+      # Seek past the cursor when one is given, otherwise skip to the page
+      after = request.args.get('after')
+      where, params = '', []
+      if after:
+        where = 'WHERE ' + pagination.seek(sort_by, 'id', order)
+        params = list(pagination.decode_cursor(after, sort_by, order))
+        page, offset = None, 0
+
       # Query to fetch groups with sorting and the cached word count
       cursor.execute(f'''
-        SELECT id, name, words_count
+        SELECT id, name, words_count, {GROUP_JSON} AS json
         FROM groups
-        ORDER BY {sort_by} {order}
+        {where}
+        ORDER BY {sort_by} {order}, id {order}
         LIMIT ? OFFSET ?
-      ''', (groups_per_page, offset))
+      ''', params + [groups_per_page + 1, offset])
 
       groups = cursor.fetchall()
+      next_cursor = pagination.next_cursor(groups, groups_per_page, sort_by, order)
 
-      # Query the total number of groups
-      cursor.execute('SELECT COUNT(*) FROM groups')
-      total_groups = cursor.fetchone()[0]
-      total_pages = (total_groups + groups_per_page - 1) // groups_per_page
-
-      # Format the response
-      groups_data = []
-      for group in groups:
-        groups_data.append({
-          "id": group["id"],
-          "group_name": group["name"],
-          "word_count": group["words_count"]
-        })
+      # The total number of groups, from the trigger-maintained counts
+      total_groups = None
+      if pagination.with_total(request.args):
+        total_groups = counts.get(cursor, 'groups')
+      total_pages = pagination.total_pages(total_groups, groups_per_page)
 
       # Return groups and pagination metadata
-      return jsonify({
-        'groups': groups_data,
+      return json_response.respond({
         'total_pages': total_pages,
-        'current_page': page
-      })
+        'current_page': page,
+        'next_cursor': next_cursor
+      }, groups=[group["json"] for group in groups[:groups_per_page]])
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
   @app.route('/groups/<int:id>', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups')
   def get_group(id):
     try:
       cursor = app.db.cursor()
@@ -99,64 +148,65 @@ def load(app):
       order = request.args.get('order', 'asc')
 
       # Validate sort parameters
-      valid_columns = ['kanji', 'romaji', 'english', 'correct_count', 'wrong_count']
-      if sort_by not in valid_columns:
+      sort_columns = {
+        'kanji': 'w.kanji',
+        'romaji': 'w.romaji',
+        'english': 'w.english',
+        'correct_count': 'w.correct_count',
+        'wrong_count': 'w.wrong_count'
+      }
+      if sort_by not in sort_columns:
         sort_by = 'kanji'
       if order not in ['asc', 'desc']:
         order = 'asc'
+      sort_column = sort_columns[sort_by]
+
+      # Seek past the cursor when one is given, otherwise skip to the page
+      after = request.args.get('after')
+      seek, params = '', []
+      if after:
+        seek = 'AND ' + pagination.seek(sort_column, 'w.id', order)
+        params = list(pagination.decode_cursor(after, sort_by, order))
+        page, offset = None, 0
 
       # First, check if the group exists
-      cursor.execute('SELECT name FROM groups WHERE id = ?', (id,))
+      cursor.execute('SELECT name, words_count FROM groups WHERE id = ?', (id,))
       group = cursor.fetchone()
       if not group:
         return jsonify({"error": "Group not found"}), 404
 
-      # Query to fetch words with pagination and sorting
+      # Query to fetch words with pagination and sorting, each already serialised as JSON
       cursor.execute(f'''
-        SELECT w.*, 
-               COALESCE(wr.correct_count, 0) as correct_count,
-               COALESCE(wr.wrong_count, 0) as wrong_count
+        SELECT w.id, {sort_column} AS sort_value, {WORD_JSON} AS json
         FROM words w
         JOIN word_groups wg ON w.id = wg.word_id
-        LEFT JOIN word_reviews wr ON w.id = wr.word_id
-        WHERE wg.group_id = ?
-        ORDER BY {sort_by} {order}
+        WHERE wg.group_id = ? {seek}
+        ORDER BY {sort_column} {order}, w.id {order}
         LIMIT ? OFFSET ?
-      ''', (id, words_per_page, offset))
+      ''', [id] + params + [words_per_page + 1, offset])
       
       words = cursor.fetchall()
+      next_cursor = pagination.next_cursor(words, words_per_page, sort_by, order, sort_key='sort_value')
 
-      # Get total words count for pagination
-      cursor.execute('''
-        SELECT COUNT(*) 
-        FROM word_groups 
-        WHERE group_id = ?
-      ''', (id,))
-      total_words = cursor.fetchone()[0]
-      total_pages = (total_words + words_per_page - 1) // words_per_page
-
-      # Format the response
-      words_data = []
-      for word in words:
-        words_data.append({
-          "id": word["id"],
-          "kanji": word["kanji"],
-          "romaji": word["romaji"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"]
-        })
+      # Total words for pagination, kept on the group by the word_groups triggers
+      total_words = None
+      if pagination.with_total(request.args):
+        total_words = group["words_count"]
+      total_pages = pagination.total_pages(total_words, words_per_page)
 
-      return jsonify({
-        'words': words_data,
+      return json_response.respond({
         'total_pages': total_pages,
-        'current_page': page
-      })
+        'current_page': page,
+        'next_cursor': next_cursor
+      }, words=[word["json"] for word in words[:words_per_page]])
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
   @app.route('/groups/<int:id>/words/raw', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('groups', 'word_groups', 'words')
   def get_group_words_raw(id):
     try:
       cursor = app.db.cursor()
@@ -167,9 +217,11 @@ def load(app):
       if not group:
         return jsonify({"error": "Group not found"}), 404
 
-      # SQL query to fetch words along with group information
-      cursor.execute('''
-        SELECT g.id as group_id, g.name as group_name, w.*
+      # SQL query to fetch words along with group information, each word already
+      # serialised as JSON (parts are stored as JSON and nested as is, unless their
+      # keys are out of the order jsonify() writes them in, see migration 0016)
+      cursor.execute(f'''
+        SELECT {RAW_WORD_JSON} AS json, w.parts_unsorted AS unsorted
         FROM groups g
         JOIN word_groups wg ON g.id = wg.group_id
         JOIN words w ON w.id = wg.word_id
@@ -178,24 +230,107 @@ def load(app):
       
       data = cursor.fetchall()
       
-      # Format the response
-      result = {
+      return json_response.respond({
         "group_id": id,
-        "group_name": data[0]["group_name"] if data else group["name"],
-        "words": []
-      }
-      
-      for row in data:
-        word = {
-          "id": row["id"],
-          "kanji": row["kanji"],
-          "romaji": row["romaji"],
-          "english": row["english"],
-          "parts": json.loads(row["parts"])  # Deserialize 'parts' field
-        }
-        result["words"].append(word)
-      
-      return jsonify(result)
+        "group_name": group["name"]
+      }, words=[json_response.sort_keys(row["json"]) if row["unsorted"] else row["json"] for row in data])
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  @app.route('/groups/<int:id>/next-words', methods=['GET'])
+  @cross_origin()
+  def get_group_next_words(id):
+    try:
+      cursor = app.db.cursor()
+
+      # Number of words to study next
+      n = min(max(int(request.args.get('n', 10)), 1), MAX_NEXT_WORDS)
+
+      # First, check if the group exists
+      cursor.execute('SELECT name FROM groups WHERE id = ?', (id,))
+      group = cursor.fetchone()
+      if not group:
+        return jsonify({"error": "Group not found"}), 404
+
+      # Overdue words, most overdue first: a seek on idx_word_groups_group_due
+      # that stops after n rows, however large the group (words never reviewed
+      # have no due_at and are not matched)
+      now = learning_stats.timestamp()
+      cursor.execute(f'''
+        SELECT {NEXT_WORD_JSON} AS json
+        FROM word_groups wg
+        JOIN words w ON w.id = wg.word_id
+        LEFT JOIN word_schedule s ON s.word_id = wg.word_id
+        WHERE wg.group_id = ? AND wg.due_at <= ?
+        ORDER BY wg.due_at, wg.word_id
+        LIMIT ?
+      ''', (id, now, n))
+      words = [row["json"] for row in cursor.fetchall()]
+
+      # Then new words, in the order they were added
+      if len(words) < n:
+        cursor.execute(f'''
+          SELECT {NEXT_WORD_JSON} AS json
+          FROM word_groups wg
+          JOIN words w ON w.id = wg.word_id
+          LEFT JOIN word_schedule s ON s.word_id = wg.word_id
+          WHERE wg.group_id = ? AND wg.due_at IS NULL
+          ORDER BY wg.word_id
+          LIMIT ?
+        ''', (id, n - len(words)))
+        words += [row["json"] for row in cursor.fetchall()]
+
+      return json_response.respond({
+        "group_id": id,
+        "group_name": group["name"],
+        "now": now
+      }, words=words)
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  @app.route('/groups/<int:id>/sample', methods=['GET'])
+  @cross_origin()
+  def get_group_sample(id):
+    try:
+      cursor = app.db.cursor()
+
+      # Number of words to draw, and the seed that makes the draw repeatable
+      # (a random one is picked and returned when none is given)
+      n = request.args.get('n', '10')
+      if not n.isdigit() or int(n) < 1:
+        return jsonify({"error": "n must be a positive integer"}), 400
+      n = min(int(n), sampling.MAX_SAMPLE)
+      seed = request.args.get('seed')
+      if seed is None:
+        seed = secrets.randbelow(sampling.MAX_SEED)
+      elif not seed.isdigit():
+        return jsonify({"error": "seed must be a non-negative integer"}), 400
+      seed = int(seed)
+      weighted = request.args.get('weighted') in ('1', 'true')
+      exclude_mastered = request.args.get('exclude_mastered') in ('1', 'true')
+
+      # First, check if the group exists
+      cursor.execute('SELECT name, words_count FROM groups WHERE id = ?', (id,))
+      group = cursor.fetchone()
+      if not group:
+        return jsonify({"error": "Group not found"}), 404
+
+      word_ids = sampling.sample(cursor, id, group["words_count"], n, seed,
+                                 weighted=weighted, exclude_mastered=exclude_mastered)
+      cursor.execute(f'''
+        SELECT {WORD_JSON} AS json
+        FROM json_each(?) ids
+        JOIN words w ON w.id = ids.value
+        ORDER BY ids.key
+      ''', (json.dumps(word_ids),))
+
+      return json_response.respond({
+        "group_id": id,
+        "group_name": group["name"],
+        "seed": seed,
+        "weighted": weighted,
+        "exclude_mastered": exclude_mastered
+      }, words=[row["json"] for row in cursor.fetchall()])
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
@@ -216,76 +351,77 @@ def load(app):
 
       # Map frontend sort keys to database columns
       sort_mapping = {
-        'startTime': 'created_at',
-        'endTime': 'last_activity_time',
+        'startTime': 's.created_at',
+        'endTime': "COALESCE(s.ended_at, '')",
         'activityName': 'a.name',
         'groupName': 'g.name',
-        'reviewItemsCount': 'review_count'
+        'reviewItemsCount': 's.review_count'
       }
 
       # Use mapped sort column or default to created_at
-      sort_column = sort_mapping.get(sort_by, 'created_at')
+      if sort_by not in sort_mapping:
+        sort_by = 'startTime'
+      if order not in ['asc', 'desc']:
+        order = 'desc'
+      sort_column = sort_mapping[sort_by]
+      # Result column holding the sort value, for building the next cursor
+      sort_key = {
+        'startTime': 'start_time',
+        'endTime': 'last_activity_time',
+        'activityName': 'activity_name',
+        'groupName': 'group_name',
+        'reviewItemsCount': 'review_count'
+      }[sort_by]
+
+      # Seek past the cursor when one is given, otherwise skip to the page
+      after = request.args.get('after')
+      seek, params = '', []
+      if after:
+        seek = 'AND ' + pagination.seek(sort_column, 's.id', order)
+        params = list(pagination.decode_cursor(after, sort_by, order))
+        page, offset = None, 0
 
       # Get total count for pagination
-      cursor.execute('''
-        SELECT COUNT(*)
-        FROM study_sessions
-        WHERE group_id = ?
-      ''', (id,))
-      total_sessions = cursor.fetchone()[0]
-      total_pages = (total_sessions + sessions_per_page - 1) // sessions_per_page
+      total_sessions = None
+      if pagination.with_total(request.args):
+        cursor.execute('''
+          SELECT COUNT(*)
+          FROM study_sessions
+          WHERE group_id = ?
+        ''', (id,))
+        total_sessions = cursor.fetchone()[0]
+      total_pages = pagination.total_pages(total_sessions, sessions_per_page)
 
-      # Get study sessions for this group with dynamic calculations
+      # Get study sessions for this group, each serialised as JSON next to its
+      # sort value; review count and end time are maintained on study_sessions
+      # when reviews are logged
       cursor.execute(f'''
         SELECT 
           s.id,
-          s.group_id,
-          s.study_activity_id,
           s.created_at as start_time,
-          (
-            SELECT MAX(created_at)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as last_activity_time,
+          -- Sessions without reviews get '' so they keep sorting first, as NULLs would
+          COALESCE(s.ended_at, '') as last_activity_time,
           a.name as activity_name,
           g.name as group_name,
-          (
-            SELECT COUNT(*)
-            FROM word_review_items
-            WHERE study_session_id = s.id
-          ) as review_count
+          s.review_count,
+          {GROUP_SESSION_JSON} AS json
         FROM study_sessions s
         JOIN study_activities a ON s.study_activity_id = a.id
         JOIN groups g ON s.group_id = g.id
-        WHERE s.group_id = ?
-        ORDER BY {sort_column} {order}
+        WHERE s.group_id = ? {seek}
+        ORDER BY {sort_column} {order}, s.id {order}
         LIMIT ? OFFSET ?
-      ''', (id, sessions_per_page, offset))
+      ''', [id] + params + [sessions_per_page + 1, offset])
       
       sessions = cursor.fetchall()
-      sessions_data = []
-      
-      for session in sessions:
-        # If there's no last_activity_time, use start_time + 30 minutes
-        end_time = session["last_activity_time"]
-        if not end_time:
-            end_time = cursor.execute('SELECT datetime(?, "+30 minutes")', (session["start_time"],)).fetchone()[0]
-        
-        sessions_data.append({
-          "id": session["id"],
-          "group_id": session["group_id"],
-          "group_name": session["group_name"],
-          "study_activity_id": session["study_activity_id"],
-          "activity_name": session["activity_name"],
-          "start_time": session["start_time"],
-          "end_time": end_time,
-          "review_items_count": session["review_count"]
-        })
+      next_cursor = pagination.next_cursor(sessions, sessions_per_page, sort_by, order, sort_key=sort_key)
 
-      return jsonify({
-        'study_sessions': sessions_data,
+      return json_response.respond({
         'total_pages': total_pages,
-        'current_page': page
-      })
+        'current_page': page,
+        'next_cursor': next_cursor
+      }, study_sessions=[session['json'] for session in sessions[:sessions_per_page]])
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
\ No newline at end of file
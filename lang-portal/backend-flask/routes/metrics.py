@@ -0,0 +1,12 @@
+from flask import Response
+from flask_cors import cross_origin
+
+from lib import metrics
+
+def load(app):
+  @app.route('/metrics', methods=['GET'])
+  @cross_origin()
+  def get_metrics():
+    # Prometheus text format: request counts and latency histograms per route,
+    # connection pool, response cache and review queue
+    return Response(metrics.render(app), content_type=metrics.CONTENT_TYPE)
@@ -2,9 +2,13 @@ from flask import jsonify, request
 from flask_cors import cross_origin
 import math
 
+from lib import json_response, pagination
+from routes.study_sessions import SESSION_JSON
+
 def load(app):
     @app.route('/api/study-activities', methods=['GET'])
     @cross_origin()
+    @app.cache.cached('study_activities')
     def get_study_activities():
         cursor = app.db.cursor()
         cursor.execute('SELECT id, name, url, preview_url FROM study_activities')
@@ -49,52 +53,50 @@ def load(app):
         per_page = request.args.get('per_page', 10, type=int)
         offset = (page - 1) * per_page
 
+        # Seek past the cursor when one is given, otherwise skip to the page
+        after = request.args.get('after')
+        seek, params = '', []
+        if after:
+            try:
+                params = list(pagination.decode_cursor(after, 'created_at', 'desc'))
+            except pagination.InvalidCursor as e:
+                return jsonify({'error': str(e)}), 400
+            seek = 'AND ' + pagination.seek('ss.created_at', 'ss.id', 'desc')
+            page, offset = None, 0
+
         # Get total count
-        cursor.execute('''
-            SELECT COUNT(*) as count 
-            FROM study_sessions ss
-            JOIN groups g ON g.id = ss.group_id
-            WHERE ss.study_activity_id = ?
-        ''', (id,))
-        total_count = cursor.fetchone()['count']
+        total_count = None
+        if pagination.with_total(request.args):
+            cursor.execute('''
+                SELECT COUNT(*) as count 
+                FROM study_sessions ss
+                JOIN groups g ON g.id = ss.group_id
+                WHERE ss.study_activity_id = ?
+            ''', (id,))
+            total_count = cursor.fetchone()['count']
 
-        # Get paginated sessions
-        cursor.execute('''
-            SELECT 
-                ss.id,
-                ss.group_id,
-                g.name as group_name,
-                sa.name as activity_name,
-                ss.created_at,
-                ss.study_activity_id as activity_id,
-                COUNT(wri.id) as review_items_count
+        # Get paginated sessions, walking the (activity, created_at) index newest
+        # first, each serialised as JSON like the items of /api/study-sessions
+        cursor.execute(f'''
+            SELECT ss.id, ss.created_at, {SESSION_JSON} AS json
             FROM study_sessions ss
             JOIN groups g ON g.id = ss.group_id
             JOIN study_activities sa ON sa.id = ss.study_activity_id
-            LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-            WHERE ss.study_activity_id = ?
-            GROUP BY ss.id, ss.group_id, g.name, sa.name, ss.created_at, ss.study_activity_id
-            ORDER BY ss.created_at DESC
+            WHERE ss.study_activity_id = ? {seek}
+            ORDER BY ss.created_at DESC, ss.id DESC
             LIMIT ? OFFSET ?
-        ''', (id, per_page, offset))
+        ''', [id] + params + [per_page + 1, offset])
         sessions = cursor.fetchall()
+        next_cursor = pagination.next_cursor(sessions, per_page, 'created_at', 'desc')
+        sessions = sessions[:per_page]
 
-        return jsonify({
-            'items': [{
-                'id': session['id'],
-                'group_id': session['group_id'],
-                'group_name': session['group_name'],
-                'activity_id': session['activity_id'],
-                'activity_name': session['activity_name'],
-                'start_time': session['created_at'],
-                'end_time': session['created_at'],  # For now, just use the same time since we don't track end time
-                'review_items_count': session['review_items_count']
-            } for session in sessions],
+        return json_response.respond({
             'total': total_count,
             'page': page,
             'per_page': per_page,
-            'total_pages': math.ceil(total_count / per_page)
-        })
+            'total_pages': math.ceil(total_count / per_page) if total_count is not None else None,
+            'next_cursor': next_cursor
+        }, items=[session['json'] for session in sessions])
 
     @app.route('/api/study-activities/<int:id>/launch', methods=['GET'])
     @cross_origin()
@@ -1,11 +1,25 @@
 from flask import request, jsonify, g
 from flask_cors import cross_origin
-from datetime import datetime
 import math
 
+from lib import counts, json_response, learning_stats, pagination, review_queue, reviews, scheduler
+
+# One JSON object per session of /api/study-sessions, built by SQLite
+SESSION_JSON = json_response.object_sql({
+  'id': 'ss.id',
+  'group_id': 'ss.group_id',
+  'group_name': 'g.name',
+  'activity_id': 'sa.id',
+  'activity_name': 'sa.name',
+  'start_time': 'ss.created_at',
+  'end_time': "COALESCE(NULLIF(ss.ended_at, ''), ss.created_at)",
+  'review_items_count': 'ss.review_count'
+})
+
 def load(app):
   @app.route('/study_sessions', methods=['POST'])
   @cross_origin()
+  @app.cache.invalidates('study_sessions', 'activity_days', 'learning_stats')
   def create_study_session():
     try:
       # Parse the JSON request body
@@ -36,17 +50,21 @@ def load(app):
       if not study_activity:
         return jsonify({"error": "Study activity not found"}), 404
 
-      # Insert the study session
+      # Insert the study session, timestamped in UTC like its reviews
+      created_at = learning_stats.timestamp()
       cursor.execute('''
         INSERT INTO study_sessions (group_id, study_activity_id, created_at)
         VALUES (?, ?, ?)
-      ''', (group_id, study_activity_id, datetime.now()))
-      
-      app.db.commit()
-      
+      ''', (group_id, study_activity_id, created_at))
+
       # Get the id of the newly created session
       session_id = cursor.lastrowid
 
+      # Count the day as active for the streaks
+      learning_stats.record_session(cursor, created_at)
+
+      app.db.commit()
+
       return jsonify({"session_id": session_id}), 201
     except Exception as e:
       return jsonify({"error": str(e)}), 500
@@ -62,51 +80,42 @@ def load(app):
       per_page = request.args.get('per_page', 10, type=int)
       offset = (page - 1) * per_page
 
-      # Get total count
-      cursor.execute('''
-        SELECT COUNT(*) as count 
-        FROM study_sessions ss
-        JOIN groups g ON g.id = ss.group_id
-        JOIN study_activities sa ON sa.id = ss.study_activity_id
-      ''')
-      total_count = cursor.fetchone()['count']
+      # Seek past the cursor when one is given, otherwise skip to the page
+      after = request.args.get('after')
+      where, params = '', []
+      if after:
+        where = 'WHERE ' + pagination.seek('ss.created_at', 'ss.id', 'desc')
+        params = list(pagination.decode_cursor(after, 'created_at', 'desc'))
+        page, offset = None, 0
 
-      # Get paginated sessions
-      cursor.execute('''
-        SELECT 
-          ss.id,
-          ss.group_id,
-          g.name as group_name,
-          sa.id as activity_id,
-          sa.name as activity_name,
-          ss.created_at,
-          COUNT(wri.id) as review_items_count
+      # Get total count (every session has its group and activity)
+      total_count = None
+      if pagination.with_total(request.args):
+        total_count = counts.get(cursor, 'study_sessions')
+
+      # Get paginated sessions, walking the created_at index newest first
+      cursor.execute(f'''
+        SELECT ss.id, ss.created_at, {SESSION_JSON} AS json
         FROM study_sessions ss
         JOIN groups g ON g.id = ss.group_id
         JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
-        GROUP BY ss.id
-        ORDER BY ss.created_at DESC
+        {where}
+        ORDER BY ss.created_at DESC, ss.id DESC
         LIMIT ? OFFSET ?
-      ''', (per_page, offset))
+      ''', params + [per_page + 1, offset])
       sessions = cursor.fetchall()
+      next_cursor = pagination.next_cursor(sessions, per_page, 'created_at', 'desc')
+      sessions = sessions[:per_page]
 
-      return jsonify({
-        'items': [{
-          'id': session['id'],
-          'group_id': session['group_id'],
-          'group_name': session['group_name'],
-          'activity_id': session['activity_id'],
-          'activity_name': session['activity_name'],
-          'start_time': session['created_at'],
-          'end_time': session['created_at'],  # For now, just use the same time since we don't track end time
-          'review_items_count': session['review_items_count']
-        } for session in sessions],
+      return json_response.respond({
         'total': total_count,
         'page': page,
         'per_page': per_page,
-        'total_pages': math.ceil(total_count / per_page)
-      })
+        'total_pages': math.ceil(total_count / per_page) if total_count is not None else None,
+        'next_cursor': next_cursor
+      }, items=[session['json'] for session in sessions])
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
@@ -125,13 +134,12 @@ def load(app):
           sa.id as activity_id,
           sa.name as activity_name,
           ss.created_at,
-          COUNT(wri.id) as review_items_count
+          ss.ended_at,
+          ss.review_count as review_items_count
         FROM study_sessions ss
         JOIN groups g ON g.id = ss.group_id
         JOIN study_activities sa ON sa.id = ss.study_activity_id
-        LEFT JOIN word_review_items wri ON wri.study_session_id = ss.id
         WHERE ss.id = ?
-        GROUP BY ss.id
       ''', (id,))
       
       session = cursor.fetchone()
@@ -177,7 +185,7 @@ def load(app):
           'activity_id': session['activity_id'],
           'activity_name': session['activity_name'],
           'start_time': session['created_at'],
-          'end_time': session['created_at'],  # For now, just use the same time
+          'end_time': session['ended_at'] or session['created_at'],
           'review_items_count': session['review_items_count']
         },
         'words': [{
@@ -196,8 +204,35 @@ def load(app):
     except Exception as e:
       return jsonify({"error": str(e)}), 500
 
+  @app.route('/study_sessions/<id>/end', methods=['POST'])
+  @cross_origin()
+  @app.cache.invalidates('study_sessions')
+  def end_study_session(id):
+    try:
+      cursor = app.db.cursor()
+
+      # Later reviews still move ended_at forward
+      cursor.execute('''
+        UPDATE study_sessions SET ended_at = ? WHERE id = ?
+      ''', (learning_stats.timestamp(), id))
+      if cursor.rowcount == 0:
+        return jsonify({"error": "Study session not found"}), 404
+      app.db.commit()
+
+      cursor.execute('SELECT id, created_at, ended_at, review_count FROM study_sessions WHERE id = ?', (id,))
+      session = cursor.fetchone()
+      return jsonify({
+        "id": session["id"],
+        "start_time": session["created_at"],
+        "end_time": session["ended_at"],
+        "review_items_count": session["review_count"]
+      })
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
   @app.route('/study_sessions/<id>/review', methods=['POST'])
   @cross_origin()
+  @app.cache.invalidates(*reviews.TABLES)
   def log_review(id):
     cursor = app.db.cursor()
 
@@ -217,39 +252,92 @@ def load(app):
     if not cursor.fetchone():
         return jsonify({"error": "Study session not found"}), 404
 
-    # Insert the individual review attempt into word_review_items
-    cursor.execute('''
-        INSERT INTO word_review_items (word_id, correct, study_session_id) VALUES (?, ?, ?)
-    ''', (word_id, correct, id))
-    
-    # Update or insert aggregate review record in word_reviews
-    cursor.execute('''
-        SELECT * FROM word_reviews WHERE word_id = ?
-    ''', (word_id,))
-    review = cursor.fetchone()
-
-    if review:
-        # Update existing record
-        if correct:
-            cursor.execute('''
-           UPDATE word_reviews SET correct_count = correct_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-        else:
-            cursor.execute('''
-                UPDATE word_reviews SET wrong_count = wrong_count + 1, last_reviewed = ? WHERE word_id = ?
-            ''', (datetime.now(), word_id))
-    else:
-        # Insert new record
-        cursor.execute('''
-            INSERT INTO word_reviews (word_id, correct_count, wrong_count, last_reviewed)
-            VALUES (?, ?, ?, ?)
-        ''', (word_id, 1 if correct else 0, 0 if correct else 1, datetime.now()))
+    # Hand the review to the write-behind queue when it is enabled
+    if app.review_queue is not None:
+      return queue_reviews(id, [(word_id, correct)], {"message": "Review logged successfully"})
+
+    # Insert the review attempt and update the aggregate counters
+    reviews.log_reviews(cursor, id, [(word_id, correct)])
 
     app.db.commit()
     return jsonify({"message": "Review logged successfully"})
 
+  @app.route('/study_sessions/<id>/reviews:batch', methods=['POST'])
+  @cross_origin()
+  @app.cache.invalidates(*reviews.TABLES)
+  def log_reviews_batch(id):
+    try:
+      cursor = app.db.cursor()
+
+      # Accept {"reviews": [{"word_id": 1, "correct": true}, ...]} or the bare list
+      data = request.get_json()
+      items = data.get('reviews') if isinstance(data, dict) else data
+      if not isinstance(items, list):
+        return jsonify({"error": "reviews must be a list"}), 400
+      if len(items) > reviews.MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {reviews.MAX_BATCH_SIZE} reviews per batch"}), 400
+
+      # Check if study session exists
+      cursor.execute('SELECT id FROM study_sessions WHERE id = ?', (id,))
+      if not cursor.fetchone():
+        return jsonify({"error": "Study session not found"}), 404
+
+      # Validate every word id with a single query
+      word_ids = {
+        item.get('word_id') for item in items
+        if isinstance(item, dict) and isinstance(item.get('word_id'), int)
+      }
+      known_word_ids = reviews.existing_word_ids(cursor, word_ids)
+
+      accepted = []
+      results = []
+      for index, item in enumerate(items):
+        word_id = item.get('word_id') if isinstance(item, dict) else None
+        correct = item.get('correct') if isinstance(item, dict) else None
+        if word_id is None or correct is None:
+          results.append({"index": index, "status": "error", "error": "word_id and correct fields are required"})
+        elif word_id not in known_word_ids:
+          results.append({"index": index, "status": "error", "error": "Word not found"})
+        else:
+          accepted.append((word_id, correct))
+          results.append({"index": index, "status": "ok"})
+
+      result = {
+        "accepted": len(accepted),
+        "rejected": len(items) - len(accepted),
+        "results": results
+      }
+
+      # All accepted answers are written in one transaction
+      if accepted and app.review_queue is not None:
+        return queue_reviews(id, accepted, result)
+      if accepted:
+        reviews.log_reviews(cursor, id, accepted)
+        app.db.commit()
+
+      return jsonify(result)
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+
+  def queue_reviews(session_id, accepted, result):
+    # ack=commit waits for the writer's transaction, ack=enqueue answers 202 right away
+    try:
+      ticket = app.review_queue.submit(session_id, accepted)
+    except review_queue.QueueFull as e:
+      response = jsonify({"error": str(e)})
+      response.headers['Retry-After'] = '1'
+      return response, 503
+    if app.review_queue.ack == 'enqueue':
+      return jsonify(result), 202
+    try:
+      ticket.wait(timeout=30)
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    return jsonify(result)
+
   @app.route('/api/study-sessions/reset', methods=['POST'])
   @cross_origin()
+  @app.cache.invalidates('study_sessions', *reviews.TABLES)
   def reset_study_sessions():
     try:
       cursor = app.db.cursor()
@@ -259,6 +347,13 @@ def load(app):
       
       # Then delete all study sessions
       cursor.execute('DELETE FROM study_sessions')
+
+      # And the reviews compacted into daily rollups
+      cursor.execute('DELETE FROM daily_word_stats')
+
+      # And the counters derived from them
+      learning_stats.reset(cursor)
+      scheduler.reset(cursor)
       
       app.db.commit()
       
@@ -2,12 +2,94 @@ from flask import request, jsonify, g
 from flask_cors import cross_origin
 import json
 
+from lib import counts, json_response, pagination, search
+
+WORD_FIELDS = {
+  'id': 'w.id',
+  'kanji': 'w.kanji',
+  'romaji': 'w.romaji',
+  'english': 'w.english',
+  'correct_count': 'w.correct_count',
+  'wrong_count': 'w.wrong_count'
+}
+
+# One JSON object per word of /words and /groups/<id>/words, built by SQLite
+WORD_JSON = json_response.object_sql(WORD_FIELDS)
+
+# A word with its groups as a JSON array of {id, name}, for /words/<id> and the
+# batch lookups; group names are taken as they are, commas and all
+WORD_DETAIL_JSON = json_response.object_sql(dict(WORD_FIELDS, groups='''json((
+  SELECT json_group_array(json_object('id', word_group.id, 'name', word_group.name))
+  FROM (
+    SELECT g.id, g.name
+    FROM word_groups wg
+    JOIN groups g ON g.id = wg.group_id
+    WHERE wg.word_id = w.id
+    ORDER BY g.id
+  ) word_group
+))'''))
+
+# The words of a JSON array of ids, in the order of the array
+WORDS_BY_ID_SQL = f'''
+  SELECT w.id, {WORD_DETAIL_JSON} AS json
+  FROM json_each(?) ids
+  JOIN words w ON w.id = ids.value
+  ORDER BY ids.key
+'''
+
+WORD_BY_ID_SQL = f'''
+  SELECT {WORD_DETAIL_JSON} AS json
+  FROM words w
+  WHERE w.id = ?
+'''
+
+# Most ids resolved by one batch lookup
+MAX_LOOKUP_IDS = 5000
+
+def parse_ids(values):
+  # Word ids from a list of ints or digit strings; duplicates are dropped
+  if not isinstance(values, list) or not values:
+    raise ValueError("ids must be a non-empty list of word ids")
+  if len(values) > MAX_LOOKUP_IDS:
+    raise ValueError(f"At most {MAX_LOOKUP_IDS} ids per lookup")
+  ids = []
+  for value in values:
+    if isinstance(value, bool) or not isinstance(value, (int, str)) or not str(value).strip().isdigit():
+      raise ValueError(f"Invalid word id: {value!r}")
+    ids.append(int(value))
+  return list(dict.fromkeys(ids))
+
 def load(app):
+  def lookup_words(values):
+    # Every requested word in one query, in the order asked for, and the ids not found
+    try:
+      ids = parse_ids(values)
+    except ValueError as e:
+      return jsonify({"error": str(e)}), 400
+    cursor = app.db.cursor()
+    cursor.execute(WORDS_BY_ID_SQL, (json.dumps(ids),))
+    words = cursor.fetchall()
+    found = {word["id"] for word in words}
+    return json_response.respond({
+      "missing": [word_id for word_id in ids if word_id not in found]
+    }, words=[word["json"] for word in words])
+
+  def load_word(word_id):
+    cursor = app.db.cursor()
+    cursor.execute(WORD_BY_ID_SQL, (word_id,))
+    word = cursor.fetchone()
+    return word["json"] if word else None
+
   # Endpoint: GET /words with pagination (50 words per page)
+  # Pass ?after=<next_cursor> instead of ?page= to seek to the next page,
+  # or ?ids=1,2,3 to look up those words (POST /words/batch for large sets)
   @app.route('/words', methods=['GET'])
   @cross_origin()
   def get_words():
     try:
+      if 'ids' in request.args:
+        return lookup_words([value for value in request.args['ids'].split(',') if value])
+
       cursor = app.db.cursor()
 
       # Get the current page number from query parameters (default is 1)
@@ -22,33 +104,80 @@ def load(app):
       order = request.args.get('order', 'asc')  # Default to ascending order
 
       # Validate sort_by and order
-      valid_columns = ['kanji', 'romaji', 'english', 'correct_count', 'wrong_count']
-      if sort_by not in valid_columns:
+      sort_columns = {
+        'kanji': 'w.kanji',
+        'romaji': 'w.romaji',
+        'english': 'w.english',
+        'correct_count': 'w.correct_count',
+        'wrong_count': 'w.wrong_count'
+      }
+      if sort_by not in sort_columns:
         sort_by = 'kanji'
       if order not in ['asc', 'desc']:
         order = 'asc'
+      sort_column = sort_columns[sort_by]
 
-      # Query to fetch words with sorting
+      # Seek past the cursor when one is given, otherwise skip to the page
+      after = request.args.get('after')
+      where, params = '', []
+      if after:
+        where = 'WHERE ' + pagination.seek(sort_column, 'w.id', order)
+        params = list(pagination.decode_cursor(after, sort_by, order))
+        page, offset = None, 0
+
+      # Query to fetch words with sorting, each already serialised as JSON
       cursor.execute(f'''
-        SELECT w.id, w.kanji, w.romaji, w.english, 
-            COALESCE(r.correct_count, 0) AS correct_count,
-            COALESCE(r.wrong_count, 0) AS wrong_count
+        SELECT w.id, {sort_column} AS sort_value, {WORD_JSON} AS json
         FROM words w
-        LEFT JOIN word_reviews r ON w.id = r.word_id
-        ORDER BY {sort_by} {order}
+        {where}
+        ORDER BY {sort_column} {order}, w.id {order}
         LIMIT ? OFFSET ?
-      ''', (words_per_page, offset))
+      ''', params + [words_per_page + 1, offset])
 
       words = cursor.fetchall()
+      next_cursor = pagination.next_cursor(words, words_per_page, sort_by, order, sort_key='sort_value')
+
+      # The total number of words, from the trigger-maintained counts
+      total_words = None
+      if pagination.with_total(request.args):
+        total_words = counts.get(cursor, 'words')
+      total_pages = pagination.total_pages(total_words, words_per_page)
+
+      return json_response.respond({
+        "total_pages": total_pages,
+        "current_page": page,
+        "total_words": total_words,
+        "next_cursor": next_cursor
+      }, words=[word["json"] for word in words[:words_per_page]])
+
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
+
+  # Endpoint: GET /words/search?q=<text> (50 words per page, best matches first)
+  # Pass ?after=<next_cursor> to get the next page
+  @app.route('/words/search', methods=['GET'])
+  @cross_origin()
+  def search_words():
+    try:
+      query = request.args.get('q', '').strip()
+      if not query:
+        return jsonify({"error": "Missing search query"}), 400
+      words_per_page = 50
+
+      after = request.args.get('after')
+      if after:
+        after = pagination.decode_cursor(after, search.SORT_BY, search.ORDER)
 
-      # Query the total number of words
-      cursor.execute('SELECT COUNT(*) FROM words')
-      total_words = cursor.fetchone()[0]
-      total_pages = (total_words + words_per_page - 1) // words_per_page
+      cursor = app.db.cursor()
+      words = search.search_words(cursor, query, words_per_page + 1, after=after or None)
+      next_cursor = pagination.next_cursor(words, words_per_page, search.SORT_BY, search.ORDER, sort_key='score')
 
-      # Format the response
       words_data = []
-      for word in words:
+      for word in words[:words_per_page]:
         words_data.append({
           "id": word["id"],
           "kanji": word["kanji"],
@@ -59,12 +188,28 @@ def load(app):
         })
 
       return jsonify({
+        "query": query,
         "words": words_data,
-        "total_pages": total_pages,
-        "current_page": page,
-        "total_words": total_words
+        "next_cursor": next_cursor
       })
 
+    except pagination.InvalidCursor as e:
+      return jsonify({"error": str(e)}), 400
+    except Exception as e:
+      return jsonify({"error": str(e)}), 500
+    finally:
+      app.db.close()
+
+  # Endpoint: POST /words/batch with {"ids": [1, 2, 3]}: the words in the order
+  # asked for and the ids that don't exist
+  @app.route('/words/batch', methods=['POST'])
+  @cross_origin()
+  def post_words_batch():
+    try:
+      data = request.get_json(silent=True)
+      if not isinstance(data, dict):
+        return jsonify({"error": "ids must be a non-empty list of word ids"}), 400
+      return lookup_words(data.get('ids'))
     except Exception as e:
       return jsonify({"error": str(e)}), 500
     finally:
@@ -73,50 +218,15 @@ def load(app):
   # Endpoint: GET /words/:id to get a single word with its details
   @app.route('/words/<int:word_id>', methods=['GET'])
   @cross_origin()
+  @app.cache.cached('words', 'word_reviews', 'word_groups', 'groups')
   def get_word(word_id):
     try:
-      cursor = app.db.cursor()
-      
-      # Query to fetch the word and its details
-      cursor.execute('''
-        SELECT w.id, w.kanji, w.romaji, w.english,
-               COALESCE(r.correct_count, 0) AS correct_count,
-               COALESCE(r.wrong_count, 0) AS wrong_count,
-               GROUP_CONCAT(DISTINCT g.id || '::' || g.name) as groups
-        FROM words w
-        LEFT JOIN word_reviews r ON w.id = r.word_id
-        LEFT JOIN word_groups wg ON w.id = wg.word_id
-        LEFT JOIN groups g ON wg.group_id = g.id
-        WHERE w.id = ?
-        GROUP BY w.id
-      ''', (word_id,))
-      
-      word = cursor.fetchone()
-      
-      if not word:
+      # Through the hot-word cache, which keeps words whose responses the
+      # response cache has evicted
+      word = app.word_cache.get(word_id, load_word)
+      if word is None:
         return jsonify({"error": "Word not found"}), 404
-      
-      # Parse the groups string into a list of group objects
-      groups = []
-      if word["groups"]:
-        for group_str in word["groups"].split(','):
-          group_id, group_name = group_str.split('::')
-          groups.append({
-            "id": int(group_id),
-            "name": group_name
-          })
-      
-      return jsonify({
-        "word": {
-          "id": word["id"],
-          "kanji": word["kanji"],
-          "romaji": word["romaji"],
-          "english": word["english"],
-          "correct_count": word["correct_count"],
-          "wrong_count": word["wrong_count"],
-          "groups": groups
-        }
-      })
-      
+      return json_response.respond_object("word", word)
+
     except Exception as e:
-      return jsonify({"error": str(e)}), 500
\ No newline at end of file
+      return jsonify({"error": str(e)}), 500
@@ -0,0 +1,10 @@
+-- Review items are looked up by session (with the correct flag for the counts) and by word
+CREATE INDEX IF NOT EXISTS idx_word_review_items_session_correct ON word_review_items(study_session_id, correct);
+CREATE INDEX IF NOT EXISTS idx_word_review_items_word ON word_review_items(word_id);
+
+-- Group membership is read from the group side
+CREATE INDEX IF NOT EXISTS idx_word_groups_group_word ON word_groups(group_id, word_id);
+
+-- Session listings are ordered by creation time, globally and per group
+CREATE INDEX IF NOT EXISTS idx_study_sessions_created_at ON study_sessions(created_at);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_group_created_at ON study_sessions(group_id, created_at);
@@ -0,0 +1,7 @@
+-- Sort columns of the list endpoints, so keyset pagination can seek on (column, id)
+CREATE INDEX IF NOT EXISTS idx_words_kanji ON words(kanji);
+CREATE INDEX IF NOT EXISTS idx_words_romaji ON words(romaji);
+CREATE INDEX IF NOT EXISTS idx_words_english ON words(english);
+CREATE INDEX IF NOT EXISTS idx_groups_name ON groups(name);
+CREATE INDEX IF NOT EXISTS idx_groups_words_count ON groups(words_count);
+CREATE INDEX IF NOT EXISTS idx_study_sessions_activity_created_at ON study_sessions(study_activity_id, created_at);
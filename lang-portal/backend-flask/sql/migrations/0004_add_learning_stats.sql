@@ -0,0 +1,51 @@
+-- Per-word review counters, maintained when reviews are logged
+CREATE TABLE IF NOT EXISTS word_stats (
+  word_id INTEGER PRIMARY KEY,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  correct INTEGER NOT NULL DEFAULT 0,
+  mastered BOOLEAN NOT NULL DEFAULT 0,  -- At least 5 attempts with a success rate of 80% or more
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+-- Days (UTC) with at least one review
+CREATE TABLE IF NOT EXISTS activity_days (
+  day TEXT PRIMARY KEY,  -- YYYY-MM-DD
+  reviews INTEGER NOT NULL DEFAULT 0
+);
+
+-- Single-row summary read by /dashboard/stats
+CREATE TABLE IF NOT EXISTS learning_stats (
+  id INTEGER PRIMARY KEY CHECK (id = 1),
+  total_attempts INTEGER NOT NULL DEFAULT 0,
+  total_correct INTEGER NOT NULL DEFAULT 0,
+  words_studied INTEGER NOT NULL DEFAULT 0,
+  mastered_words INTEGER NOT NULL DEFAULT 0,
+  active_days INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from the existing review history
+INSERT INTO word_stats (word_id, attempts, correct, mastered)
+SELECT
+  wri.word_id,
+  COUNT(*),
+  SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END),
+  COUNT(*) >= 5 AND SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END) * 1.0 / COUNT(*) >= 0.8
+FROM word_review_items wri
+JOIN study_sessions ss ON wri.study_session_id = ss.id
+GROUP BY wri.word_id;
+
+INSERT INTO activity_days (day, reviews)
+SELECT date(wri.created_at), COUNT(*)
+FROM word_review_items wri
+JOIN study_sessions ss ON wri.study_session_id = ss.id
+GROUP BY date(wri.created_at);
+
+INSERT INTO learning_stats (id, total_attempts, total_correct, words_studied, mastered_words, active_days)
+SELECT
+  1,
+  COALESCE(SUM(attempts), 0),
+  COALESCE(SUM(correct), 0),
+  COUNT(*),
+  COALESCE(SUM(mastered), 0),
+  (SELECT COUNT(*) FROM activity_days)
+FROM word_stats;
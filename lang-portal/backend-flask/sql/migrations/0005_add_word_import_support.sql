@@ -0,0 +1,14 @@
+-- Lookup index for de-duplicating imported words on (kanji, romaji)
+CREATE INDEX IF NOT EXISTS idx_words_kanji_romaji ON words(kanji, romaji);
+
+-- Progress of bulk imports, so an interrupted import can resume where it stopped
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+  source TEXT NOT NULL,  -- Absolute path of the imported file
+  group_name TEXT NOT NULL,
+  records_done INTEGER NOT NULL DEFAULT 0,  -- Records committed so far
+  deferred_indexes TEXT,  -- JSON list of CREATE INDEX statements to restore at the end
+  started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+  finished_at DATETIME,
+  PRIMARY KEY (source, group_name)
+);
@@ -0,0 +1,33 @@
+-- Full-text index over words for GET /words/search.
+-- External content table: the text lives in words, words_fts only holds the index.
+-- The trigram tokenizer matches any substring of 3+ characters, which covers
+-- Japanese (no word boundaries) as well as romaji and English prefixes.
+CREATE VIRTUAL TABLE IF NOT EXISTS words_fts USING fts5(
+  kanji,
+  romaji,
+  english,
+  content='words',
+  content_rowid='id',
+  tokenize='trigram'
+);
+
+-- Keep the index in sync with words
+CREATE TRIGGER IF NOT EXISTS words_fts_insert AFTER INSERT ON words BEGIN
+  INSERT INTO words_fts (rowid, kanji, romaji, english)
+  VALUES (new.id, new.kanji, new.romaji, new.english);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_fts_delete AFTER DELETE ON words BEGIN
+  INSERT INTO words_fts (words_fts, rowid, kanji, romaji, english)
+  VALUES ('delete', old.id, old.kanji, old.romaji, old.english);
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_fts_update AFTER UPDATE OF kanji, romaji, english ON words BEGIN
+  INSERT INTO words_fts (words_fts, rowid, kanji, romaji, english)
+  VALUES ('delete', old.id, old.kanji, old.romaji, old.english);
+  INSERT INTO words_fts (rowid, kanji, romaji, english)
+  VALUES (new.id, new.kanji, new.romaji, new.english);
+END;
+
+-- Index the words that already exist
+INSERT INTO words_fts (words_fts) VALUES ('rebuild');
@@ -0,0 +1,13 @@
+-- Session lifecycle, maintained when reviews are logged so the session lists
+-- no longer aggregate word_review_items
+ALTER TABLE study_sessions ADD COLUMN ended_at DATETIME;  -- Last review, or when the session was ended
+ALTER TABLE study_sessions ADD COLUMN review_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill from the existing review history
+UPDATE study_sessions
+SET review_count = (
+      SELECT COUNT(*) FROM word_review_items WHERE study_session_id = study_sessions.id
+    ),
+    ended_at = (
+      SELECT MAX(created_at) FROM word_review_items WHERE study_session_id = study_sessions.id
+    );
@@ -0,0 +1,34 @@
+-- Spaced-repetition state per word (SM-2), maintained when reviews are logged.
+-- Existing history is replayed by `invoke rebuild-schedule`.
+CREATE TABLE IF NOT EXISTS word_schedule (
+  word_id INTEGER PRIMARY KEY,
+  due_at DATETIME NOT NULL,             -- UTC, same format as word_review_items.created_at
+  interval_days INTEGER NOT NULL,
+  ease REAL NOT NULL,
+  repetitions INTEGER NOT NULL,         -- Correct answers in a row
+  lapses INTEGER NOT NULL DEFAULT 0,    -- Wrong answers after a correct one
+  reviewed_at DATETIME NOT NULL,
+  FOREIGN KEY (word_id) REFERENCES words(id)
+);
+
+-- Due time copied onto every group membership (NULL for words never reviewed),
+-- so GET /groups/<id>/next-words seeks (group_id, due_at) instead of sorting the group
+ALTER TABLE word_groups ADD COLUMN due_at DATETIME;
+CREATE INDEX IF NOT EXISTS idx_word_groups_group_due ON word_groups(group_id, due_at, word_id);
+CREATE INDEX IF NOT EXISTS idx_word_groups_word ON word_groups(word_id);
+
+-- Keep the copies in step with word_schedule, whoever writes either table
+CREATE TRIGGER IF NOT EXISTS word_schedule_ai AFTER INSERT ON word_schedule BEGIN
+  UPDATE word_groups SET due_at = new.due_at WHERE word_id = new.word_id;
+END;
+CREATE TRIGGER IF NOT EXISTS word_schedule_au AFTER UPDATE OF due_at ON word_schedule BEGIN
+  UPDATE word_groups SET due_at = new.due_at WHERE word_id = new.word_id;
+END;
+CREATE TRIGGER IF NOT EXISTS word_schedule_ad AFTER DELETE ON word_schedule BEGIN
+  UPDATE word_groups SET due_at = NULL WHERE word_id = old.word_id;
+END;
+CREATE TRIGGER IF NOT EXISTS word_groups_schedule_ai AFTER INSERT ON word_groups
+WHEN new.due_at IS NULL AND EXISTS (SELECT 1 FROM word_schedule WHERE word_id = new.word_id) BEGIN
+  UPDATE word_groups SET due_at = (SELECT due_at FROM word_schedule WHERE word_id = new.word_id)
+  WHERE rowid = new.rowid;
+END;
@@ -0,0 +1,59 @@
+-- Exact row counts, kept by triggers so the list totals don't run COUNT(*).
+-- `invoke check-counts` compares them (and groups.words_count) with a recount.
+CREATE TABLE IF NOT EXISTS table_counts (
+  name TEXT PRIMARY KEY,  -- Table name
+  count INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR REPLACE INTO table_counts (name, count)
+SELECT 'words', COUNT(*) FROM words
+UNION ALL SELECT 'groups', COUNT(*) FROM groups
+UNION ALL SELECT 'word_groups', COUNT(*) FROM word_groups
+UNION ALL SELECT 'study_sessions', COUNT(*) FROM study_sessions
+UNION ALL SELECT 'word_review_items', COUNT(*) FROM word_review_items;
+
+-- groups.words_count was only set by the importer; recount it once and keep it
+-- up to date from here on
+UPDATE groups SET words_count = (SELECT COUNT(*) FROM word_groups WHERE group_id = groups.id);
+
+CREATE TRIGGER IF NOT EXISTS words_count_insert AFTER INSERT ON words BEGIN
+  UPDATE table_counts SET count = count + 1 WHERE name = 'words';
+END;
+CREATE TRIGGER IF NOT EXISTS words_count_delete AFTER DELETE ON words BEGIN
+  UPDATE table_counts SET count = count - 1 WHERE name = 'words';
+END;
+
+CREATE TRIGGER IF NOT EXISTS groups_count_insert AFTER INSERT ON groups BEGIN
+  UPDATE table_counts SET count = count + 1 WHERE name = 'groups';
+END;
+CREATE TRIGGER IF NOT EXISTS groups_count_delete AFTER DELETE ON groups BEGIN
+  UPDATE table_counts SET count = count - 1 WHERE name = 'groups';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_groups_count_insert AFTER INSERT ON word_groups BEGIN
+  UPDATE table_counts SET count = count + 1 WHERE name = 'word_groups';
+  UPDATE groups SET words_count = words_count + 1 WHERE id = new.group_id;
+END;
+CREATE TRIGGER IF NOT EXISTS word_groups_count_delete AFTER DELETE ON word_groups BEGIN
+  UPDATE table_counts SET count = count - 1 WHERE name = 'word_groups';
+  UPDATE groups SET words_count = words_count - 1 WHERE id = old.group_id;
+END;
+CREATE TRIGGER IF NOT EXISTS word_groups_count_update AFTER UPDATE OF group_id ON word_groups
+WHEN new.group_id IS NOT old.group_id BEGIN
+  UPDATE groups SET words_count = words_count - 1 WHERE id = old.group_id;
+  UPDATE groups SET words_count = words_count + 1 WHERE id = new.group_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_count_insert AFTER INSERT ON study_sessions BEGIN
+  UPDATE table_counts SET count = count + 1 WHERE name = 'study_sessions';
+END;
+CREATE TRIGGER IF NOT EXISTS study_sessions_count_delete AFTER DELETE ON study_sessions BEGIN
+  UPDATE table_counts SET count = count - 1 WHERE name = 'study_sessions';
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_review_items_count_insert AFTER INSERT ON word_review_items BEGIN
+  UPDATE table_counts SET count = count + 1 WHERE name = 'word_review_items';
+END;
+CREATE TRIGGER IF NOT EXISTS word_review_items_count_delete AFTER DELETE ON word_review_items BEGIN
+  UPDATE table_counts SET count = count - 1 WHERE name = 'word_review_items';
+END;
@@ -0,0 +1,40 @@
+-- Reviews older than the retention horizon, rolled up per day, word and group
+-- by `invoke compact-reviews` (the raw rows are archived, then deleted)
+CREATE TABLE IF NOT EXISTS daily_word_stats (
+  day TEXT NOT NULL,          -- YYYY-MM-DD (UTC) of word_review_items.created_at
+  word_id INTEGER NOT NULL,
+  group_id INTEGER NOT NULL,  -- Group of the session the reviews were logged in
+  correct_count INTEGER NOT NULL DEFAULT 0,
+  wrong_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, word_id, group_id),
+  FOREIGN KEY (word_id) REFERENCES words(id),
+  FOREIGN KEY (group_id) REFERENCES groups(id)
+) WITHOUT ROWID;
+
+-- Replaying a word's history (lib/scheduler.py) walks it by word, oldest day first
+CREATE INDEX IF NOT EXISTS idx_daily_word_stats_word_day ON daily_word_stats(word_id, day);
+
+-- The whole review history per day, word and group: the rollup plus the raw
+-- reviews not compacted yet. Statistics over the history read this view.
+CREATE VIEW IF NOT EXISTS review_days AS
+SELECT day, word_id, group_id, correct_count, wrong_count
+FROM daily_word_stats
+UNION ALL
+SELECT
+  date(wri.created_at),
+  wri.word_id,
+  ss.group_id,
+  SUM(CASE WHEN wri.correct = 1 THEN 1 ELSE 0 END),
+  SUM(CASE WHEN wri.correct = 1 THEN 0 ELSE 1 END)
+FROM word_review_items wri
+JOIN study_sessions ss ON wri.study_session_id = ss.id
+GROUP BY date(wri.created_at), wri.word_id, ss.group_id;
+
+-- Correct answers per session, maintained when reviews are logged like
+-- review_count, so a session's score survives the compaction of its reviews
+ALTER TABLE study_sessions ADD COLUMN correct_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE study_sessions
+SET correct_count = (
+  SELECT COUNT(*) FROM word_review_items WHERE study_session_id = study_sessions.id AND correct = 1
+);
@@ -0,0 +1,33 @@
+-- Days with a new session count as active too, and the summary row keeps the
+-- streaks of consecutive active days (UTC), both maintained as sessions and
+-- reviews are created (lib/learning_stats.py)
+ALTER TABLE activity_days ADD COLUMN sessions INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE learning_stats ADD COLUMN current_streak INTEGER NOT NULL DEFAULT 0;  -- Run ending on streak_end
+ALTER TABLE learning_stats ADD COLUMN longest_streak INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE learning_stats ADD COLUMN streak_end TEXT;  -- Last active day, YYYY-MM-DD
+
+-- Backfill from the existing sessions (older ones are in local time; 0015
+-- converts them to UTC and counts the days again)
+INSERT INTO activity_days (day, sessions)
+SELECT date(created_at), COUNT(*)
+FROM study_sessions
+WHERE true
+GROUP BY date(created_at)
+ON CONFLICT(day) DO UPDATE SET sessions = excluded.sessions;
+
+INSERT OR IGNORE INTO learning_stats (id) SELECT 1 FROM activity_days LIMIT 1;
+
+UPDATE learning_stats SET
+  current_streak = COALESCE((
+    SELECT COUNT(*) FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run FROM activity_days)
+    GROUP BY run ORDER BY MAX(day) DESC LIMIT 1
+  ), 0),
+  longest_streak = COALESCE((
+    SELECT MAX(length) FROM (
+      SELECT COUNT(*) AS length
+      FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run FROM activity_days)
+      GROUP BY run
+    )
+  ), 0),
+  streak_end = (SELECT MAX(day) FROM activity_days)
+WHERE id = 1;
@@ -0,0 +1,31 @@
+-- Each word's review counts, copied from word_reviews by triggers, so /words can
+-- walk an index when sorting by them instead of joining and sorting every word
+ALTER TABLE words ADD COLUMN correct_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE words ADD COLUMN wrong_count INTEGER NOT NULL DEFAULT 0;
+
+UPDATE words
+SET correct_count = COALESCE(r.correct_count, 0), wrong_count = COALESCE(r.wrong_count, 0)
+FROM word_reviews r
+WHERE r.word_id = words.id;
+
+-- The rowid is the last column of every index, so these also order ties by id
+CREATE INDEX IF NOT EXISTS idx_words_correct_count ON words(correct_count);
+CREATE INDEX IF NOT EXISTS idx_words_wrong_count ON words(wrong_count);
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_counts_ai AFTER INSERT ON word_reviews BEGIN
+  UPDATE words
+  SET correct_count = COALESCE(new.correct_count, 0), wrong_count = COALESCE(new.wrong_count, 0)
+  WHERE id = new.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_counts_au AFTER UPDATE OF word_id, correct_count, wrong_count ON word_reviews
+BEGIN
+  UPDATE words SET correct_count = 0, wrong_count = 0 WHERE id = old.word_id AND old.word_id IS NOT new.word_id;
+  UPDATE words
+  SET correct_count = COALESCE(new.correct_count, 0), wrong_count = COALESCE(new.wrong_count, 0)
+  WHERE id = new.word_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS word_reviews_counts_ad AFTER DELETE ON word_reviews BEGIN
+  UPDATE words SET correct_count = 0, wrong_count = 0 WHERE id = old.word_id;
+END;
@@ -0,0 +1,48 @@
+-- Dense position (0 .. words_count - 1) of each word in its group, so
+-- /groups/<id>/sample can draw random members with index lookups instead of
+-- sorting the group (lib/sampling.py)
+ALTER TABLE word_groups ADD COLUMN position INTEGER;
+
+UPDATE word_groups
+SET position = ranked.position
+FROM (
+  SELECT rowid AS row_id, ROW_NUMBER() OVER (PARTITION BY group_id ORDER BY word_id) - 1 AS position
+  FROM word_groups
+) ranked
+WHERE word_groups.rowid = ranked.row_id;
+
+-- Not unique: a row moved to another group keeps its old position until the
+-- update trigger renumbers it
+CREATE INDEX IF NOT EXISTS idx_word_groups_group_position ON word_groups(group_id, position);
+
+-- A new member goes after the last one
+CREATE TRIGGER IF NOT EXISTS word_groups_position_insert AFTER INSERT ON word_groups BEGIN
+  UPDATE word_groups
+  SET position = (SELECT COALESCE(MAX(position) + 1, 0) FROM word_groups WHERE group_id = new.group_id)
+  WHERE rowid = new.rowid;
+END;
+
+-- The last member fills the hole left by a removed one. The unary + keeps the
+-- planner on the position equality (one index seek) rather than the range.
+CREATE TRIGGER IF NOT EXISTS word_groups_position_delete AFTER DELETE ON word_groups BEGIN
+  UPDATE word_groups
+  SET position = old.position
+  WHERE group_id = old.group_id
+    AND position = (SELECT MAX(position) FROM word_groups WHERE group_id = old.group_id)
+    AND +position > old.position;
+END;
+
+-- A member moved to another group leaves as if deleted and joins as if inserted
+CREATE TRIGGER IF NOT EXISTS word_groups_position_update AFTER UPDATE OF group_id ON word_groups
+WHEN new.group_id IS NOT old.group_id BEGIN
+  UPDATE word_groups
+  SET position = old.position
+  WHERE group_id = old.group_id
+    AND position = (SELECT MAX(position) FROM word_groups WHERE group_id = old.group_id)
+    AND +position > old.position;
+  UPDATE word_groups
+  SET position = (
+    SELECT COALESCE(MAX(position) + 1, 0) FROM word_groups WHERE group_id = new.group_id AND rowid <> new.rowid
+  )
+  WHERE rowid = new.rowid;
+END;
@@ -0,0 +1,50 @@
+-- One time base: UTC. Sessions and reviews used to be stamped with the
+-- server's naive local datetime.now() ('YYYY-MM-DD HH:MM:SS.ffffff'); the app
+-- now writes UTC without fractional seconds (learning_stats.timestamp()), like
+-- CURRENT_TIMESTAMP. The old rows are the ones with fractional seconds and are
+-- converted from the local time zone of the machine running the migration,
+-- taken to be the server that wrote them (SQLite's 'utc' modifier, which
+-- applies the offset in effect on each row's date). Run the migration with TZ
+-- set to the server's zone when migrating a copy elsewhere.
+UPDATE study_sessions SET created_at = datetime(created_at, 'utc') WHERE length(created_at) > 19;
+UPDATE study_sessions SET ended_at = datetime(ended_at, 'utc') WHERE length(ended_at) > 19;
+UPDATE word_review_items SET created_at = datetime(created_at, 'utc') WHERE length(created_at) > 19;
+
+-- The activity days (0004, 0012) were backfilled from the local dates: count
+-- them again, and the streaks over them. Days already rolled up into
+-- daily_word_stats keep the date they were compacted under.
+DELETE FROM activity_days;
+
+INSERT INTO activity_days (day, reviews, sessions)
+SELECT day, SUM(reviews), SUM(sessions)
+FROM (
+  SELECT day, SUM(correct_count + wrong_count) AS reviews, 0 AS sessions
+  FROM daily_word_stats
+  GROUP BY day
+  UNION ALL
+  SELECT date(wri.created_at) AS day, COUNT(*) AS reviews, 0 AS sessions
+  FROM word_review_items wri
+  JOIN study_sessions ss ON wri.study_session_id = ss.id
+  GROUP BY date(wri.created_at)
+  UNION ALL
+  SELECT date(created_at) AS day, 0 AS reviews, COUNT(*) AS sessions
+  FROM study_sessions
+  GROUP BY date(created_at)
+)
+GROUP BY day;
+
+UPDATE learning_stats SET
+  active_days = (SELECT COUNT(*) FROM activity_days WHERE reviews > 0),
+  current_streak = COALESCE((
+    SELECT COUNT(*) FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run FROM activity_days)
+    GROUP BY run ORDER BY MAX(day) DESC LIMIT 1
+  ), 0),
+  longest_streak = COALESCE((
+    SELECT MAX(length) FROM (
+      SELECT COUNT(*) AS length
+      FROM (SELECT day, julianday(day) - ROW_NUMBER() OVER (ORDER BY day) AS run FROM activity_days)
+      GROUP BY run
+    )
+  ), 0),
+  streak_end = (SELECT MAX(day) FROM activity_days)
+WHERE id = 1;
@@ -0,0 +1,36 @@
+-- /groups/<id>/words/raw nests words.parts into the response as stored, and
+-- jsonify() writes object keys sorted. parts_unsorted marks the rows whose
+-- parts have an object, at any depth, with keys out of that order (or repeated)
+-- so the route re-encodes only those; parts itself is never rewritten.
+-- Checking every row at read time costs more than the query, so the flag is
+-- set on write. The importer stores parts with sorted keys and inserts 0
+-- itself; any other insert leaves it NULL and the trigger works it out.
+ALTER TABLE words ADD COLUMN parts_unsorted INTEGER;
+
+UPDATE words SET parts_unsorted = json_valid(parts) AND EXISTS (
+  SELECT 1
+  FROM json_tree(words.parts) a
+  JOIN json_tree(words.parts) b ON b.parent = a.parent AND b.id > a.id
+  WHERE typeof(a.key) = 'text' AND b.key <= a.key
+);
+
+CREATE TRIGGER IF NOT EXISTS words_parts_unsorted_insert AFTER INSERT ON words
+WHEN new.parts_unsorted IS NULL BEGIN
+  UPDATE words SET parts_unsorted = json_valid(new.parts) AND EXISTS (
+    SELECT 1
+    FROM json_tree(new.parts) a
+    JOIN json_tree(new.parts) b ON b.parent = a.parent AND b.id > a.id
+    WHERE typeof(a.key) = 'text' AND b.key <= a.key
+  )
+  WHERE id = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS words_parts_unsorted_update AFTER UPDATE OF parts ON words BEGIN
+  UPDATE words SET parts_unsorted = json_valid(new.parts) AND EXISTS (
+    SELECT 1
+    FROM json_tree(new.parts) a
+    JOIN json_tree(new.parts) b ON b.parent = a.parent AND b.id > a.id
+    WHERE typeof(a.key) = 'text' AND b.key <= a.key
+  )
+  WHERE id = new.id;
+END;
@@ -0,0 +1,6 @@
+-- word_reviews.last_reviewed was still stamped with the server's local
+-- datetime.now() ('YYYY-MM-DD HH:MM:SS.ffffff') after 0015; reviews now stamp it
+-- with the UTC time of the review items. Convert the old rows the same way 0015
+-- did: the ones with fractional seconds, from the local time zone of the
+-- machine running the migration.
+UPDATE word_reviews SET last_reviewed = datetime(last_reviewed, 'utc') WHERE length(last_reviewed) > 19;
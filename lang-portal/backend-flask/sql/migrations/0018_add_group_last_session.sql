@@ -0,0 +1,28 @@
+-- Start of each group's latest study session, kept by triggers so the
+-- dashboard counts the groups active in the last 30 days through
+-- idx_groups_last_session_at (one entry per active group) instead of reading
+-- every session of those 30 days. `invoke check-counts` compares it with
+-- MAX(study_sessions.created_at).
+ALTER TABLE groups ADD COLUMN last_session_at DATETIME;
+
+UPDATE groups SET last_session_at = (SELECT MAX(created_at) FROM study_sessions WHERE group_id = groups.id);
+
+CREATE INDEX IF NOT EXISTS idx_groups_last_session_at ON groups(last_session_at);
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_last_session_insert AFTER INSERT ON study_sessions BEGIN
+  UPDATE groups SET last_session_at = new.created_at
+  WHERE id = new.group_id AND (last_session_at IS NULL OR last_session_at < new.created_at);
+END;
+
+-- Only deleting or moving a group's latest session looks up the one before it
+-- (through idx_study_sessions_group_created_at)
+CREATE TRIGGER IF NOT EXISTS study_sessions_last_session_delete AFTER DELETE ON study_sessions BEGIN
+  UPDATE groups SET last_session_at = (SELECT MAX(created_at) FROM study_sessions WHERE group_id = old.group_id)
+  WHERE id = old.group_id AND last_session_at = old.created_at;
+END;
+
+CREATE TRIGGER IF NOT EXISTS study_sessions_last_session_update AFTER UPDATE OF group_id, created_at ON study_sessions
+BEGIN
+  UPDATE groups SET last_session_at = (SELECT MAX(created_at) FROM study_sessions WHERE group_id = groups.id)
+  WHERE id IN (old.group_id, new.group_id);
+END;
@@ -6,4 +6,385 @@ def init_db(c):
   from flask import Flask
   app = Flask(__name__)
   db.init(app)
-  print("Database initialized successfully.")
\ No newline at end of file
+  print("Database initialized successfully.")
+
+@task
+def migrate(c, database='words.db'):
+  import migrate as migrations
+  migrations.run_migrations(database)
+
+@task
+def test(c):
+  c.run('python -m pytest -q', pty=False)
+
+@task
+def check_plans(c):
+  # The hot query plans (tests/test_query_plans.py)
+  c.run('python -m pytest -q tests/test_query_plans.py', pty=False)
+
+@task
+def check_asgi(c):
+  # The WSGI app and the ASGI front end answer the API contract alike (tests/test_asgi_contract.py)
+  c.run('python -m pytest -q tests/test_asgi_contract.py', pty=False)
+
+def connect(database):
+  import sqlite3
+  connection = sqlite3.connect(database)
+  connection.row_factory = sqlite3.Row
+  return connection
+
+@task
+def rebuild_stats(c, database='words.db'):
+  # Recompute word_stats, activity_days and learning_stats from the review history
+  from lib import learning_stats
+  connection = connect(database)
+  learning_stats.rebuild(connection)
+  connection.close()
+  print("Learning stats rebuilt.")
+
+@task
+def check_stats(c, database='words.db'):
+  # Compare the maintained learning stats against a full recompute
+  from invoke import Exit
+  from lib import learning_stats
+  connection = connect(database)
+  problems = learning_stats.check(connection)
+  connection.close()
+  for problem in problems:
+    print(f"DRIFT {problem}")
+  if problems:
+    raise Exit("Learning stats are out of date, run `invoke rebuild-stats`", code=1)
+  print("Learning stats are consistent.")
+
+@task
+def check_counts(c, database='words.db', repair=False):
+  # Compare the trigger-maintained row and review counts with a recount; --repair rewrites them
+  from invoke import Exit
+  from lib import counts
+  connection = connect(database)
+  problems = counts.check(connection)
+  for problem in problems:
+    print(f"DRIFT {problem}")
+  if problems and repair:
+    counts.repair(connection)
+    problems = counts.check(connection)
+    print("Counts repaired." if not problems else f"{len(problems)} difference(s) left after the repair.")
+  connection.close()
+  if problems:
+    raise Exit("Row counts are out of date, run `invoke check-counts --repair`", code=1)
+  if not repair:
+    print("Row counts are exact.")
+
+@task
+def rebuild_schedule(c, database='words.db'):
+  # Replay the review history into word_schedule (and the due times on word_groups)
+  from lib import scheduler
+  connection = connect(database)
+  words = scheduler.rebuild(connection)
+  connection.close()
+  print(f"Schedule rebuilt for {words} words.")
+
+@task
+def compact_reviews(c, database='words.db', horizon_days=365, archive_dir='archive', vacuum=False, requests=50):
+  # Roll reviews older than the horizon into daily_word_stats and archive them,
+  # with a space and latency report from before and after
+  import json
+  import os
+  from datetime import datetime
+  from app import create_app
+  from lib import bench as benchmark
+  from lib import compaction
+
+  def report():
+    connection = connect(database)
+    space = compaction.space(connection)
+    connection.close()
+    return {"space": space, "latency": benchmark.history_latency(create_app, database, requests=requests)}
+
+  before = report()
+  connection = connect(database)
+  summary = compaction.compact(connection, horizon_days=horizon_days, archive_dir=archive_dir)
+  if vacuum:
+    connection.execute('VACUUM')
+  connection.close()
+  after = report()
+
+  megabytes = lambda size: f"{size / 1e6:.1f}MB"
+  print(f"Compacted {summary['reviews']} reviews before {summary['cutoff']} in {summary['seconds']}s"
+        + (f" into {summary['archive']} ({megabytes(summary['archive_bytes'])})" if summary['archive'] else ''))
+  print(f"{'database file':<40} {megabytes(before['space']['file_bytes']):>10} -> "
+        f"{megabytes(after['space']['file_bytes'])} ({megabytes(after['space']['free_bytes'])} free)")
+  for table in before['space']['rows']:
+    print(f"{table + ' rows':<40} {before['space']['rows'][table]:>10} -> {after['space']['rows'][table]}")
+  print(f"{'learning stats recompute':<40} {before['latency']['recompute_ms']:>8.1f}ms -> "
+        f"{after['latency']['recompute_ms']:.1f}ms")
+  for old, new in zip(before['latency']['results'], after['latency']['results']):
+    print(f"{old['path']:<40} {old['p50_ms']:>8.3f}ms -> {new['p50_ms']:.3f}ms p50")
+
+  os.makedirs(archive_dir, exist_ok=True)
+  path = os.path.join(archive_dir, f"compaction-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+  with open(path, 'w', encoding='utf-8') as file:
+    json.dump({"summary": summary, "before": before, "after": after}, file, indent=2)
+  print(f"Report saved to {path}")
+
+@task
+def snapshot(c, database='words.db', directory='snapshots'):
+  # Append the new reviews and sessions to the Arrow snapshot, rewrite the words and recompute the /analytics views
+  from invoke import Exit
+  from lib import snapshots
+  connection = connect(database)
+  try:
+    current = snapshots.take(connection, directory)
+  except (snapshots.Unavailable, snapshots.Busy) as e:
+    raise Exit(str(e), code=1)
+  finally:
+    connection.close()
+  for table, entry in current['tables'].items():
+    print(f"{table:<20} {entry['added']:>10} rows added, {entry['rows']:>10} in {len(entry['parts'])} part(s)")
+  print(f"Snapshot {current['version']} in {directory}: copied in {current['timings_ms']['copy']}ms, "
+        f"views in {current['timings_ms']['views']}ms")
+
+@task
+def import_words(c, path, group, database='words.db', format=None, chunk_size=50000, restart=False):
+  # Stream a JSON/JSONL/CSV word list into a group; re-running resumes an interrupted import
+  from lib import importer
+  connection = connect(database)
+  result = importer.import_words(connection, path, group, format=format, chunk_size=chunk_size, restart=restart)
+  connection.close()
+  print(f"Imported {result['records']} records ({result['inserted']} new words) into "
+        f"'{group}' in {result['seconds']}s.")
+
+@task
+def bench(c, database='bench.db', requests=200):
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_database(database)
+  # pool_size=0 opens and closes a connection per request, as before pooling
+  benchmark.print_results('unpooled', benchmark.run(create_app, database, requests=requests, pool_size=0))
+  benchmark.print_results('pooled', benchmark.run(create_app, database, requests=requests))
+
+@task
+def bench_search(c, database='bench_search.db', words=500000, requests=100):
+  # GET /words/search latency over a synthetic corpus (built once, reused afterwards)
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_search_database(database, words=words)
+  benchmark.print_results('search', benchmark.search_latency(create_app, database, requests=requests))
+
+@task
+def bench_schedule(c, database='bench_schedule.db', words=1000000, groups=1000, n=20, requests=200):
+  # GET /groups/<id>/next-words over `words` scheduled words (built once, reused afterwards)
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_feature_database(database, words=words, groups=groups, practiced=1.0, days=60)
+  report = benchmark.schedule_latency(create_app, database, n=n, requests=requests)
+  print(f"{report['scheduled']} scheduled words, n={report['n']}")
+  for result in report["groups"]:
+    print(f"group {result['group_id']:<6} {result['words']:>8} words {result['due']:>8} due  "
+          f"route p50 {result['route']['p50_ms']:>8.3f}ms  seek p50 {result['seek']['p50_ms']:>8.3f}ms  "
+          f"scan p50 {result['scan']['p50_ms']:>9.3f}ms")
+
+@task
+def bench_sorts(c, database='bench_sorts.db', words=1000000, requests=100):
+  # Every /words sort over `words` words (built once, reused afterwards)
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_feature_database(database, words=words, practiced=0.3)
+  report = benchmark.sort_latency(create_app, database, requests=requests)
+  print(f"{report['words']} words")
+  for result in report["results"]:
+    line = (f"{result['sort_by'] + ' ' + result['order']:<20} first page p50 {result['first']['p50_ms']:>8.3f}ms  "
+            f"cursor page p50 {result['cursor']['p50_ms']:>8.3f}ms")
+    if "join" in result:
+      line += f"  join and sort p50 {result['join']['p50_ms']:>9.3f}ms"
+    print(line)
+
+@task
+def bench_sample(c, database='bench_sample.db', n=20, requests=200):
+  # GET /groups/<id>/sample on groups of 100k, 10k and 1k words (built once, reused afterwards)
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_feature_database(database, words=200000, group_sizes=(100000, 10000, 1000), practiced=0.5)
+  report = benchmark.sample_latency(create_app, database, n=n, requests=requests)
+  print(f"n={report['n']}")
+  for result in report["groups"]:
+    print(f"group {result['group_id']:<4} {result['words']:>7} words  "
+          f"uniform p50 {result['uniform']['p50_ms']:>7.3f}ms  weighted p50 {result['weighted']['p50_ms']:>7.3f}ms  "
+          f"unmastered p50 {result['exclude_mastered']['p50_ms']:>7.3f}ms  "
+          f"draw p50 {result['draw']['p50_ms']:>7.3f}ms  ORDER BY RANDOM() p50 {result['shuffle']['p50_ms']:>8.3f}ms")
+
+@task
+def bench_streaks(c, database='bench_streaks.db', years=10, requests=200):
+  # Streaks on /dashboard/stats over `years` of daily sessions (built once, reused afterwards)
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_feature_database(database, daily_years=years)
+  report = benchmark.streak_latency(create_app, database, requests=requests)
+  print(f"{report['sessions']} sessions on {report['days']} days since {report['first_day']}, "
+        f"current streak {report['current_streak']}, longest {report['longest_streak']}")
+  for label in ['route', 'lookup', 'scan', 'record_new_day', 'record_backfill']:
+    print(f"{label:<16} p50 {report[label]['p50_ms']:>9.3f}ms  p95 {report[label]['p95_ms']:>9.3f}ms")
+
+@task
+def bench_analytics(c, database='bench_data.db', requests=200):
+  # Snapshot time and /analytics/group-accuracy next to the SQL aggregate (`invoke generate-data` first for other scales)
+  import os
+  import tempfile
+  from app import create_app
+  from lib import bench as benchmark
+  from lib import datagen
+  if not os.path.exists(database):
+    datagen.generate(database, **datagen.SCALES['small'])
+  with tempfile.TemporaryDirectory() as directory:
+    report = benchmark.analytics_latency(create_app, database, directory, requests=int(requests))
+  print(', '.join(f"{rows} {table}" for table, rows in report['rows'].items()))
+  for label in ['first', 'again']:
+    print(f"snapshot ({label:<5})  copy {report[label]['copy']:>9.1f}ms  views {report[label]['views']:>9.1f}ms")
+  for label in ['route', 'route_group', 'aggregate']:
+    print(f"{label:<16} p50 {report[label]['p50_ms']:>9.3f}ms  p95 {report[label]['p95_ms']:>9.3f}ms")
+
+@task
+def serve(c, database='words.db', workers=4, port=5000, host='127.0.0.1', preload=True, log_level='info'):
+  # Several worker processes on one port (lib/workers.py); a write in one worker invalidates
+  # the others' caches through the shared generations file next to the database
+  import os
+  from lib import workers as server
+  os.environ['FLASK_DATABASE'] = os.path.abspath(database)
+  os.environ['FLASK_CACHE_GENERATIONS'] = 'shared'
+  os.environ['FLASK_PRELOAD'] = 'true' if preload else 'false'
+  server.serve(host=host, port=int(port), workers=int(workers), log_level=log_level)
+
+@task
+def bench_workers(c, database='bench_data.db', workers='1,2,4', clients=8, seconds=5):
+  # Read requests/sec of `invoke serve` with each number of worker processes
+  import os
+  from lib import bench as benchmark
+  from lib import datagen
+  if not os.path.exists(database):
+    datagen.generate(database, **datagen.SCALES['small'])
+  report = benchmark.worker_scaling(database, worker_counts=[int(count) for count in workers.split(',')],
+                                    clients=int(clients), seconds=float(seconds))
+  print(f"{report['cpus']} CPUs, {report['clients']} client processes, {report['paths']} read paths")
+  if report['cpus'] < max(result['workers'] for result in report['results']) + report['clients']:
+    print("Fewer CPUs than workers plus clients: the workers and the clients compete for the same cores")
+  for result in report['results']:
+    print(f"{result['workers']:>3} worker(s) {result['rps']:>10.1f} req/s  x{result['speedup']:<5}  "
+          f"errors {result['errors']}")
+
+@task
+def bench_asgi(c, database='bench.db', requests=4, workers=8, readers=4):
+  # Requests/sec at 10, 100 and 1000 concurrent clients, WSGI worker pool vs ASGI front end
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_database(database)
+  for clients in [10, 100, 1000]:
+    results = benchmark.server_modes(create_app, database, clients, requests_per_client=requests,
+                                     workers=workers, readers=readers)
+    for mode, result in results.items():
+      print(f"{mode:<5} {clients:>5} clients  {result['rps']:>9.1f} req/s  "
+            f"p50 {result['p50_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms  errors {result['errors']}")
+
+@task
+def generate_data(c, database='bench_data.db', scale='small', words=None, groups=None, sessions=None,
+                  reviews=None, seed=42):
+  # Reproducible synthetic database: --scale small|medium|large, sizes can be overridden one by one
+  from invoke import Exit
+  from lib import datagen
+  if scale not in datagen.SCALES:
+    raise Exit(f"Unknown scale '{scale}', expected one of {', '.join(datagen.SCALES)}", code=1)
+  sizes = dict(datagen.SCALES[scale])
+  for name, value in [('words', words), ('groups', groups), ('sessions', sessions), ('reviews', reviews)]:
+    if value is not None:
+      sizes[name] = int(value)
+  try:
+    counts = datagen.generate(database, seed=int(seed), **sizes)
+  except FileExistsError as e:
+    raise Exit(f"{e}; delete it first to generate a new one", code=1)
+  print(', '.join(f"{count} {table}" for table, count in counts.items()))
+
+@task
+def bench_endpoints(c, database='bench_data.db', mode='client', requests=200, clients=1, cache=False,
+                    copy=True, output='bench-results'):
+  # p50/p95/p99 and req/s of every route through the test client (--mode client) or
+  # over HTTP (--mode http); the report is saved as JSON for `invoke bench-compare`
+  import os
+  from app import create_app
+  from lib import bench as benchmark
+  from lib import datagen
+  if not os.path.exists(database):
+    datagen.generate(database, **datagen.SCALES['small'])
+  report = benchmark.endpoint_suite(create_app, database, mode=mode, requests=int(requests),
+                                    clients=int(clients), cache=cache, copy=copy)
+  for result in report['results']:
+    print(f"{result['method']:<5} {result['path'][:52]:<52} p50 {result['p50_ms']:>9.3f}ms  "
+          f"p95 {result['p95_ms']:>9.3f}ms  p99 {result['p99_ms']:>9.3f}ms  {result['rps']:>8.1f} req/s  "
+          f"cpu {result['cpu_ms']:>8.3f}ms"
+          + (f"  errors {result['errors']}" if result['errors'] else ''))
+  print(f"Saved {benchmark.save_report(report, output)}")
+
+@task
+def bench_compare(c, before, after, threshold=15):
+  # Diff two bench-endpoints reports; fails when a route's p50 or p95 got more than --threshold percent slower
+  import json
+  from invoke import Exit
+  from lib import bench as benchmark
+  with open(before, encoding='utf-8') as file:
+    old = json.load(file)
+  with open(after, encoding='utf-8') as file:
+    new = json.load(file)
+  for key in ('database', 'mode', 'clients', 'cache'):
+    if old.get(key) != new.get(key):
+      print(f"WARNING {key} differs: {old.get(key)} != {new.get(key)}")
+
+  changes = benchmark.compare(old, new, threshold=float(threshold) / 100)
+  for change in changes:
+    marker = 'SLOWER' if change['regressed'] else ''
+    print(f"{change['method']:<5} {change['path'][:52]:<52} " + '  '.join(
+      f"{metric[:-3]} {change['before'][metric]:>8.3f} -> {change['after'][metric]:>8.3f}ms"
+      for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'cpu_ms')
+      if change['before'][metric] is not None and change['after'][metric] is not None
+    ) + f"  {marker}")
+  regressions = [change for change in changes if change['regressed']]
+  if regressions:
+    raise Exit(f"{len(regressions)} route(s) regressed between {old['commit']} and {new['commit']}", code=1)
+  print(f"No regressions over {threshold}% across {len(changes)} routes.")
+
+@task
+def bench_metrics(c, database='bench.db', requests=4000):
+  # Per-request cost of the /metrics counters and histograms on cheap routes
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_database(database)
+  for result in benchmark.metrics_overhead(create_app, database, requests=requests):
+    print(f"{result['path']:<24} p50 {result['p50_ms_without']:>7.3f}ms without, "
+          f"{result['p50_ms_with']:>7.3f}ms with metrics  ({result['overhead_us']:+.1f}us)")
+
+@task
+def bench_reviews(c, database='bench.db', reviews=2000):
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_database(database)
+  for batch_size in [None, 100, 1000]:
+    result = benchmark.review_throughput(create_app, database, reviews=reviews, batch_size=batch_size)
+    print(f"{result['endpoint']:<24} {result['reviews']:>7} reviews  {result['reviews_per_sec']:>10.1f} reviews/s")
+
+@task
+def bench_concurrency(c, database='bench.db', clients=32, reviews=50):
+  # Concurrent single-review clients, committing directly vs through the write-behind queue
+  from app import create_app
+  from lib import bench as benchmark
+  benchmark.build_database(database)
+  modes = [
+    ('direct', {'REVIEW_WRITE_MODE': 'direct'}),
+    ('queue/commit', {'REVIEW_WRITE_MODE': 'queue', 'REVIEW_QUEUE_ACK': 'commit'}),
+    ('queue/enqueue', {'REVIEW_WRITE_MODE': 'queue', 'REVIEW_QUEUE_ACK': 'enqueue'}),
+  ]
+  for label, config in modes:
+    result = benchmark.concurrent_reviews(create_app, database, config, clients=clients, reviews_per_client=reviews)
+    print(f"{label:<14} {result['clients']:>4} clients  {result['reviews_per_sec']:>9.1f} reviews/s  "
+          f"p50 {result['p50_ms']:>8.3f}ms  p99 {result['p99_ms']:>8.3f}ms  "
+          f"errors {result['errors']} ({result['locked_errors']} locked)")
+    if result['queue']:
+      queue = result['queue']
+      print(f"{'':<14} {queue['batches']} batches, avg flush {queue['avg_flush_ms']}ms, "
+            f"max flush {queue['max_flush_ms']}ms")
@@ -0,0 +1,59 @@
+import contextlib
+import os
+import sqlite3
+
+import pytest
+from flask import Flask
+
+from app import create_app
+from lib import bench
+from lib.db import Db
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@contextlib.contextmanager
+def in_backend_dir():
+  # The setup SQL and seed files are read relative to the backend
+  cwd = os.getcwd()
+  os.chdir(BACKEND_DIR)
+  try:
+    yield
+  finally:
+    os.chdir(cwd)
+
+@pytest.fixture(scope='session')
+def seeded_database(tmp_path_factory):
+  # The database `invoke init-db` creates (tables, migrations, seed words), built once per run
+  path = str(tmp_path_factory.mktemp('seed') / 'words.db')
+  with in_backend_dir():
+    Db(database=path, pool_size=0).init(Flask(__name__))
+  return path
+
+@pytest.fixture(scope='session')
+def history_database(tmp_path_factory):
+  # The seed data plus the study history of `invoke bench`, built once per run
+  path = str(tmp_path_factory.mktemp('history') / 'words.db')
+  with in_backend_dir():
+    bench.build_database(path)
+  return path
+
+@pytest.fixture
+def database(seeded_database, tmp_path):
+  # A copy of the seeded database of the test's own
+  path = str(tmp_path / 'words.db')
+  bench.copy_database(seeded_database, path)
+  return path
+
+@pytest.fixture
+def app(database):
+  # Used by pytest-flask's `client` fixture
+  app = create_app({'DATABASE': database, 'TESTING': True})
+  yield app
+  app.db.dispose()
+
+@pytest.fixture
+def connection(database):
+  connection = sqlite3.connect(database)
+  connection.row_factory = sqlite3.Row
+  yield connection
+  connection.close()
@@ -0,0 +1,30 @@
+import pytest
+
+from app import create_app
+from lib import bench, contract
+from lib.asgi import AsgiAdapter
+
+# The requests change the data, so both apps live for the whole module and the
+# requests run in the order of contract.REQUESTS
+
+def history_copy(history_database, tmp_path_factory, name):
+  path = str(tmp_path_factory.mktemp(name) / 'words.db')
+  bench.copy_database(history_database, path)
+  return path
+
+@pytest.fixture(scope='module')
+def app(history_database, tmp_path_factory):
+  # Served through pytest-flask's `client`
+  app = create_app({'DATABASE': history_copy(history_database, tmp_path_factory, 'wsgi')})
+  yield app
+  app.db.dispose()
+
+@pytest.fixture(scope='module')
+def asgi_app(history_database, tmp_path_factory):
+  app = AsgiAdapter(create_app({'DATABASE': history_copy(history_database, tmp_path_factory, 'asgi')}))
+  yield app
+  app.close()
+
+@pytest.mark.parametrize('call', contract.REQUESTS, ids=lambda call: f"{call['method']} {call['path']}")
+def test_asgi_matches_wsgi(client, asgi_app, call):
+  assert contract.compare(client, asgi_app, call) is None
@@ -0,0 +1,35 @@
+from lib import counts
+
+def create_session(client, group_id):
+  response = client.post('/study_sessions', json={"group_id": group_id, "study_activity_id": 1})
+  assert response.status_code == 201
+  return response.get_json()["session_id"]
+
+def active_groups(client):
+  return client.get('/dashboard/stats').get_json()["active_groups"]
+
+def test_active_groups_follow_the_latest_session(client, connection):
+  assert active_groups(client) == 0
+  earlier = create_session(client, 1)
+  latest = create_session(client, 1)
+  create_session(client, 2)
+  assert active_groups(client) == 2
+
+  # Group 2's only session moves back 31 days, group 1's earlier one 40 days
+  connection.execute("UPDATE study_sessions SET created_at = datetime('now', '-31 days') WHERE group_id = 2")
+  connection.execute("UPDATE study_sessions SET created_at = datetime('now', '-40 days') WHERE id = ?", (earlier,))
+  connection.commit()
+  assert counts.check(connection) == []
+  assert active_groups(client) == 1
+
+  # Without its latest session, group 1 was last studied 40 days ago
+  connection.execute('DELETE FROM study_sessions WHERE id = ?', (latest,))
+  connection.commit()
+  assert counts.check(connection) == []
+  assert active_groups(client) == 0
+
+  create_session(client, 2)
+  assert active_groups(client) == 1
+  assert client.post('/api/study-sessions/reset').status_code == 200
+  assert counts.check(connection) == []
+  assert active_groups(client) == 0
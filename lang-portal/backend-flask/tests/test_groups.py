@@ -0,0 +1,51 @@
+import json
+
+import pytest
+from flask import jsonify
+
+PARTS = [
+  # Written by the importer: keys already sorted, nested as stored
+  [{"kanji": "良", "romaji": ["yo"]}],
+  # Written by hand: out of order at every depth, with a duplicate key and whitespace
+  [{"romaji": ["ta", "be"], "kanji": "食", "note": {"z": 1, "a": "é"}}, "べ", {"b": 1, "a": 2, "b": 3}],
+]
+
+@pytest.fixture
+def raw_words(connection):
+  # A group of one word per PARTS entry, stored as the text given
+  cursor = connection.cursor()
+  cursor.execute("INSERT INTO groups (name) VALUES ('Raw parts')")
+  group_id = cursor.lastrowid
+  texts = [
+    json.dumps(PARTS[0], ensure_ascii=False, separators=(',', ':')),
+    '[ {"romaji": ["ta", "be"], "kanji": "食", "note": {"z": 1, "a": "é"}}, "べ", {"b": 1, "a": 2, "b": 3} ]',
+  ]
+  for index, parts in enumerate(texts):
+    cursor.execute("INSERT INTO words (kanji, romaji, english, parts) VALUES (?, ?, ?, ?)",
+                   (f'語{index}', f'go{index}', f'word {index}', parts))
+    cursor.execute('INSERT INTO word_groups (word_id, group_id) VALUES (?, ?)', (cursor.lastrowid, group_id))
+  connection.commit()
+  return group_id
+
+def test_parts_unsorted_is_set_on_write(connection, raw_words):
+  # The seed words come from the importer, which sorts the keys itself
+  flags = connection.execute('SELECT parts_unsorted, COUNT(*) FROM words GROUP BY parts_unsorted').fetchall()
+  assert [tuple(row) for row in flags] == [(0, connection.execute('SELECT COUNT(*) FROM words').fetchone()[0] - 1), (1, 1)]
+
+  connection.execute('''UPDATE words SET parts = '[{"a": 1, "b": 2}]' WHERE parts_unsorted = 1''')
+  assert connection.execute('SELECT COUNT(*) FROM words WHERE parts_unsorted IS NOT 0').fetchone()[0] == 0
+
+def test_raw_words_match_jsonify(app, client, connection, raw_words):
+  response = client.get(f'/groups/{raw_words}/words/raw')
+  assert response.status_code == 200
+
+  rows = connection.execute('''
+    SELECT w.id, w.kanji, w.romaji, w.english, w.parts
+    FROM word_groups wg JOIN words w ON w.id = wg.word_id
+    WHERE wg.group_id = ?
+  ''', (raw_words,)).fetchall()
+  words = [dict(row, parts=json.loads(row["parts"])) for row in rows]
+  assert [word["parts"] for word in words] == [PARTS[0], PARTS[1][:2] + [{"a": 2, "b": 3}]]
+  with app.test_request_context():
+    expected = jsonify({"group_id": raw_words, "group_name": 'Raw parts', "words": words}).get_data()
+  assert response.get_data() == expected
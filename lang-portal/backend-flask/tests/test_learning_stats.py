@@ -0,0 +1,88 @@
+import time
+
+from lib import learning_stats, reviews
+
+def log_session(connection, created_at):
+  # What POST /api/study-sessions does
+  cursor = connection.cursor()
+  cursor.execute('INSERT INTO study_sessions (group_id, study_activity_id, created_at) VALUES (1, 1, ?)',
+                 (created_at,))
+  learning_stats.record_session(cursor, created_at)
+  connection.commit()
+
+def days(connection):
+  return [tuple(row) for row in connection.execute('SELECT day, sessions FROM activity_days ORDER BY day')]
+
+def test_sessions_either_side_of_midnight_utc_are_two_days(connection):
+  log_session(connection, '2026-03-01 23:59:59')
+  log_session(connection, '2026-03-02 00:00:00')
+
+  assert days(connection) == [('2026-03-01', 1), ('2026-03-02', 1)]
+  cursor = connection.cursor()
+  assert learning_stats.streaks(cursor, today='2026-03-02') == {"current_streak": 2, "longest_streak": 2}
+  assert learning_stats.check(connection) == []
+
+def test_sessions_before_midnight_utc_are_one_day(connection):
+  log_session(connection, '2026-03-01 00:00:00')
+  log_session(connection, '2026-03-01 23:59:59')
+
+  assert days(connection) == [('2026-03-01', 2)]
+  cursor = connection.cursor()
+  assert learning_stats.streaks(cursor, today='2026-03-01') == {"current_streak": 1, "longest_streak": 1}
+
+def test_mark_active_counts_a_day_once(connection):
+  cursor = connection.cursor()
+  learning_stats.mark_active(cursor, '2026-03-01')
+  learning_stats.mark_active(cursor, '2026-03-02')
+  learning_stats.mark_active(cursor, '2026-03-02')
+
+  assert learning_stats.streaks(cursor, today='2026-03-02') == {"current_streak": 2, "longest_streak": 2}
+
+def test_streak_holds_until_a_whole_day_is_missed(connection):
+  log_session(connection, '2026-03-01 12:00:00')
+  log_session(connection, '2026-03-02 23:59:59')
+  cursor = connection.cursor()
+
+  # The streak still counts on the next day, until it ends at 00:00:00 the day after
+  assert learning_stats.streaks(cursor, today='2026-03-02') == {"current_streak": 2, "longest_streak": 2}
+  assert learning_stats.streaks(cursor, today='2026-03-03') == {"current_streak": 2, "longest_streak": 2}
+  assert learning_stats.streaks(cursor, today='2026-03-04') == {"current_streak": 0, "longest_streak": 2}
+
+def test_streak_restarts_after_a_missed_day(connection):
+  for created_at in ['2026-03-01 09:00:00', '2026-03-02 09:00:00', '2026-03-03 09:00:00', '2026-03-05 00:00:00']:
+    log_session(connection, created_at)
+
+  cursor = connection.cursor()
+  assert learning_stats.streaks(cursor, today='2026-03-05') == {"current_streak": 1, "longest_streak": 3}
+  log_session(connection, '2026-03-06 00:00:00')
+  assert learning_stats.streaks(cursor, today='2026-03-06') == {"current_streak": 2, "longest_streak": 3}
+  assert learning_stats.check(connection) == []
+
+def test_days_out_of_order_recount_the_streaks(connection):
+  # An imported old session fills the gap before the last active day
+  for created_at in ['2026-03-05 10:00:00', '2026-03-03 23:59:59', '2026-03-01 00:00:00', '2026-03-02 00:00:00']:
+    log_session(connection, created_at)
+
+  cursor = connection.cursor()
+  assert learning_stats.streaks(cursor, today='2026-03-05') == {"current_streak": 1, "longest_streak": 3}
+  log_session(connection, '2026-03-04 00:00:00')
+  assert learning_stats.streaks(cursor, today='2026-03-05') == {"current_streak": 5, "longest_streak": 5}
+  assert learning_stats.check(connection) == []
+
+def test_reviews_stamp_last_reviewed_in_utc(connection, monkeypatch):
+  # Any offset from UTC shows as a difference from the review items' time
+  monkeypatch.setenv('TZ', 'America/Los_Angeles')
+  time.tzset()
+  try:
+    log_session(connection, '2026-03-01 09:00:00')
+    session_id = connection.execute('SELECT MAX(id) FROM study_sessions').fetchone()[0]
+    reviews.log_reviews(connection.cursor(), session_id, [(1, True), (1, False), (2, True)])
+    connection.commit()
+  finally:
+    monkeypatch.delenv('TZ')
+    time.tzset()
+
+  created_at = connection.execute('SELECT MAX(created_at) FROM word_review_items').fetchone()[0]
+  stamps = [row[0] for row in connection.execute('SELECT last_reviewed FROM word_reviews WHERE word_id IN (1, 2)')]
+  assert len(created_at) == 19
+  assert stamps == [created_at, created_at]
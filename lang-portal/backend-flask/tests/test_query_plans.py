@@ -0,0 +1,17 @@
+import sqlite3
+
+import pytest
+
+from lib import query_plans
+
+@pytest.fixture(scope='module')
+def plans(seeded_database):
+  # EXPLAIN only, so the seeded database itself is enough
+  connection = sqlite3.connect(seeded_database)
+  yield connection
+  connection.close()
+
+@pytest.mark.parametrize('query', query_plans.HOT_QUERIES, ids=lambda query: query["name"])
+def test_hot_query_uses_its_index(plans, query):
+  failures = query_plans.check(plans, [query])
+  assert not failures, '\n'.join(f"{problem}: {' / '.join(plan)}" for _, problem, plan in failures)
@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta, timezone
+
+from lib import compaction, learning_stats
+
+def log_reviews(client, answers):
+  session_id = client.post('/study_sessions', json={"group_id": 1, "study_activity_id": 1}).get_json()["session_id"]
+  response = client.post(f'/study_sessions/{session_id}/reviews:batch', json={
+    "reviews": [{"word_id": word_id, "correct": correct} for word_id, correct in answers]
+  })
+  assert response.status_code == 200
+  return session_id
+
+def test_reset_clears_compacted_reviews(client, connection, tmp_path):
+  log_reviews(client, [(1, True), (2, False), (3, True), (4, True), (5, False)])
+  # Every review is before the horizon when it is counted from tomorrow
+  tomorrow = datetime.now(timezone.utc) + timedelta(days=1)
+  result = compaction.compact(connection, horizon_days=0, archive_dir=str(tmp_path / 'archive'), now=tomorrow,
+                              log=lambda message: None)
+  assert result["reviews"] == 5
+  assert learning_stats.check(connection) == []
+
+  assert client.post('/api/study-sessions/reset').status_code == 200
+
+  assert connection.execute('SELECT COUNT(*) FROM daily_word_stats').fetchone()[0] == 0
+  assert learning_stats.check(connection) == []
+  assert learning_stats.summary(connection.cursor())["total_attempts"] == 0
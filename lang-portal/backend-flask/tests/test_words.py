@@ -0,0 +1,43 @@
+import json
+
+import pytest
+
+from app import create_app
+from lib import query_plans
+
+@pytest.fixture
+def profiled(database, tmp_path):
+  # The app with every statement written to the slow-query log
+  log = tmp_path / 'slow.ndjson'
+  app = create_app({'DATABASE': database, 'RESPONSE_CACHE_SIZE': 0, 'SQL_PROFILE': True,
+                    'SQL_SLOW_QUERY_MS': 0, 'SQL_SLOW_QUERY_LOG': str(log)})
+  yield app, log
+  app.db.dispose()
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('sort_by', list(query_plans.WORDS_SORT_INDEXES))
+def test_words_sorts_walk_their_index(profiled, connection, sort_by, order):
+  # The statements GET /words runs for a first and a cursor page, explained as run
+  app, log = profiled
+  client = app.test_client()
+  path = f'/words?sort_by={sort_by}&order={order}&with_total=0'
+  after = client.get(path).get_json()["next_cursor"]
+  assert after
+  assert client.get(f'{path}&after={after}').status_code == 200
+
+  pages = [
+    entry for entry in map(json.loads, log.read_text(encoding='utf-8').splitlines())
+    if entry["route"] == 'GET /words' and f'ORDER BY w.{sort_by} {order}' in entry["sql"]
+  ]
+  assert len(pages) == 2
+  for page, cursor in zip(pages, (False, True)):
+    failures = query_plans.check(connection, [{
+      "name": page["sql"],
+      "sql": page["sql"],
+      "params": page["params"],
+      "uses": [query_plans.WORDS_SORT_INDEXES[sort_by]],
+      # The first page walks the index from one end, a cursor page seeks into it
+      "no_scan": ["w"] if cursor else [],
+      "no_sort": True
+    }])
+    assert not failures, '\n'.join(f"{problem}: {' / '.join(plan)}" for _, problem, plan in failures)